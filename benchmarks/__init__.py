@@ -0,0 +1,8 @@
+"""The package contains benchmarks of the backend. Benchmarks print results
+as JSON which can be saved and compared with results of another run.
+
+Example:
+
+    python -m benchmarks.screenshot --output before.json
+    python -m benchmarks.screenshot --compare before.json
+"""
@@ -0,0 +1,138 @@
+"""The module contains helpers to time operations, to write results of a
+benchmark as JSON and to compare them with results of a previous run.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+
+def measure(fn: Callable[[], object],
+            setup: Optional[Callable[[], object]] = None,
+            repeat: int = 5,
+            number: int = 10) -> Dict[str, float]:
+    """Times a function. The setup function is called before every call of
+    the function and isn't timed.
+
+    Parameters:
+      fn: a function to be timed.
+      setup: a function to prepare every call.
+      repeat: a number of measurements.
+      number: a number of calls per measurement.
+
+    Returns:
+      A dictionary with the minimum and the median time of a call in
+      seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        elapsed = 0.0
+        for _ in range(number):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            elapsed += time.perf_counter() - start
+        timings.append(elapsed / number)
+
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+    }
+
+
+def environment() -> Dict[str, str]:
+    """Returns a description of the environment of a benchmark run.
+    """
+    import numpy
+    import PIL
+    import pydantic
+
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'numpy': numpy.__version__,
+        'pillow': PIL.__version__,
+        'pydantic': pydantic.VERSION,
+    }
+
+
+def argument_parser(description: str) -> argparse.ArgumentParser:
+    """Returns a parser of common arguments of benchmarks.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--output', help='write results to a JSON file')
+    parser.add_argument('--compare',
+                        help='compare results with a JSON file of a '
+                             'previous run')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='a relative change of time which is reported '
+                             'as a speedup or a regression')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='a number of measurements')
+    parser.add_argument('--number', type=int, default=10,
+                        help='a number of calls per measurement')
+    return parser
+
+
+def compare(previous: dict, current: dict, threshold: float) -> int:
+    """Prints changes of times between two runs. The minimum times are
+    compared, since they are the least affected by other processes.
+
+    Parameters:
+      previous: results of a previous run.
+      current: results of the current run.
+      threshold: a relative change which is reported.
+
+    Returns:
+      A number of regressions.
+    """
+    regressions = 0
+    for key, result in current['results'].items():
+        if key not in previous['results']:
+            continue
+        before = previous['results'][key]['min']
+        after = result['min']
+        ratio = after / before if before else 1.0
+        if ratio > 1 + threshold:
+            verdict = 'slower'
+            regressions += 1
+        elif ratio < 1 - threshold:
+            verdict = 'faster'
+        else:
+            continue
+        print('{:<40} {:>10.3f}ms {:>10.3f}ms {:>6.2f}x {}'.format(
+            key, before * 1e3, after * 1e3, ratio, verdict), file=sys.stderr)
+    return regressions
+
+
+def finish(args: argparse.Namespace, results: Dict[str, dict]) -> int:
+    """Writes results of a benchmark and compares them with a previous run
+    if it is requested.
+
+    Returns:
+      An exit code, 1 if there are regressions.
+    """
+    report = {
+        'environment': environment(),
+        'results': results,
+    }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, 'r') as fp:
+            previous = json.load(fp)
+        if compare(previous, report, args.threshold):
+            return 1
+
+    return 0
@@ -0,0 +1,87 @@
+"""Benchmark of parsing of the game objects response. For every map size and
+density of objects it times:
+
+- union: validation of the response as is, pydantic tries models of the
+  union of game objects one by one
+- dispatch: Objects.parse_raw which parses game objects with models of
+  their types
+- columnar: ColumnarObjects.parse_raw which parses game objects into arrays
+- render_models and render_columnar: parsing and drawing of a frame of the
+  map with models and columnar objects
+
+Usage:
+
+    python -m benchmarks.parse [--output FILE] [--compare FILE]
+"""
+
+import json
+import sys
+
+from lib.columnar import ColumnarObjects
+from lib.schemas import Objects
+from lib.screenshot import DotFrame
+
+from benchmarks.common import argument_parser, finish, measure
+from benchmarks.payloads import DENSITIES, MAP_SIZES, \
+    generate_objects_payload
+
+
+# Maps which are bigger than maps in examples/
+LARGE_MAP_SIZES = [
+    (500, 500),
+]
+
+
+def run(repeat: int, number: int) -> dict:
+    """Runs the benchmark and returns results by keys like
+    "250x250/dense/dispatch".
+    """
+    results = {}
+
+    for width, height in MAP_SIZES + LARGE_MAP_SIZES:
+        for density in DENSITIES:
+            raw = json.dumps(generate_objects_payload(width, height, density))
+            prefix = '{}x{}/{}'.format(width, height, density)
+
+            results[prefix + '/union'] = measure(
+                lambda: Objects(**json.loads(raw)),
+                repeat=repeat,
+                number=number,
+            )
+            results[prefix + '/dispatch'] = measure(
+                lambda: Objects.parse_raw(raw),
+                repeat=repeat,
+                number=number,
+            )
+            results[prefix + '/columnar'] = measure(
+                lambda: ColumnarObjects.parse_raw(raw),
+                repeat=repeat,
+                number=number,
+            )
+            results[prefix + '/render_models'] = measure(
+                lambda: DotFrame.from_objects(
+                    (width, height),
+                    Objects.parse_raw(raw).objects,
+                ),
+                repeat=repeat,
+                number=number,
+            )
+            results[prefix + '/render_columnar'] = measure(
+                lambda: DotFrame.from_columnar(
+                    ColumnarObjects.parse_raw(raw),
+                ),
+                repeat=repeat,
+                number=number,
+            )
+
+    return results
+
+
+def main() -> int:
+    parser = argument_parser('Benchmark of parsing of game objects')
+    args = parser.parse_args()
+    return finish(args, run(args.repeat, args.number))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
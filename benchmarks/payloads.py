@@ -0,0 +1,171 @@
+"""The module generates synthetic responses of the Snake-Server for game
+objects. Payloads are generated with a seed, so they are the same in every
+run.
+"""
+
+import random
+from typing import Dict, List, Tuple
+
+from lib.schemas import (
+    OBJECT_LABEL_APPLE,
+    OBJECT_LABEL_CORPSE,
+    OBJECT_LABEL_MOUSE,
+    OBJECT_LABEL_SNAKE,
+    OBJECT_LABEL_WALL,
+    OBJECT_LABEL_WATERMELON,
+)
+
+
+# Map sizes of screenshots in examples/
+MAP_SIZES: List[Tuple[int, int]] = [
+    (25, 25),
+    (25, 75),
+    (30, 30),
+    (30, 75),
+    (70, 75),
+    (75, 25),
+    (80, 75),
+    (150, 75),
+    (200, 100),
+    (250, 250),
+]
+
+# Shares of map dots which are taken by snakes, walls and food
+DENSITIES: Dict[str, Dict[str, float]] = {
+    'sparse': {'snakes': 0.01, 'walls': 0.02, 'food': 0.005},
+    'medium': {'snakes': 0.05, 'walls': 0.08, 'food': 0.02},
+    'dense': {'snakes': 0.15, 'walls': 0.25, 'food': 0.05},
+}
+
+_DIRECTIONS = ('north', 'east', 'south', 'west')
+_STEPS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+
+class _Generator:
+    """Generates objects of a map keeping track of identifiers
+    """
+
+    def __init__(self, width: int, height: int, seed: int):
+        self._width = width
+        self._height = height
+        self._random = random.Random(seed)
+        self._id = 0
+
+    def _next_id(self) -> int:
+        self._id += 1
+        return self._id
+
+    def _random_dot(self) -> List[int]:
+        return [self._random.randrange(self._width),
+                self._random.randrange(self._height)]
+
+    def _walk(self, length: int) -> List[List[int]]:
+        dot = self._random_dot()
+        dots = [dot]
+        for _ in range(length - 1):
+            step_x, step_y = self._random.choice(_STEPS)
+            dot = [(dot[0] + step_x) % self._width,
+                   (dot[1] + step_y) % self._height]
+            dots.append(dot)
+        return dots
+
+    def _line(self, length: int) -> List[List[int]]:
+        x, y = self._random_dot()
+        if self._random.random() < 0.5:
+            return [[(x + i) % self._width, y] for i in range(length)]
+        return [[x, (y + i) % self._height] for i in range(length)]
+
+    def snakes(self, dots: int) -> List[dict]:
+        objects = []
+        while dots > 0:
+            length = min(dots, self._random.randint(3, 30))
+            objects.append({
+                'id': self._next_id(),
+                'type': OBJECT_LABEL_SNAKE,
+                'dots': self._walk(length),
+            })
+            dots -= length
+        return objects
+
+    def walls(self, dots: int) -> List[dict]:
+        objects = []
+        while dots > 0:
+            length = min(dots, self._random.randint(1, 20))
+            objects.append({
+                'id': self._next_id(),
+                'type': OBJECT_LABEL_WALL,
+                'dots': self._line(length),
+            })
+            dots -= length
+        return objects
+
+    def food(self, dots: int) -> List[dict]:
+        objects = []
+        while dots > 0:
+            kind = self._random.randrange(4)
+            if kind == 0:
+                objects.append({
+                    'id': self._next_id(),
+                    'type': OBJECT_LABEL_APPLE,
+                    'dot': self._random_dot(),
+                })
+                dots -= 1
+            elif kind == 1:
+                objects.append({
+                    'id': self._next_id(),
+                    'type': OBJECT_LABEL_MOUSE,
+                    'dot': self._random_dot(),
+                    'direction': self._random.choice(_DIRECTIONS),
+                })
+                dots -= 1
+            elif kind == 2:
+                x, y = self._random_dot()
+                objects.append({
+                    'id': self._next_id(),
+                    'type': OBJECT_LABEL_WATERMELON,
+                    'dots': [[(x + i) % self._width, (y + j) % self._height]
+                             for i in range(2) for j in range(2)],
+                })
+                dots -= 4
+            else:
+                length = self._random.randint(2, 10)
+                objects.append({
+                    'id': self._next_id(),
+                    'type': OBJECT_LABEL_CORPSE,
+                    'dots': self._walk(length),
+                })
+                dots -= length
+        return objects
+
+
+def generate_objects_payload(width: int,
+                             height: int,
+                             density: str,
+                             seed: int = 0) -> dict:
+    """Returns a payload of the game objects response of the server.
+
+    Parameters:
+      width: map width in dots.
+      height: map height in dots.
+      density: a key of DENSITIES.
+      seed: a seed of the random generator.
+
+    Returns:
+      A dictionary which can be parsed as lib.schemas.Objects.
+    """
+    shares = DENSITIES[density]
+    area = width * height
+    generator = _Generator(width, height, seed)
+
+    objects = []
+    objects.extend(generator.walls(int(area * shares['walls'])))
+    objects.extend(generator.snakes(int(area * shares['snakes'])))
+    objects.extend(generator.food(int(area * shares['food'])))
+
+    return {
+        'objects': objects,
+        'map': {
+            'width': width,
+            'height': height,
+        },
+    }
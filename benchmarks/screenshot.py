@@ -0,0 +1,95 @@
+"""Benchmark of screenshot generation. Stages of taking a screenshot are
+timed separately for every map size, density of objects and screenshot
+length:
+
+- canvas: construction of a GridCanvas without a cached template
+- draw: drawing game objects on a canvas, Screenshot._draw_objects
+- rgb: expanding and resizing of an image, Screenshot._rgb_image
+- save: encoding of an image as JPEG
+
+Usage:
+
+    python -m benchmarks.screenshot [--output FILE] [--compare FILE]
+"""
+
+import io
+import sys
+
+from lib import settings
+from lib.schemas import Objects
+from lib.screenshot import GridCanvas, Screenshot
+
+from benchmarks.common import argument_parser, finish, measure
+from benchmarks.payloads import DENSITIES, MAP_SIZES, \
+    generate_objects_payload
+
+
+def run(repeat: int, number: int) -> dict:
+    """Runs the benchmark and returns results by keys like
+    "80x75/dense/700/draw".
+    """
+    results = {}
+    strict_sized = settings.SCREENSHOT_STRICT_SIZED
+
+    for width, height in MAP_SIZES:
+        for density in DENSITIES:
+            payload = generate_objects_payload(width, height, density)
+            objects = Objects.parse_obj(payload).objects
+
+            for length in settings.SCREENSHOT_LENGTHS.values():
+                prefix = '{}x{}/{}/{}'.format(width, height, density, length)
+                max_size = (length, length)
+
+                def construct_canvas():
+                    return GridCanvas(width,
+                                      height,
+                                      *max_size,
+                                      Screenshot.BORDER_SIZE,
+                                      Screenshot.COLOR_BORDER,
+                                      Screenshot.COLOR_GRID)
+
+                screenshot = Screenshot((width, height),
+                                        max_size,
+                                        objects,
+                                        strict_sized)
+                image = screenshot.img
+
+                def save():
+                    image.save(io.BytesIO(),
+                               format='JPEG',
+                               quality=settings.SCREENSHOT_QUALITY,
+                               optimize=True)
+
+                results[prefix + '/canvas'] = measure(
+                    construct_canvas,
+                    setup=GridCanvas.templates.clear,
+                    repeat=repeat,
+                    number=number,
+                )
+                results[prefix + '/draw'] = measure(
+                    lambda: screenshot._draw_objects(objects),
+                    repeat=repeat,
+                    number=number,
+                )
+                results[prefix + '/rgb'] = measure(
+                    lambda: screenshot._rgb_image(strict_sized),
+                    repeat=repeat,
+                    number=number,
+                )
+                results[prefix + '/save'] = measure(
+                    save,
+                    repeat=repeat,
+                    number=number,
+                )
+
+    return results
+
+
+def main() -> int:
+    parser = argument_parser('Benchmark of screenshot generation')
+    args = parser.parse_args()
+    return finish(args, run(args.repeat, args.number))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,17 +4,19 @@ screenshot generation and so on.
 """
 
 import logging
+import time
 from typing import Tuple, Dict, List
 
 import dramatiq
 from dramatiq.brokers.redis import RedisBroker
 from dramatiq.brokers.stub import StubBroker
+from dramatiq.errors import RateLimitExceeded
 from dramatiq.rate_limits import RateLimiterBackend
 from dramatiq.results.backends import (
     RedisBackend as ResultRedisBackend,
     StubBackend as ResultStubBackend,
 )
-from dramatiq.rate_limits import ConcurrentRateLimiter
+from dramatiq.rate_limits import Barrier, ConcurrentRateLimiter
 from dramatiq.rate_limits.backends import (
     RedisBackend as RateLimitsRedisBackend,
     StubBackend as RateLimitsStubBackend,
@@ -25,7 +27,9 @@ from pydantic import ValidationError
 
 from lib import settings
 from lib import funcs
+from lib import metrics
 from lib.api import APIError
+from lib.limiter import AdaptiveConcurrencyLimiter, Lease
 
 
 logger = logging.getLogger(__name__)
@@ -66,56 +70,269 @@ DISTRIBUTED_MUTEX_REPORT = ConcurrentRateLimiter(rate_limits_backend,
                                                  "distributed-mutex-report",
                                                  limit=1)
 
+GAMES_CLEANUP_LIMITER = ConcurrentRateLimiter(
+    rate_limits_backend,
+    "games-cleanup",
+    limit=settings.GAMES_CLEANUP_CONCURRENCY,
+)
+
+SCREENSHOT_CYCLE_LEASE = Lease(rate_limits_backend,
+                               "screenshot-cycle-lease",
+                               funcs.get_state_store(),
+                               ttl=settings.SCREENSHOT_CYCLE_LEASE_TTL * 1000)
+
+API_CONCURRENCY_LIMITER = None
+if settings.API_CONCURRENCY_ADAPTIVE:
+    API_CONCURRENCY_LIMITER = AdaptiveConcurrencyLimiter(
+        rate_limits_backend,
+        "api-concurrency",
+        funcs.get_state_store(),
+        funcs.get_server_capacity,
+        min_limit=settings.API_CONCURRENCY_MIN,
+        max_limit=settings.API_CONCURRENCY_MAX,
+        initial_limit=settings.API_CONCURRENCY_INITIAL,
+        interval=settings.API_CONCURRENCY_INTERVAL,
+        high_capacity=settings.API_CONCURRENCY_HIGH_CAPACITY,
+        low_capacity=settings.API_CONCURRENCY_LOW_CAPACITY,
+        max_error_rate=settings.API_CONCURRENCY_MAX_ERROR_RATE,
+        max_latency=settings.API_CONCURRENCY_MAX_LATENCY,
+    )
+    funcs.observe_api_requests(API_CONCURRENCY_LIMITER.observe)
+    funcs.limit_api_concurrency(API_CONCURRENCY_LIMITER)
+
+
+def _get_screenshot_cycle_barrier(cycle_id: str) -> Barrier:
+    return Barrier(rate_limits_backend,
+                   'screenshot-cycle-barrier:' + cycle_id,
+                   ttl=settings.SCREENSHOT_CYCLE_TTL * 1000)
+
 
-@dramatiq.actor(max_retries=0, store_results=True)
-def dispatch_taking_screenshots() -> Dict[int, List[str]]:
+@dramatiq.actor(max_retries=0)
+def dispatch_taking_screenshots():
     """Checks games on a specified in settings server and dispatches group of
-    tasks for taking screenshots
+    tasks for taking screenshots. The tasks save their results and the last
+    one to finish sends the report, so no worker waits for the group. If the
+    adaptive schedule is enabled in settings, only games which are due are
+    dispatched and the latest screenshots of other games are reported.
 
-    Returns:
-      A dictionary in which keys are game identifiers and values are lists
-      of screenshot files
+    The cycle holds a lease until its last task finishes. While a cycle is
+    in flight new cycles are skipped or coalesced into one which is
+    dispatched after it, see settings.
+    """
+    cycle_id = funcs.new_screenshot_cycle_id()
+    if not SCREENSHOT_CYCLE_LEASE.take(cycle_id):
+        if settings.SCREENSHOT_CYCLE_OVERLAP == \
+                settings.SCREENSHOT_CYCLE_OVERLAP_COALESCE:
+            funcs.mark_screenshot_cycle_pending()
+            logger.info('Screenshot cycle in flight, coalescing a cycle')
+            metrics.SCREENSHOT_CYCLES.labels('coalesced').inc()
+        else:
+            logger.info('Screenshot cycle in flight, skipping a cycle')
+            metrics.SCREENSHOT_CYCLES.labels('skipped').inc()
+        return
+
+    metrics.SCREENSHOT_CYCLES.labels('started').inc()
+    since_previous = funcs.record_screenshot_cycle_start()
+    if since_previous is not None:
+        metrics.SCREENSHOT_CYCLE_LAG.observe(
+            max(0.0, since_previous - settings.TASK_INTERVAL_SCREENSHOT))
+
+    dispatched = False
+    try:
+        dispatched = _dispatch_screenshot_cycle(cycle_id)
+    finally:
+        # The lease of a cycle without tasks is released at once
+        if not dispatched:
+            _finish_screenshot_cycle(cycle_id)
+
+
+def _dispatch_screenshot_cycle(cycle_id: str) -> bool:
+    """Dispatches tasks of a screenshot cycle and returns whether there are
+    any.
     """
     logger.debug('Dispatching taking games screenshots tasks')
     try:
-        group = dramatiq.group(take_sized_screenshots_by_game_id.message(
-            game_id) for game_id in funcs.get_games_ids())
-        group.run()
-        # Dictionary to collect game identifiers as keys and screenshot file
-        # name lists as values for report
-        games_screenshots = {}
-        for game_id, files in group.get_results(block=True):
-            if files:
-                logger.debug("Game %s => %s", game_id, files)
-                games_screenshots[game_id] = files
-        return games_screenshots
+        games = funcs.get_games()
     except ValidationError as e:
         logger.error('Parse error: %s', e)
+        return False
     except APIError as e:
         logger.error('API response error: %s', e)
-    return {}
+        return False
+
+    games_ids = [game.id for game in games]
+    deferred = {}
+    if settings.SCREENSHOT_SCHEDULE_ADAPTIVE and games:
+        games_ids, deferred, schedule = funcs.schedule_screenshots(
+            games,
+            funcs.get_screenshot_schedule_policy(),
+            settings.TASK_INTERVAL_SCREENSHOT,
+        )
+        logger.debug('Screenshots of %d games are due, %d are deferred',
+                     len(games_ids), len(deferred))
+        funcs.write_screenshot_schedule_json_report(schedule)
+
+    if not games_ids:
+        # The latest screenshots of deferred games are reported as they are
+        if deferred:
+            write_games_screenshots_json_report.send(deferred)
+        return False
+
+    funcs.start_screenshot_cycle(games_ids + list(deferred), cycle_id)
+    for game_id, files in deferred.items():
+        funcs.save_screenshot_cycle_result(cycle_id, game_id, files)
+    _get_screenshot_cycle_barrier(cycle_id).create(len(games_ids))
+
+    if settings.SCREENSHOT_BATCH_TARGET_DURATION <= 0:
+        dramatiq.group(take_sized_screenshots_by_game_id.message(
+            game_id, cycle_id) for game_id in games_ids).run()
+        return True
 
+    batches = funcs.plan_screenshot_batches(
+        games_ids,
+        funcs.get_render_durations(games_ids),
+        settings.SCREENSHOT_BATCH_TARGET_DURATION,
+        settings.SCREENSHOT_BATCH_MAX_SIZE,
+        settings.SCREENSHOT_BATCH_DEFAULT_DURATION,
+    )
+    logger.debug('Dispatching %d games in %d batches',
+                 len(games_ids), len(batches))
+    dramatiq.group(take_sized_screenshots_by_games_ids.message(
+        batch, cycle_id) for batch in batches).run()
+    return True
 
-@dramatiq.actor(max_retries=0, store_results=True)
-def take_sized_screenshots_by_game_id(game_id: int) -> Tuple[int, list]:
+
+def _finish_screenshot_cycle(cycle_id: str):
+    """Releases the lease of a screenshot cycle and dispatches a coalesced
+    cycle if there is one.
+    """
+    if not SCREENSHOT_CYCLE_LEASE.release(cycle_id):
+        logger.warning('Lease of screenshot cycle %s has expired', cycle_id)
+        return
+    if funcs.pop_screenshot_cycle_pending():
+        dispatch_taking_screenshots.send()
+
+
+@dramatiq.actor(max_retries=0)
+def take_sized_screenshots_by_game_id(game_id: int,
+                                      cycle_id: str = None) \
+        -> Tuple[int, list]:
     """Takes screenshots with regards to required sizes which are specified in
-    settings.
+    settings. If the task belongs to a screenshot cycle, its result is saved
+    for the report of the cycle, and the last task of the cycle sends the
+    report.
 
     Parameters:
       game_id: a game identifier
+      cycle_id: a screenshot cycle identifier
 
     Returns:
       A tuple with a game identifier and a list of screenshot files
     """
+    files = []
+    try:
+        files = _take_sized_screenshots(game_id)
+    finally:
+        # The cycle must not wait for a task which has failed
+        if cycle_id is not None:
+            _finish_screenshot_cycle_task(cycle_id, game_id, files)
+    return game_id, files
+
+
+@dramatiq.actor(max_retries=0)
+def take_sized_screenshots_by_games_ids(games_ids: List[int],
+                                        cycle_id: str = None):
+    """Takes screenshots of a batch of games, see
+    funcs.take_sized_screenshots_by_games_ids. A game which fails doesn't
+    fail the batch, its result is reported as a game without screenshots.
+
+    Parameters:
+      games_ids: game identifiers
+      cycle_id: a screenshot cycle identifier
+    """
+    # A game is marked before its result is signalled, so the result of a
+    # game is never signalled twice even if signalling fails
+    signalled = set()
+    try:
+        games_screenshots = _take_batch_screenshots(games_ids)
+        if cycle_id is not None:
+            for game_id in games_ids:
+                signalled.add(game_id)
+                _finish_screenshot_cycle_task(cycle_id,
+                                              game_id,
+                                              games_screenshots[game_id])
+    finally:
+        # The cycle must not wait for games of an interrupted batch
+        if cycle_id is not None:
+            for game_id in games_ids:
+                if game_id not in signalled:
+                    signalled.add(game_id)
+                    _finish_screenshot_cycle_task(cycle_id, game_id, [])
+
+
+def _take_batch_screenshots(games_ids: List[int]) -> Dict[int, List[str]]:
+    """Takes screenshots of a batch of games and returns file names by game
+    identifiers. Errors of games are logged and no files are returned for
+    them. Only requests of game objects hold API concurrency slots, not
+    rendering.
+    """
+    logger.debug('Taking screenshots: %s', games_ids)
+    try:
+        results = funcs.take_sized_screenshots_by_games_ids(games_ids)
+    except RateLimitExceeded as e:
+        logger.warning('Screenshots of games %s skipped: %s', games_ids, e)
+        return {game_id: [] for game_id in games_ids}
+
+    games_screenshots = {}
+    for game_id, result in results.items():
+        if isinstance(result, ValidationError):
+            logger.error('Parse error: %s', result)
+        elif isinstance(result, APIError):
+            logger.error('API response error: %s', result)
+        elif isinstance(result, RateLimitExceeded):
+            logger.warning('Screenshots of game %s skipped: %s', game_id,
+                           result)
+        elif isinstance(result, Exception):
+            logger.error('Taking screenshots of game %s failed', game_id,
+                         exc_info=result)
+        games_screenshots[game_id] = [] if isinstance(result, Exception) \
+            else result
+    return games_screenshots
+
+
+def _take_sized_screenshots(game_id: int) -> List[str]:
+    """Takes screenshots of a game and returns file names, errors of the
+    server's responses are logged and no files are returned then. Only the
+    request of game objects holds an API concurrency slot, not rendering.
+    """
     logger.debug('Taking screenshots: %s', game_id)
     try:
-        files = funcs.take_sized_screenshots_by_game_id(game_id)
-        return game_id, files
+        return funcs.take_sized_screenshots_by_game_id(game_id)
     except ValidationError as e:
         logger.error('Parse error: %s', e)
     except APIError as e:
         logger.error('API response error: %s', e)
-    return game_id, []
+    except RateLimitExceeded as e:
+        logger.warning('Screenshots of game %s skipped: %s', game_id, e)
+    return []
+
+
+def _finish_screenshot_cycle_task(cycle_id: str,
+                                  game_id: int,
+                                  files: List[str]):
+    # A game which has been signalled is not counted by the barrier again
+    if not funcs.save_screenshot_cycle_result(cycle_id, game_id, files):
+        logger.warning('Game %s of screenshot cycle %s signalled again',
+                       game_id, cycle_id)
+        return
+    # The barrier stays released after the last party has arrived, so only
+    # the task which claims the report finishes the cycle
+    if _get_screenshot_cycle_barrier(cycle_id).wait(block=False) and \
+            funcs.claim_screenshot_cycle_report(cycle_id):
+        games_screenshots = funcs.pop_screenshot_cycle_results(cycle_id)
+        logger.debug('Screenshot cycle %s has finished', cycle_id)
+        write_games_screenshots_json_report.send(games_screenshots)
+        _finish_screenshot_cycle(cycle_id)
 
 
 @dramatiq.actor(max_retries=5)
@@ -146,18 +363,57 @@ def delete_expired_screenshots_cache():
 
 @dramatiq.actor(max_retries=1)
 def dispatch_deleting_empty_games():
-    """Dispatches deleting empty games
+    """Dispatches deleting games which have been empty for the grace period
+    in chunks, see settings
     """
     try:
         games = funcs.get_games()
-        empty_games = list(filter(lambda game: game.is_empty(), games))
-        logger.debug('found %d empty games', len(empty_games))
-        for game in empty_games:
-            delete_game.send(game.id)
     except ValidationError as e:
         logger.error('Parse error: %s', e)
+        return
     except APIError as e:
         logger.error('API response error: %s', e)
+        return
+
+    empty_since = funcs.track_empty_games(games)
+    deadline = time.time() - settings.GAMES_CLEANUP_GRACE_PERIOD
+    expired_games_ids = sorted(game_id
+                               for game_id, since in empty_since.items()
+                               if since <= deadline)
+    logger.debug('found %d empty games, %d of them to delete',
+                 len(empty_since), len(expired_games_ids))
+
+    chunk_size = settings.GAMES_CLEANUP_CHUNK_SIZE
+    for i in range(0, len(expired_games_ids), chunk_size):
+        delete_games.send(expired_games_ids[i:i + chunk_size])
+
+
+@dramatiq.actor(max_retries=10)
+def delete_games(games_ids: List[int]):
+    """Deletes a chunk of games which are still empty. No more chunks than
+    the concurrency limit in settings are deleted at once, the task is
+    retried later if the limit is reached.
+
+    Parameters:
+      games_ids: game identifiers
+    """
+    with GAMES_CLEANUP_LIMITER.acquire():
+        deleted = []
+        for game_id in games_ids:
+            logger.debug('deleting game id=%d', game_id)
+            try:
+                with funcs.api_concurrency_slot():
+                    # A player could have joined the game since the check
+                    if funcs.get_game(game_id, use_cache=False).is_empty():
+                        funcs.delete_game(game_id)
+                        deleted.append(game_id)
+            except ValidationError as e:
+                logger.error('Parse error: %s', e)
+            except APIError as e:
+                logger.error('API response error: %s', e)
+            except RateLimitExceeded as e:
+                logger.warning('Deleting game %s skipped: %s', game_id, e)
+        funcs.forget_empty_games(deleted)
 
 
 @dramatiq.actor(max_retries=1)
@@ -166,7 +422,8 @@ def delete_game(game_id: int):
     """
     logger.debug('deleting game id=%d', game_id)
     try:
-        funcs.delete_game(game_id)
+        with funcs.api_concurrency_slot():
+            funcs.delete_game(game_id)
     except ValidationError as e:
         logger.error('Parse error: %s', e)
     except APIError as e:
@@ -0,0 +1,305 @@
+"""The module contains an asyncio client of the API of the Snake-Server. It
+has the same methods and returns the same models as lib.api.APIClient, and
+it can fetch game objects of many games concurrently.
+"""
+
+import asyncio
+from typing import AsyncIterator, Iterable, Optional, Tuple, Union
+
+import aiohttp
+from pydantic import ValidationError
+
+from lib.api import _PARAM_LABEL_LIMIT, _PARAM_LABEL_SORTING, _SORTING, \
+    APIError, BaseAPIClient
+from lib.columnar import ColumnarObjects
+from lib.schemas import (
+    Broadcast,
+    Capacity,
+    DeletedGame,
+    Game,
+    Games,
+    Info,
+    Objects,
+    Pong,
+)
+
+
+# Errors of fetching of game objects of a game which don't stop fetching of
+# other games
+FETCH_ERRORS = (
+    APIError,
+    ValidationError,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+)
+
+
+class AsyncAPIClient(BaseAPIClient):
+    """A client which sends requests with an aiohttp session. The client
+    must be closed, it is better to use it as an async context manager:
+
+        async with AsyncAPIClient(api_address) as client:
+            games = await client.get_games()
+    """
+
+    def __init__(self, api_address: str, user_agent: str = None,
+                 trusted: bool = False, validation_sample_rate: int = 0,
+                 timeout: Optional[Tuple[float, float]] = None,
+                 keep_alive: bool = True, gzip: bool = True,
+                 pool_size: int = 10):
+        """
+        Parameters:
+          pool_size(int): a maximum number of connections to the server
+
+        See BaseAPIClient for other parameters.
+        """
+        super().__init__(api_address, user_agent,
+                         trusted=trusted,
+                         validation_sample_rate=validation_sample_rate,
+                         timeout=timeout,
+                         keep_alive=keep_alive,
+                         gzip=gzip)
+
+        assert pool_size > 0, 'Pool size must be positive'
+
+        self._pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> 'AsyncAPIClient':
+        return self
+
+    async def __aexit__(self, *_exc_info):
+        await self.close()
+
+    async def close(self):
+        """Closes connections of the client.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # A session must be created in a running event loop
+        if self._session is None:
+            timeout = aiohttp.ClientTimeout()
+            if self._timeout is not None:
+                connect_timeout, read_timeout = self._timeout
+                timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout,
+                                                sock_read=read_timeout)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._pool_size,
+                    force_close=not self._keep_alive,
+                ),
+                headers=dict(self._initial_headers()),
+                timeout=timeout,
+                auto_decompress=True,
+            )
+        return self._session
+
+    async def get_games(self, limit: int = None, sorting: str = None) \
+            -> Games:
+        """Returns information about ongoing games on a server.
+
+        Returns:
+          information about games.
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        params = {}
+        if limit:
+            params[_PARAM_LABEL_LIMIT] = limit
+        if sorting:
+            assert sorting in _SORTING, 'Invalid sorting type has been passed'
+            params[_PARAM_LABEL_SORTING] = sorting
+        raw = await self._call('GET', 'games', params=params)
+        return self._parse(Games, raw)
+
+    async def get_game(self, game_id: int) -> Game:
+        """Returns information about a game with specified game identifier.
+
+        Parameters:
+          game_id: a game identifier.
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        raw = await self._call('GET', 'games', str(game_id))
+        return self._parse(Game, raw)
+
+    async def get_game_objects(self, game_id: int) -> Objects:
+        """Returns information about game objects placed on a game map.
+
+        Parameters:
+          game_id: a game identifier.
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        raw = await self._call('GET', 'games', str(game_id), 'objects')
+        return self._parse(Objects, raw)
+
+    async def get_game_objects_columnar(self, game_id: int) \
+            -> ColumnarObjects:
+        """Returns game objects placed on a game map in arrays, see
+        ColumnarObjects.
+
+        Parameters:
+          game_id: a game identifier.
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        raw = await self._call('GET', 'games', str(game_id), 'objects')
+        return self._parse_columnar(raw)
+
+    async def fetch_objects_many(self,
+                                 games_ids: Iterable[int],
+                                 concurrency: int = 10,
+                                 columnar: bool = False) \
+            -> AsyncIterator[Tuple[int, Union[Objects, ColumnarObjects,
+                                              Exception]]]:
+        """Fetches game objects of many games concurrently and yields them
+        as soon as they are received, so the order of games isn't kept. An
+        error of a game is yielded in place of its objects and doesn't stop
+        fetching of other games, see FETCH_ERRORS.
+
+        Parameters:
+          games_ids: game identifiers.
+          concurrency: a maximum number of requests in flight.
+          columnar: a flag whether to parse objects into arrays.
+
+        Returns:
+          An async iterator of pairs of a game identifier and its objects
+          or an error.
+        """
+        assert concurrency > 0, 'Concurrency must be positive'
+
+        semaphore = asyncio.BoundedSemaphore(concurrency)
+        get_objects = self.get_game_objects_columnar if columnar \
+            else self.get_game_objects
+
+        async def fetch(game_id: int):
+            async with semaphore:
+                try:
+                    return game_id, await get_objects(game_id)
+                except FETCH_ERRORS as e:
+                    return game_id, e
+
+        tasks = [asyncio.ensure_future(fetch(game_id))
+                 for game_id in games_ids]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # Requests in flight are aborted when the caller stops iterating
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def delete_game(self, game_id: int) -> DeletedGame:
+        """Sends a request for deleting a game.
+
+        Parameters:
+          game_id: a game identifier.
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        raw = await self._call('DELETE', 'games', str(game_id))
+        return self._parse(DeletedGame, raw)
+
+    async def create_game(self, limit: int, width: int, height: int,
+                          enable_walls: bool = True) -> Game:
+        """Sends a request to create a game with given parameters.
+
+        Parameters:
+          limit: players limit.
+          width: map width.
+          height: map height.
+          enable_walls: flag whether to add walls or not.
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        raw = await self._call('POST', 'games', data={
+            'limit': limit,
+            'width': width,
+            'height': height,
+            'enable_walls': str(enable_walls),
+        })
+        return self._parse(Game, raw)
+
+    async def broadcast(self, game_id: int, message: str) -> Broadcast:
+        raw = await self._call('POST', 'games', str(game_id), 'broadcast',
+                               data={
+                                   'message': message,
+                               })
+        return self._parse(Broadcast, raw)
+
+    async def capacity(self) -> Capacity:
+        """Sends a request to retrieve information about server current
+        capacity.
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        raw = await self._call('GET', 'capacity')
+        return self._parse(Capacity, raw)
+
+    async def info(self) -> Info:
+        """Sends a request to retrieve information about server
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        raw = await self._call('GET', 'info')
+        return self._parse(Info, raw)
+
+    async def ping(self) -> Pong:
+        """Sends ping request
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        raw = await self._call('GET', 'ping')
+        return self._parse(Pong, raw)
+
+    async def _call(self, method: str, *url_parts, data=None,
+                    params=None) -> bytes:
+        """Sends a request with given method, url, data, params to the
+        specified server address.
+
+        Parameters:
+          method: a request method
+          url_parts: request URL parts
+          data: data to be sent
+          params: params to be sent
+
+        Raises:
+          APIError: when something wrong with a response.
+        """
+        async with self._get_session().request(method.upper(),
+                                               self._mk_url(url_parts),
+                                               params=params,
+                                               data=data) as response:
+            raw = await response.read()
+
+        self._check_response(response.status, raw)
+        return raw
+
+
+__all__ = [
+    'AsyncAPIClient',
+    'FETCH_ERRORS',
+]
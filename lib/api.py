@@ -2,23 +2,54 @@
 the Snake-Server.
 """
 
-from typing import Tuple
-
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, \
+    Tuple, Type, Union
+
+from pydantic import ValidationError, parse_obj_as
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import MissingError
+from pydantic.utils import ROOT_KEY
+from requests.adapters import HTTPAdapter
 from requests.utils import CaseInsensitiveDict
-from requests import Session
-
+from requests import Response, Session
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    from orjson import loads as _fast_json_loads
+except ImportError:  # orjson is optional
+    from json import loads as _fast_json_loads
+
+from lib import settings
+from lib import metrics
+from lib.cache import LRUCache
+from lib.columnar import ColumnarObjects
+from lib.jsonstream import iter_items
+from lib.singleflight import SharedSingleFlight, SingleFlight
 from lib.schemas import (
+    OBJECT_MODELS,
+    AnyObject,
     Broadcast,
     Capacity,
     DeletedGame,
     Game,
     Games,
     Info,
+    Map,
+    Model,
     Objects,
     Pong,
+    construct,
+    parse_object,
 )
 
 
+logger = logging.getLogger(__name__)
+logger.setLevel(settings.LOG_LEVEL)
+
+
 _PARAM_LABEL_LIMIT = 'limit'
 _PARAM_LABEL_SORTING = 'sorting'
 
@@ -27,6 +58,23 @@ SORTING_RANDOM = 'random'
 
 _SORTING = (SORTING_SMART, SORTING_RANDOM)
 
+# Read-only endpoints whose responses can be cached, see APIClient
+ENDPOINT_GAMES = 'games'
+ENDPOINT_GAME = 'game'
+ENDPOINT_INFO = 'info'
+ENDPOINT_CAPACITY = 'capacity'
+
+
+class _CachedResponse(NamedTuple):
+    """A response body in the response cache with validators of the server
+    for conditional requests
+    """
+
+    raw: bytes
+    expires: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+
 
 class APIError(Exception):
     """Wraps an error which occurs in a process of request processing on
@@ -46,7 +94,67 @@ class APIError(Exception):
         return 'status {}: {}'.format(self.status, self.text)
 
 
-class APIClient(Session):
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    """Counts connections which are opened to the server
+    """
+
+    def _new_conn(self):
+        metrics.API_CONNECTIONS_OPENED.inc()
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    """Counts connections which are opened to the server
+    """
+
+    def _new_conn(self):
+        metrics.API_CONNECTIONS_OPENED.inc()
+        return super()._new_conn()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """An HTTP adapter which keeps a pool of connections to the server and
+    counts sent requests and opened connections. An adapter may be shared
+    by clients of different threads, the rate of connection reuse is
+    1 - connections opened / requests sent.
+
+    An observer is called with a latency in seconds and a failure flag of
+    every request. Requests fail with server errors or connection errors.
+    """
+
+    def __init__(self, *args,
+                 observer: Optional[Callable[[float, bool], None]] = None,
+                 **kwargs):
+        self._observer = observer
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, *args, **kwargs) -> Response:
+        metrics.API_REQUESTS_SENT.inc()
+        if self._observer is None:
+            return super().send(request, *args, **kwargs)
+
+        start = time.monotonic()
+        try:
+            response = super().send(request, *args, **kwargs)
+        except Exception:
+            self._observer(time.monotonic() - start, True)
+            raise
+        self._observer(time.monotonic() - start, response.status_code >= 500)
+        return response
+
+
+class BaseAPIClient:
+    """Contains settings of a client and parsing of responses which don't
+    depend on the way requests are sent.
+    """
+
     _DEFAULT_USER_AGENT = 'SnakeAPIClient'
 
     # Field to look into in case of error
@@ -55,20 +163,37 @@ class APIClient(Session):
     _DEFAULT_ERROR_MSG = 'undefined error'
     _RESPONSE_NOT_JSON_MSG = 'response supposed to be a valid json object'
 
-    def __init__(self, api_address: str, user_agent: str = None):
+    # A size of chunks of streamed responses in bytes
+    _STREAM_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, api_address: str, user_agent: str = None,
+                 trusted: bool = False, validation_sample_rate: int = 0,
+                 timeout: Optional[Tuple[float, float]] = None,
+                 keep_alive: bool = True, gzip: bool = True):
         """
         Parameters:
           api_address(str): an API address
           user_agent(str): a user agent description to be sent to a server
+          trusted(bool): a flag whether to build models of responses
+            without validation
+          validation_sample_rate(int): validate 1 in N responses in the
+            trusted mode, 0 disables validation
+          timeout(tuple): connect and read timeouts in seconds, no timeouts
+            by default
+          keep_alive(bool): a flag whether to keep connections open between
+            requests
+          gzip(bool): a flag whether to ask for compressed responses
         """
         assert api_address.endswith('/api'), 'API address must end with "/api"'
-
-        super().__init__()
+        assert validation_sample_rate >= 0, 'Sample rate must not be negative'
 
         self._api_address = api_address
         self._user_agent = user_agent or self._DEFAULT_USER_AGENT
-
-        self.headers.update(self._initial_headers())
+        self._trusted = trusted
+        self._validation_sample_rate = validation_sample_rate
+        self._timeout = timeout
+        self._keep_alive = keep_alive
+        self._gzip = gzip
 
     def _initial_headers(self) -> CaseInsensitiveDict:
         """
@@ -79,11 +204,199 @@ class APIClient(Session):
             'User-Agent': self._user_agent,
             'X-Snake-Client': self._user_agent,
             'Accept': 'application/json',
+            'Accept-Encoding': 'gzip' if self._gzip else 'identity',
+            'Connection': 'keep-alive' if self._keep_alive else 'close',
         })
 
-    def get_games(self, limit: int = None, sorting: str = None) -> Games:
+    def _parse_columnar(self, raw: bytes) -> ColumnarObjects:
+        """Parses a response with game objects into arrays.
+
+        Raises:
+          ValidationError: when it isn't possible to parse response.
+        """
+        if self._trusted:
+            try:
+                return ColumnarObjects.parse_obj(_fast_json_loads(raw))
+            except ValueError:
+                pass
+        return ColumnarObjects.parse_raw(raw)
+
+    def _parse_object(self, obj: Any) -> AnyObject:
+        """Parses a streamed game object. The object is built without
+        validation in the trusted mode.
+
+        Raises:
+          ValidationError: when the object is invalid.
+        """
+        try:
+            if self._trusted and obj.get('type') in OBJECT_MODELS:
+                return construct(OBJECT_MODELS[obj['type']], obj)
+            return parse_object(obj)
+        except (KeyError, TypeError, AttributeError):
+            # Let pydantic raise a validation error
+            return parse_obj_as(AnyObject, obj)
+
+    def _parse(self, model: Type[Model], raw: Union[bytes, Any]) -> Model:
+        """Parses a response. In the trusted mode the response is decoded
+        with a fast JSON parser and the model is built without validation,
+        except for 1 in N sampled responses which are validated to catch
+        changes of the server's schema. Failures of sampled validation are
+        counted and logged.
+
+        Parameters:
+          model: a model of the response.
+          raw: a response body or a decoded part of a streamed response.
+
+        Raises:
+          ValidationError: when it isn't possible to parse response.
+        """
+        if not isinstance(raw, bytes):
+            obj = raw
+        elif not self._trusted:
+            return model.parse_raw(raw)
+        else:
+            try:
+                obj = _fast_json_loads(raw)
+            except ValueError:
+                # Let pydantic raise a validation error
+                return model.parse_raw(raw)
+
+        if not self._trusted:
+            return model.parse_obj(obj)
+
+        rate = self._validation_sample_rate
+        if rate and random.randrange(rate) == 0:
+            metrics.API_RESPONSES_VALIDATED.labels(model.__name__).inc()
+            try:
+                return model.parse_obj(obj)
+            except ValidationError as e:
+                metrics.API_VALIDATION_FAILURES.labels(model.__name__).inc()
+                logger.error('Sampled validation of %s failed: %s',
+                             model.__name__, e)
+                raise
+
+        try:
+            if isinstance(obj, dict):
+                return construct(model, obj)
+        except (KeyError, TypeError, AttributeError):
+            pass
+
+        # The response is malformed, validate it to raise an error
+        return model.parse_obj(obj)
+
+    def _mk_url(self, url_parts: Tuple[str, ...]):
+        # TODO: use urllib to construct the url.
+        return '/'.join((self._api_address,) + url_parts)
+
+    def _check_response(self, status: int, raw: bytes):
+        """Raises an error if a response status isn't successful.
+
+        Parameters:
+          status: a response status
+          raw: a response body
+
+        Raises:
+          APIError: when something wrong with a response.
+        """
+        if status not in (200, 201):
+            try:
+                result = _fast_json_loads(raw)
+            except ValueError as e:
+                raise APIError(status, self._RESPONSE_NOT_JSON_MSG) from e
+            self._raise_error(status, result)
+
+    def _raise_error(self, status: int, result: dict):
+        """Raises an error with given status and data.
+
+        Parameters:
+          status: a response status
+          result: a parsed response result
+        Raises:
+          APIError: always raises that exception.
+        """
+        raise APIError(status, self._get_error_text(result))
+
+    def _get_error_text(self, result: dict) -> str:
+        """Returns an error text.
+
+        Parameters:
+          result: a result dictionary.
+        """
+        try:
+            return result[self._FIELD_TEXT]
+        except KeyError:
+            return self._DEFAULT_ERROR_MSG
+
+
+class APIClient(BaseAPIClient, Session):
+    """A client which sends requests with a session of requests.
+
+    Responses of read-only endpoints can be cached for TTLs of endpoints.
+    When a cached response expires and the server has provided an ETag or
+    Last-Modified header, the response is revalidated with a conditional
+    request. Cache lookups are counted by endpoints and results: a hit, a
+    revalidation, a miss or a bypass when a caller asks for a fresh
+    response.
+
+    Identical concurrent GET requests can be coalesced: threads which share
+    a single flight get the result of the identical call in flight. With a
+    shared single flight raw responses of uncached requests are shared by
+    worker processes too.
+    """
+
+    def __init__(self, api_address: str, user_agent: str = None,
+                 trusted: bool = False, validation_sample_rate: int = 0,
+                 adapter: Optional[HTTPAdapter] = None,
+                 timeout: Optional[Tuple[float, float]] = None,
+                 keep_alive: bool = True, gzip: bool = True,
+                 cache: Optional[LRUCache] = None,
+                 cache_ttls: Optional[Dict[str, float]] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 shared_single_flight: Optional[SharedSingleFlight] = None):
+        """
+        Parameters:
+          adapter(HTTPAdapter): an adapter with a pool of connections,
+            a client has its own pool by default
+          cache(LRUCache): a cache of responses which may be shared by
+            clients, responses aren't cached by default
+          cache_ttls(dict): TTLs of cached responses in seconds by
+            endpoints, see ENDPOINT_* constants, responses of endpoints
+            without TTLs aren't cached
+          single_flight(SingleFlight): coalesces identical calls of clients
+            of threads which share it, calls aren't coalesced by default
+          shared_single_flight(SharedSingleFlight): coalesces identical
+            requests of worker processes
+
+        See BaseAPIClient for other parameters.
+        """
+        BaseAPIClient.__init__(self, api_address, user_agent,
+                               trusted=trusted,
+                               validation_sample_rate=validation_sample_rate,
+                               timeout=timeout,
+                               keep_alive=keep_alive,
+                               gzip=gzip)
+        Session.__init__(self)
+
+        if adapter is not None:
+            self.mount('http://', adapter)
+            self.mount('https://', adapter)
+
+        self._cache = cache
+        self._cache_ttls = cache_ttls or {}
+        self._single_flight = single_flight
+        self._shared_single_flight = shared_single_flight
+
+        self.headers.update(self._initial_headers())
+
+    def get_games(self, limit: int = None, sorting: str = None,
+                  use_cache: bool = True) -> Games:
         """Returns information about ongoing games on a server.
 
+        Parameters:
+          limit: a maximum number of games.
+          sorting: a sorting type.
+          use_cache: a flag whether a cached response can be returned.
+
         Returns:
           information about games.
 
@@ -97,21 +410,28 @@ class APIClient(Session):
         if sorting:
             assert sorting in _SORTING, 'Invalid sorting type has been passed'
             params[_PARAM_LABEL_SORTING] = sorting
-        raw = self._call('GET', 'games', params=params)
-        return Games.parse_raw(raw)
+        return self._coalesce(
+            ('games', limit, sorting, use_cache),
+            lambda: self._parse(Games, self._call_cached(
+                ENDPOINT_GAMES, 'games', params=params, use_cache=use_cache)),
+        )
 
-    def get_game(self, game_id: int) -> Game:
+    def get_game(self, game_id: int, use_cache: bool = True) -> Game:
         """Returns information about a game with specified game identifier.
 
         Parameters:
           game_id: a game identifier.
+          use_cache: a flag whether a cached response can be returned.
 
         Raises:
           APIError: when something wrong with a response.
           ValidationError: when it isn't possible to parse response.
         """
-        raw = self._call('GET', 'games', str(game_id))
-        return Game.parse_raw(raw)
+        return self._coalesce(
+            ('game', game_id, use_cache),
+            lambda: self._parse(Game, self._call_cached(
+                ENDPOINT_GAME, 'games', str(game_id), use_cache=use_cache)),
+        )
 
     def get_game_objects(self, game_id: int) -> Objects:
         """Returns information about game objects placed on a game map.
@@ -123,8 +443,66 @@ class APIClient(Session):
           APIError: when something wrong with a response.
           ValidationError: when it isn't possible to parse response.
         """
-        raw = self._call('GET', 'games', str(game_id), 'objects')
-        return Objects.parse_raw(raw)
+        return self._coalesce(
+            ('objects', game_id),
+            lambda: self._parse(Objects, self._get(
+                'games', str(game_id), 'objects')),
+        )
+
+    def get_game_objects_columnar(self, game_id: int) -> ColumnarObjects:
+        """Returns game objects placed on a game map in arrays, see
+        ColumnarObjects.
+
+        Parameters:
+          game_id: a game identifier.
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        return self._coalesce(
+            ('columnar_objects', game_id),
+            lambda: self._parse_columnar(self._get(
+                'games', str(game_id), 'objects')),
+        )
+
+    def iter_game_objects(self, game_id: int) \
+            -> Iterator[Union[Map, AnyObject]]:
+        """Streams game objects placed on a game map. The map and game
+        objects are decoded and yielded one by one while the response is
+        being received, so the whole response is never kept in memory. The
+        order of the map and the objects depends on the server.
+
+        Parameters:
+          game_id: a game identifier.
+
+        Raises:
+          APIError: when something wrong with a response.
+          ValidationError: when it isn't possible to parse response.
+        """
+        has_map = False
+        with self._request('GET', 'games', str(game_id), 'objects',
+                           stream=True) as response:
+            items = iter_items(
+                response.iter_content(self._STREAM_CHUNK_SIZE),
+                streamed_keys=('objects',),
+            )
+            try:
+                for key, value in items:
+                    if key == 'objects':
+                        yield self._parse_object(value)
+                    elif key == 'map':
+                        has_map = True
+                        yield self._parse(Map, value)
+            except ValidationError:
+                raise
+            except ValueError as e:
+                raise ValidationError([ErrorWrapper(e, loc=ROOT_KEY)],
+                                      Objects) from e
+
+        if not has_map:
+            raise ValidationError([ErrorWrapper(MissingError(), loc='map')],
+                                  Objects)
 
     def delete_game(self, game_id: int) -> DeletedGame:
         """Sends a request for deleting a game.
@@ -137,7 +515,9 @@ class APIClient(Session):
           ValidationError: when it isn't possible to parse response.
         """
         raw = self._call('DELETE', 'games', str(game_id))
-        return DeletedGame.parse_raw(raw)
+        if self._cache is not None:
+            self._cache.discard(self._cache_key(('games', str(game_id))))
+        return self._parse(DeletedGame, raw)
 
     def create_game(self, limit: int, width: int, height: int,
                     enable_walls: bool = True) -> Game:
@@ -159,34 +539,46 @@ class APIClient(Session):
             'height': height,
             'enable_walls': enable_walls,
         })
-        return Game.parse_raw(raw)
+        return self._parse(Game, raw)
 
     def broadcast(self, game_id: int, message: str) -> Broadcast:
         raw = self._call('POST', 'games', str(game_id), 'broadcast', data={
             'message': message,
         })
-        return Broadcast.parse_raw(raw)
+        return self._parse(Broadcast, raw)
 
-    def capacity(self) -> Capacity:
+    def capacity(self, use_cache: bool = True) -> Capacity:
         """Sends a request to retrieve information about server current
         capacity.
 
+        Parameters:
+          use_cache: a flag whether a cached response can be returned.
+
         Raises:
           APIError: when something wrong with a response.
           ValidationError: when it isn't possible to parse response.
         """
-        raw = self._call('GET', 'capacity')
-        return Capacity.parse_raw(raw)
+        return self._coalesce(
+            ('capacity', use_cache),
+            lambda: self._parse(Capacity, self._call_cached(
+                ENDPOINT_CAPACITY, 'capacity', use_cache=use_cache)),
+        )
 
-    def info(self) -> Info:
+    def info(self, use_cache: bool = True) -> Info:
         """Sends a request to retrieve information about server
 
+        Parameters:
+          use_cache: a flag whether a cached response can be returned.
+
         Raises:
           APIError: when something wrong with a response.
           ValidationError: when it isn't possible to parse response.
         """
-        raw = self._call('GET', 'info')
-        return Info.parse_raw(raw)
+        return self._coalesce(
+            ('info', use_cache),
+            lambda: self._parse(Info, self._call_cached(
+                ENDPOINT_INFO, 'info', use_cache=use_cache)),
+        )
 
     def ping(self) -> Pong:
         """Sends ping request
@@ -196,14 +588,10 @@ class APIClient(Session):
           ValidationError: when it isn't possible to parse response.
         """
         raw = self._call('GET', 'ping')
-        return Pong.parse_raw(raw)
-
-    def _mk_url(self, url_parts: Tuple[str, ...]):
-        # TODO: use urllib to construct the url.
-        return '/'.join((self._api_address,) + url_parts)
+        return self._parse(Pong, raw)
 
     def _call(self, method: str, *url_parts, data=None,
-              params=None, stream=None) -> bytes:
+              params=None) -> bytes:
         """Sends a request with given method, url, data, params to the
         specified server address.
 
@@ -212,51 +600,142 @@ class APIClient(Session):
           url_parts: request URL parts
           data: data to be sent
           params: params to be sent
-          stream: flag
 
         Raises:
           APIError: when something wrong with a response.
         """
-        response = self.request(method.upper(),
-                                self._mk_url(url_parts),
-                                params=params,
-                                data=data,
-                                stream=stream)
+        return self._request(method, *url_parts,
+                             data=data, params=params).content
 
-        if response.status_code not in (200, 201):
-            try:
-                self._raise_error(response.status_code, response.json())
-            except ValueError as e:
-                raise APIError(response.status_code,
-                               self._RESPONSE_NOT_JSON_MSG) from e
+    def _coalesce(self, key: tuple, fn: Callable[[], Model]) -> Model:
+        """Returns the result of the identical call in flight or calls the
+        function if calls aren't coalesced or there is no such call.
+        """
+        if self._single_flight is None:
+            return fn()
+        return self._single_flight.do((self._api_address,) + key, fn)
 
-        return response.content
+    def _get(self, *url_parts, params=None) -> bytes:
+        """Sends a GET request like _call does. The request is shared by
+        worker processes if there is a shared single flight.
 
-    def _raise_error(self, status: int, result: dict):
-        """Raises an error with given status and data.
+        Raises:
+          APIError: when something wrong with a response.
+        """
+        if self._shared_single_flight is None:
+            return self._call('GET', *url_parts, params=params)
+
+        key = self._mk_url(url_parts)
+        if params:
+            key += '?' + '&'.join('{}={}'.format(name, value)
+                                  for name, value in sorted(params.items()))
+        return self._shared_single_flight.do(
+            key, lambda: self._call('GET', *url_parts, params=params))
+
+    def _call_cached(self, endpoint: str, *url_parts, params=None,
+                     use_cache: bool = True) -> bytes:
+        """Sends a GET request like _call does unless there is a fresh
+        response of the endpoint in the cache. An expired response is
+        revalidated if the server has provided validators. A fresh response
+        is put in the cache even if the cache is bypassed.
 
         Parameters:
-          status: a response status
-          result: a parsed response result
+          endpoint: an endpoint of the request, see ENDPOINT_* constants
+          url_parts: request URL parts
+          params: params to be sent
+          use_cache: a flag whether a cached response can be returned
+
         Raises:
-          APIError: always raises that exception.
+          APIError: when something wrong with a response.
         """
-        raise APIError(status, self._get_error_text(result))
-
-    def _get_error_text(self, result: dict) -> str:
-        """Returns an error text.
+        ttl = self._cache_ttls.get(endpoint, 0)
+        if self._cache is None or ttl <= 0:
+            return self._get(*url_parts, params=params)
+
+        key = self._cache_key(url_parts, params)
+        cached = self._cache.get(key) if use_cache else None
+        if cached is not None and time.monotonic() < cached.expires:
+            metrics.API_CACHE_LOOKUPS.labels(endpoint, 'hit').inc()
+            return cached.raw
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        response = self._request('GET', *url_parts, params=params,
+                                 headers=headers,
+                                 not_modified=bool(headers))
+        if response.status_code == 304:
+            result = 'revalidated'
+            raw = cached.raw
+            etag = response.headers.get('ETag', cached.etag)
+            last_modified = response.headers.get('Last-Modified',
+                                                 cached.last_modified)
+        else:
+            result = 'miss' if use_cache else 'bypass'
+            raw = response.content
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+
+        metrics.API_CACHE_LOOKUPS.labels(endpoint, result).inc()
+        self._cache.put(key, _CachedResponse(raw, time.monotonic() + ttl,
+                                             etag, last_modified))
+        return raw
+
+    def _cache_key(self, url_parts: Tuple[str, ...], params=None) -> tuple:
+        return (self._api_address, url_parts,
+                tuple(sorted((params or {}).items())))
+
+    def _request(self, method: str, *url_parts, data=None,
+                 params=None, stream=None, headers=None,
+                 not_modified: bool = False) -> Response:
+        """Sends a request like _call does and returns the response. The
+        body of a streamed response is read by the caller which must close
+        the response.
 
         Parameters:
-          result: a result dictionary.
+          method: a request method
+          url_parts: request URL parts
+          data: data to be sent
+          params: params to be sent
+          stream: a flag whether to stream the response body
+          headers: additional headers of the request
+          not_modified: a flag whether the status 304 of a conditional
+            request is expected
+
+        Raises:
+          APIError: when something wrong with a response.
         """
-        try:
-            return result[self._FIELD_TEXT]
-        except KeyError:
-            return self._DEFAULT_ERROR_MSG
+        response = self.request(method.upper(),
+                                self._mk_url(url_parts),
+                                params=params,
+                                data=data,
+                                headers=headers,
+                                stream=stream,
+                                timeout=self._timeout)
+
+        if not_modified and response.status_code == 304:
+            return response
+
+        if response.status_code not in (200, 201):
+            try:
+                self._check_response(response.status_code, response.content)
+            finally:
+                response.close()
+
+        return response
 
 
 __all__ = [
     'APIClient',
+    'BaseAPIClient',
+    'ENDPOINT_GAMES',
+    'ENDPOINT_GAME',
+    'ENDPOINT_INFO',
+    'ENDPOINT_CAPACITY',
     'APIError',
     'SORTING_SMART',
     'SORTING_RANDOM',
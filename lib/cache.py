@@ -0,0 +1,148 @@
+"""The module contains in-process caches.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+from lib import metrics
+
+
+class LRUCache:
+    """A thread safe bounded cache which evicts least recently used items.
+
+    The cache counts hits, misses and evictions. The counters are exported
+    as metrics labeled with the name of the cache.
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        """Initializes a cache.
+
+        Parameters:
+          name: a name of the cache for metrics and logs.
+          maxsize: a maximum number of items, 0 disables the cache.
+        """
+        assert maxsize >= 0, 'Cache size must not be negative'
+
+        self.name = name
+        self._maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxsize(self) -> int:
+        """A maximum number of items in the cache
+        """
+        return self._maxsize
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns a cached value or the default value if there is no such
+        key in the cache.
+        """
+        with self._lock:
+            try:
+                value = self._items[key]
+            except KeyError:
+                self.misses += 1
+                metrics.CACHE_MISSES.labels(self.name).inc()
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+        metrics.CACHE_HITS.labels(self.name).inc()
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """Puts a value in the cache evicting least recently used items if
+        the cache is full.
+        """
+        with self._lock:
+            if self._maxsize == 0:
+                return
+            self._items[key] = value
+            self._items.move_to_end(key)
+            self._evict(self._maxsize)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Removes a key from the cache and returns its value or the default
+        value if there is no such key in the cache. Counts as a hit or a miss
+        like get does, so values which are taken for exclusive use are
+        accounted too.
+        """
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                metrics.CACHE_MISSES.labels(self.name).inc()
+                return default
+            self.hits += 1
+            self._report_size()
+        metrics.CACHE_HITS.labels(self.name).inc()
+        return value
+
+    def discard(self, key: Hashable):
+        """Removes a key from the cache if it is there. Unlike pop it isn't
+        counted as a hit or a miss, it is used to invalidate stale values.
+        """
+        with self._lock:
+            if key in self._items:
+                del self._items[key]
+                self._report_size()
+
+    def resize(self, maxsize: int):
+        """Changes the maximum number of items in the cache.
+        """
+        assert maxsize >= 0, 'Cache size must not be negative'
+
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict(maxsize)
+
+    def clear(self):
+        """Removes all items from the cache. Counters are kept.
+        """
+        with self._lock:
+            self._items.clear()
+            self._report_size()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns cache counters.
+        """
+        with self._lock:
+            return {
+                'size': len(self._items),
+                'maxsize': self._maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _evict(self, maxsize: int):
+        evicted = 0
+        while len(self._items) > maxsize:
+            self._items.popitem(last=False)
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            metrics.CACHE_EVICTIONS.labels(self.name).inc(evicted)
+        self._report_size()
+
+    def _report_size(self):
+        metrics.CACHE_SIZE.labels(self.name).set(len(self._items))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def __repr__(self):
+        return '{}.{}(name={!r}, maxsize={})'.format(
+            __name__,
+            self.__class__.__name__,
+            self.name,
+            self._maxsize)
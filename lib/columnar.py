@@ -0,0 +1,276 @@
+"""The module contains a columnar representation of game objects. Rendering
+needs only a type and dots of every object, so objects are kept in NumPy
+arrays instead of pydantic models with lists of tuples.
+"""
+
+import json
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+from pydantic import ValidationError
+
+from lib.schemas import (
+    OBJECT_LABEL_MOUSE,
+    OBJECT_MODELS,
+    AnyObject,
+    ColorRGB,
+    Dot,
+    Map,
+    ObjectType,
+    Objects,
+    OneDotObject,
+)
+
+
+# Objects types by type codes which are stored in arrays
+TYPES: List[str] = list(OBJECT_MODELS)
+
+TYPE_CODES: Dict[str, int] = {
+    object_type: code for code, object_type in enumerate(TYPES)
+}
+
+# Colors of objects by type codes
+TYPE_COLORS: List[ColorRGB] = [
+    OBJECT_MODELS[object_type].color() for object_type in TYPES
+]
+
+_ONE_DOT_CODES = frozenset(
+    code for code, object_type in enumerate(TYPES)
+    if issubclass(OBJECT_MODELS[object_type], OneDotObject)
+)
+
+_MOUSE_CODE = TYPE_CODES[OBJECT_LABEL_MOUSE]
+
+
+class ColumnarObject:
+    """A view of a game object in columnar objects. The view provides the
+    same attributes as a model of the object.
+    """
+
+    __slots__ = ('_objects', '_index')
+
+    def __init__(self, objects: 'ColumnarObjects', index: int):
+        self._objects = objects
+        self._index = index
+
+    @property
+    def id(self) -> int:
+        return int(self._objects.ids[self._index])
+
+    @property
+    def type(self) -> ObjectType:
+        return ObjectType(TYPES[self._objects.types[self._index]])
+
+    @property
+    def dots(self) -> List[Dot]:
+        start, stop = self._objects.offsets[self._index:self._index + 2]
+        return [tuple(dot) for dot in self._objects.dots[start:stop].tolist()]
+
+    @property
+    def dot(self) -> Dot:
+        if self._objects.types[self._index] not in _ONE_DOT_CODES:
+            raise AttributeError('object has more than one dot')
+        return self.dots[0]
+
+    @property
+    def direction(self) -> str:
+        try:
+            return self._objects.directions[self._index]
+        except KeyError:
+            raise AttributeError('object has no direction') from None
+
+    def color(self) -> ColorRGB:
+        return TYPE_COLORS[self._objects.types[self._index]]
+
+    def to_model(self) -> AnyObject:
+        """Returns a model of the object.
+        """
+        fields = {'id': self.id}
+        if self._objects.types[self._index] in _ONE_DOT_CODES:
+            fields['dot'] = self.dot
+        else:
+            fields['dots'] = self.dots
+        if self._index in self._objects.directions:
+            fields['direction'] = self.direction
+        return OBJECT_MODELS[TYPES[self._objects.types[self._index]]](
+            **fields)
+
+    def __repr__(self):
+        return '{}.{}(id={}, type={})'.format(
+            __name__,
+            self.__class__.__name__,
+            self.id,
+            TYPES[self._objects.types[self._index]])
+
+
+class ColumnarObjects:
+    """Game objects of a map in arrays:
+
+    - types: type codes of objects, see TYPES
+    - ids: identifiers of objects, 64 bit integers
+    - offsets: offsets of dots of objects, dots of the object i are
+      dots[offsets[i]:offsets[i + 1]]
+    - dots: X and Y of dots of all objects of shape (number of dots, 2)
+    - directions: directions of mice by indices of objects
+
+    Iteration yields views of objects which can be used in place of models.
+    """
+
+    __slots__ = ('map', 'types', 'ids', 'offsets', 'dots', 'directions')
+
+    def __init__(self,
+                 map_: Map,
+                 types: np.ndarray,
+                 ids: np.ndarray,
+                 offsets: np.ndarray,
+                 dots: np.ndarray,
+                 directions: Dict[int, str]):
+        self.map = map_
+        self.types = types
+        self.ids = ids
+        self.offsets = offsets
+        self.dots = dots
+        self.directions = directions
+
+    @property
+    def map_size(self) -> tuple:
+        """Size of map in dots
+        """
+        return self.map.width, self.map.height
+
+    def counts(self) -> np.ndarray:
+        """Returns numbers of dots of objects.
+        """
+        return np.diff(self.offsets)
+
+    @classmethod
+    def parse_raw(cls, raw: bytes) -> 'ColumnarObjects':
+        """Parses a JSON response of the server for game's object list.
+
+        Raises:
+          ValidationError: when the response is invalid.
+        """
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            return cls.from_models(Objects.parse_raw(raw))
+        return cls.parse_obj(obj)
+
+    @classmethod
+    def parse_obj(cls, obj: Any) -> 'ColumnarObjects':
+        """Parses a decoded response of the server for game's object list.
+        If anything is wrong with the response or there are objects without
+        types, the response is parsed with models to raise the same error as
+        Objects.parse_obj does or to find types of objects.
+
+        Raises:
+          ValidationError: when the response is invalid.
+        """
+        try:
+            return cls._parse(obj)
+        except (ValidationError, KeyError, TypeError, ValueError,
+                AttributeError, OverflowError):
+            return cls.from_models(Objects.parse_obj(obj))
+
+    @classmethod
+    def _parse(cls, obj: Any) -> 'ColumnarObjects':
+        types = []
+        ids = []
+        counts = []
+        dots = []
+        directions = {}
+
+        for index, raw_object in enumerate(obj['objects']):
+            code = TYPE_CODES[raw_object['type']]
+            types.append(code)
+            ids.append(raw_object['id'])
+            if code in _ONE_DOT_CODES:
+                dots.append(raw_object['dot'])
+                counts.append(1)
+            else:
+                object_dots = raw_object['dots']
+                dots.extend(object_dots)
+                counts.append(len(object_dots))
+            if code == _MOUSE_CODE:
+                direction = raw_object['direction']
+                if not isinstance(direction, str):
+                    raise TypeError('direction must be a string')
+                directions[index] = direction
+
+        return cls._from_lists(Map.parse_obj(obj['map']),
+                               types, ids, counts, dots, directions)
+
+    @classmethod
+    def from_models(cls, objects: Objects) -> 'ColumnarObjects':
+        """Returns columnar objects of parsed models.
+        """
+        types = []
+        ids = []
+        counts = []
+        dots = []
+        directions = {}
+
+        for index, game_object in enumerate(objects.objects):
+            code = TYPE_CODES[game_object.type.value]
+            object_dots = game_object.dots
+            types.append(code)
+            ids.append(game_object.id)
+            dots.extend(object_dots)
+            counts.append(len(object_dots))
+            if code == _MOUSE_CODE:
+                directions[index] = game_object.direction
+
+        return cls._from_lists(objects.map,
+                               types, ids, counts, dots, directions)
+
+    @classmethod
+    def _from_lists(cls,
+                    map_: Map,
+                    types: list,
+                    ids: list,
+                    counts: list,
+                    dots: list,
+                    directions: Dict[int, str]) -> 'ColumnarObjects':
+        offsets = np.zeros(len(counts) + 1, dtype=np.intp)
+        np.cumsum(counts, out=offsets[1:])
+
+        dots_array = np.array(dots, dtype=np.intp)
+        if not dots:
+            dots_array = dots_array.reshape(0, 2)
+        if dots_array.ndim != 2 or dots_array.shape[1] != 2:
+            raise ValueError('dots must be pairs of coordinates')
+
+        return cls(map_,
+                   np.array(types, dtype=np.uint8),
+                   np.array(ids, dtype=np.int64),
+                   offsets,
+                   dots_array,
+                   directions)
+
+    def to_models(self) -> Objects:
+        """Returns models of the objects.
+        """
+        return Objects(
+            objects=[game_object.to_model() for game_object in self],
+            map=self.map,
+        )
+
+    def __len__(self) -> int:
+        return self.types.size
+
+    def __getitem__(self, index: int) -> ColumnarObject:
+        if not -len(self) <= index < len(self):
+            raise IndexError('object index out of range')
+        return ColumnarObject(self, index % len(self))
+
+    def __iter__(self) -> Iterator[ColumnarObject]:
+        for index in range(len(self)):
+            yield ColumnarObject(self, index)
+
+    def __repr__(self):
+        return '{}.{}(width={}, height={}, objects={}, dots={})'.format(
+            __name__,
+            self.__class__.__name__,
+            *self.map_size,
+            len(self),
+            len(self.dots))
@@ -0,0 +1,224 @@
+"""The module contains image encoders which save screenshots to files in
+different formats.
+"""
+
+import logging
+import os
+import struct
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, Type
+
+import numpy as np
+
+from lib import settings
+from lib import metrics
+from lib.screenshot import Screenshot
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings.LOG_LEVEL)
+
+
+class Encoder(ABC):
+    """An abstract screenshot encoder
+    """
+
+    FORMAT: str
+    EXTENSION: str
+    # Whether the encoder compresses banded screenshots band by band, other
+    # encoders need the whole image
+    STREAMS_BANDS = False
+
+    def __init__(self,
+                 quality: int = settings.SCREENSHOT_QUALITY,
+                 optimize: bool = True,
+                 effort: int = None,
+                 label: str = ''):
+        """Initializes an encoder.
+
+        Parameters:
+          quality: quality of lossy formats.
+          optimize: a flag whether to spend more time for a smaller file.
+          effort: compression effort, the meaning depends on the format.
+            The format's default is used if it isn't set.
+          label: a label of encoded images in metrics, e.g. a size slug.
+        """
+        self.quality = quality
+        self.optimize = optimize
+        self.effort = effort
+        self.label = label
+
+    def encode(self, screenshot: Screenshot, path: str):
+        """Encodes a screenshot and writes it to a file. Encoding time and
+        file size are reported as metrics.
+
+        Parameters:
+          screenshot: a screenshot.
+          path: a destination path.
+        """
+        start = time.perf_counter()
+        self._save(screenshot, path)
+        duration = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+        metrics.ENCODE_DURATION.labels(self.FORMAT, self.label) \
+            .observe(duration)
+        metrics.ENCODED_BYTES.labels(self.FORMAT, self.label).observe(size)
+        logger.debug('Encoded %s in %.3fs: %d bytes', path, duration, size)
+
+    @abstractmethod
+    def _save(self, screenshot: Screenshot, path: str):
+        """Saves a screenshot to a file.
+        """
+
+    def __repr__(self):
+        return '{}.{}(quality={}, optimize={}, effort={}, label={!r})'.format(
+            __name__,
+            self.__class__.__name__,
+            self.quality,
+            self.optimize,
+            self.effort,
+            self.label)
+
+
+class JPEGEncoder(Encoder):
+    """Saves screenshots as JPEG images. The effort isn't used.
+    """
+
+    FORMAT = settings.SCREENSHOT_FORMAT_JPEG
+    EXTENSION = '.jpeg'
+
+    def _save(self, screenshot: Screenshot, path: str):
+        screenshot.img.save(path,
+                            format='JPEG',
+                            quality=self.quality,
+                            optimize=self.optimize)
+
+
+class PNGEncoder(Encoder):
+    """Saves screenshots as palette PNG images without quantization. The
+    quality isn't used, the effort is the zlib compression level from 0 to 9.
+    Strict sized images are resized with the nearest neighbour filter.
+
+    Banded screenshots are compressed band by band as they are rendered, so
+    the whole image is never kept in memory. The optimization flag isn't
+    used for them.
+    """
+
+    FORMAT = settings.SCREENSHOT_FORMAT_PNG
+    EXTENSION = '.png'
+    STREAMS_BANDS = True
+
+    SIGNATURE = b'\x89PNG\r\n\x1a\n'
+    # The compression level which Pillow uses by default
+    DEFAULT_EFFORT = 6
+
+    def _save(self, screenshot: Screenshot, path: str):
+        if screenshot.banded:
+            with open(path, 'wb') as fp:
+                self._write_bands(screenshot, fp)
+            return
+
+        options = {}
+        if self.effort is not None:
+            options['compress_level'] = self.effort
+        screenshot.palette_img.save(path,
+                                    format='PNG',
+                                    optimize=self.optimize,
+                                    **options)
+
+    def _write_bands(self, screenshot: Screenshot, fp: BinaryIO):
+        width, height = screenshot.size
+        effort = self.DEFAULT_EFFORT if self.effort is None else self.effort
+        palette = screenshot.palette
+
+        fp.write(self.SIGNATURE)
+        # 8 bit depth, indexed color, no interlace
+        self._write_chunk(fp, b'IHDR', struct.pack('>IIBBBBB',
+                                                   width, height,
+                                                   8, 3, 0, 0, 0))
+        self._write_chunk(fp, b'PLTE', palette.lut[:len(palette)].tobytes())
+
+        compressor = zlib.compressobj(effort)
+        for band in screenshot.bands():
+            # Every row starts with the filter type, 0 is no filter
+            rows = np.zeros((band.shape[0], width + 1), dtype=np.uint8)
+            rows[:, 1:] = band
+            data = compressor.compress(rows.tobytes())
+            if data:
+                self._write_chunk(fp, b'IDAT', data)
+        self._write_chunk(fp, b'IDAT', compressor.flush())
+
+        self._write_chunk(fp, b'IEND', b'')
+
+    @staticmethod
+    def _write_chunk(fp: BinaryIO, chunk_type: bytes, data: bytes):
+        fp.write(struct.pack('>I', len(data)))
+        fp.write(chunk_type)
+        fp.write(data)
+        fp.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+class WebPEncoder(Encoder):
+    """Saves screenshots as lossy WebP images. The effort is the WebP method
+    from 0 to 6. Optimization turns on the slowest method if the effort
+    isn't set.
+    """
+
+    FORMAT = settings.SCREENSHOT_FORMAT_WEBP
+    EXTENSION = '.webp'
+
+    LOSSLESS = False
+
+    def _save(self, screenshot: Screenshot, path: str):
+        method = self.effort
+        if method is None:
+            method = 6 if self.optimize else 4
+        screenshot.img.save(path,
+                            format='WEBP',
+                            lossless=self.LOSSLESS,
+                            quality=self.quality,
+                            method=method)
+
+
+class LosslessWebPEncoder(WebPEncoder):
+    """Saves screenshots as lossless WebP images. The quality is the effort
+    of compression from 0 to 100.
+    """
+
+    FORMAT = settings.SCREENSHOT_FORMAT_WEBP_LOSSLESS
+
+    LOSSLESS = True
+
+
+ENCODERS: Dict[str, Type[Encoder]] = {
+    encoder.FORMAT: encoder
+    for encoder in (JPEGEncoder, PNGEncoder, WebPEncoder, LosslessWebPEncoder)
+}
+
+EXTENSIONS = tuple(sorted({encoder.EXTENSION
+                           for encoder in ENCODERS.values()}))
+
+
+def get_encoder(image_format: str, **options) -> Encoder:
+    """Returns an encoder of a format.
+
+    Parameters:
+      image_format: a format, see settings.SCREENSHOT_FORMATS.
+      options: encoder options, see Encoder.
+    """
+    return ENCODERS[image_format](**options)
+
+
+__all__ = [
+    'Encoder',
+    'JPEGEncoder',
+    'PNGEncoder',
+    'WebPEncoder',
+    'LosslessWebPEncoder',
+    'ENCODERS',
+    'EXTENSIONS',
+    'get_encoder',
+]
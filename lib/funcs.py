@@ -5,21 +5,240 @@ the Snake-Server instance.
 import os
 import os.path
 import json
+import hashlib
+import uuid
 import itertools
-from typing import List, Tuple, Dict
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, List, Tuple, Dict, \
+    Optional, Union
 
 from PIL import Image
 
-from lib.api import APIClient
+from lib.aioapi import AsyncAPIClient
+from lib.api import APIClient, PooledHTTPAdapter, ENDPOINT_CAPACITY, \
+    ENDPOINT_GAME, ENDPOINT_GAMES, ENDPOINT_INFO
 from lib import settings
-from lib.screenshot import Screenshot
-from lib.schemas import Game, Map, AnyObjectList, DeletedGame
+from lib import metrics
+from lib.cache import LRUCache
+from lib.columnar import ColumnarObjects
+from lib.encoders import Encoder, EXTENSIONS, get_encoder
+from lib.limiter import AdaptiveConcurrencyLimiter
+from lib.screenshot import Screenshot, DotFrame, DotFrameBuilder
+from lib.schemas import Game, Map, AnyObjectList, DeletedGame, Objects
+from lib.schedule import GameSchedule, ScreenshotSchedulePolicy
+from lib.singleflight import SharedSingleFlight, SingleFlight
+from lib.state import StateStore, RedisStateStore, StubStateStore
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings.LOG_LEVEL)
+
+_state_store: Optional[StateStore] = None
+
+# Pools of connections to the server and single flights of API calls by
+# identifiers of worker processes. They are shared by the long-lived clients
+# of threads of a process.
+_api_adapters: Dict[int, PooledHTTPAdapter] = {}
+_api_single_flights: Dict[int, SingleFlight] = {}
+_process_locals_lock = threading.Lock()
+_api_clients = threading.local()
+
+# A function which observes latencies and failures of requests to the server
+_api_observer: Optional[Callable[[float, bool], None]] = None
+
+# A limiter of concurrent requests to the server shared by worker processes
+_api_concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None
+
+# Responses of read-only endpoints of the server shared by clients of threads
+# of a worker process
+_api_responses = LRUCache('api_responses', settings.API_CACHE_SIZE)
+
+_encode_executor: Optional[ThreadPoolExecutor] = None
+
+# The latest screenshots of games which are updated in the incremental
+# render mode. Keys are tuples of a game identifier, a size slug, a max size
+# and a strict sized flag.
+_retained_screenshots = LRUCache('retained_screenshots',
+                                 settings.SCREENSHOT_RETAINED_CACHE_SIZE)
+
+
+def _get_process_local(registry: Dict[int, Any], factory: Callable) -> Any:
+    """Returns an object of the worker process from a registry or creates
+    it. Objects which are inherited from a parent process are dropped,
+    because connections and calls in flight must not be shared by two
+    processes.
+    """
+    pid = os.getpid()
+    with _process_locals_lock:
+        value = registry.get(pid)
+        if value is None:
+            registry.clear()
+            value = factory()
+            registry[pid] = value
+    return value
+
+
+def get_api_adapter() -> PooledHTTPAdapter:
+    """Returns a pool of connections to the server of the worker process.
+    """
+    return _get_process_local(
+        _api_adapters,
+        lambda: PooledHTTPAdapter(pool_maxsize=settings.API_POOL_SIZE,
+                                  observer=_observe_api_request),
+    )
+
+
+def observe_api_requests(observer: Callable[[float, bool], None]):
+    """Sets a function which is called with a latency in seconds and a
+    failure flag of every request to the server.
+    """
+    global _api_observer
+    _api_observer = observer
+
+
+def _observe_api_request(latency: float, failed: bool):
+    if _api_observer is not None:
+        _api_observer(latency, failed)
+
+
+def limit_api_concurrency(limiter: Optional[AdaptiveConcurrencyLimiter]):
+    """Sets a limiter of concurrent requests to the server, see
+    api_concurrency_slot. None disables the limit.
+    """
+    global _api_concurrency_limiter
+    _api_concurrency_limiter = limiter
+
+
+def api_concurrency_slot() -> ContextManager:
+    """Returns a context manager which waits for a slot of the limiter of
+    concurrent requests to the server if it is set. A slot should be held
+    only while a request is in flight.
+
+    Raises:
+      RateLimitExceeded: when there is no free slot in time.
+    """
+    if _api_concurrency_limiter is None:
+        return nullcontext()
+    return _api_concurrency_limiter.wait(settings.API_CONCURRENCY_WAIT_TIMEOUT)
+
+
+def api_concurrency_slots(count: int) -> ContextManager[int]:
+    """Returns a context manager which waits for a slot of the limiter of
+    concurrent requests to the server if it is set and takes up to count
+    slots which are free. It returns a number of requests which can be sent
+    concurrently.
+
+    Parameters:
+      count: a maximum number of concurrent requests.
+
+    Raises:
+      RateLimitExceeded: when there is no free slot in time.
+    """
+    if _api_concurrency_limiter is None:
+        return nullcontext(count)
+    return _api_concurrency_limiter.wait_many(
+        count, settings.API_CONCURRENCY_WAIT_TIMEOUT)
+
+
+def get_api_single_flight() -> Optional[SingleFlight]:
+    """Returns a single flight of API calls of the worker process or None
+    if calls aren't coalesced.
+    """
+    if settings.API_SINGLE_FLIGHT == settings.API_SINGLE_FLIGHT_OFF:
+        return None
+    return _get_process_local(_api_single_flights, SingleFlight)
+
+
+def get_api_shared_single_flight() -> Optional[SharedSingleFlight]:
+    """Returns a single flight of API requests shared by worker processes
+    or None if it is disabled in settings.
+    """
+    if settings.API_SINGLE_FLIGHT != settings.API_SINGLE_FLIGHT_CLUSTER:
+        return None
+    return SharedSingleFlight(
+        get_state_store(),
+        lock_ttl=int((settings.API_CONNECT_TIMEOUT +
+                      settings.API_READ_TIMEOUT) * 1000),
+        result_ttl=settings.API_SINGLE_FLIGHT_RESULT_TTL,
+    )
 
 
 def get_api_client() -> APIClient:
-    """Returns a client object to connect to the Snake-Server.
+    """Returns a client object to connect to the Snake-Server. A client is
+    created once per thread, since sessions can't be shared by threads, and
+    it sends requests through the connection pool of the worker process.
+    """
+    adapter = get_api_adapter()
+    client = getattr(_api_clients, 'client', None)
+    if client is None or client.get_adapter(
+            settings.SNAKE_API_ADDRESS) is not adapter:
+        client = APIClient(
+            settings.SNAKE_API_ADDRESS,
+            settings.CLIENT_NAME,
+            trusted=settings.API_TRUSTED,
+            validation_sample_rate=settings.API_VALIDATION_SAMPLE_RATE,
+            adapter=adapter,
+            timeout=(settings.API_CONNECT_TIMEOUT, settings.API_READ_TIMEOUT),
+            keep_alive=settings.API_KEEP_ALIVE,
+            gzip=settings.API_GZIP,
+            cache=_api_responses if settings.API_CACHE_SIZE > 0 else None,
+            cache_ttls={
+                ENDPOINT_GAMES: settings.API_CACHE_TTL_GAMES,
+                ENDPOINT_GAME: settings.API_CACHE_TTL_GAME,
+                ENDPOINT_INFO: settings.API_CACHE_TTL_INFO,
+                ENDPOINT_CAPACITY: settings.API_CACHE_TTL_CAPACITY,
+            },
+            single_flight=get_api_single_flight(),
+            shared_single_flight=get_api_shared_single_flight(),
+        )
+        _api_clients.client = client
+    return client
+
+
+def get_state_store() -> StateStore:
+    """Returns a store of a state shared by worker processes.
+    """
+    global _state_store
+    if _state_store is None:
+        if settings.UNIT_TESTS:
+            _state_store = StubStateStore()
+        else:
+            _state_store = RedisStateStore(url=settings.STATE_REDIS_URL)
+    return _state_store
+
+
+def get_encode_executor() -> Optional[ThreadPoolExecutor]:
+    """Returns a thread pool of the worker process which encodes and writes
+    screenshots or None if the pool is disabled in settings.
     """
-    return APIClient(settings.SNAKE_API_ADDRESS, settings.CLIENT_NAME)
+    global _encode_executor
+    if _encode_executor is None and settings.SCREENSHOT_ENCODE_THREADS > 0:
+        _encode_executor = ThreadPoolExecutor(
+            max_workers=settings.SCREENSHOT_ENCODE_THREADS,
+            thread_name_prefix='screenshot-encoder',
+        )
+    return _encode_executor
+
+
+def _submit(fn: Callable, *args) -> Future:
+    """Submits a call to the encode thread pool. If the pool is disabled,
+    the call is made right away and a done future is returned.
+    """
+    executor = get_encode_executor()
+    if executor is not None:
+        return executor.submit(fn, *args)
+
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
 
 
 def get_games_ids() -> List[int]:
@@ -46,8 +265,11 @@ def get_games() -> List[Game]:
     return list([game for game in games.games])
 
 
-def get_game_objects(game_id: int) -> Tuple[Map, AnyObjectList]:
-    """Returns map size and game objects.
+def get_game_objects(game_id: int) \
+        -> Tuple[Map, Union[AnyObjectList, ColumnarObjects]]:
+    """Returns map size and game objects. The objects are columnar if it is
+    enabled in settings. The request holds a slot of the API concurrency
+    limiter.
 
     Parameters:
       game_id: a game identifier.
@@ -55,16 +277,104 @@ def get_game_objects(game_id: int) -> Tuple[Map, AnyObjectList]:
     Raises:
       APIError: when Rest API has returned an error.
       ValidationError: when server's response was invalid
+      RateLimitExceeded: when there is no free API concurrency slot in time.
     """
     client = get_api_client()
-    objects = client.get_game_objects(game_id)
+    with api_concurrency_slot():
+        if settings.SCREENSHOT_COLUMNAR_OBJECTS:
+            objects = client.get_game_objects_columnar(game_id)
+        else:
+            objects = client.get_game_objects(game_id)
+    return _unpack_objects(objects)
+
+
+def _unpack_objects(objects: Union[Objects, ColumnarObjects]) \
+        -> Tuple[Map, Union[AnyObjectList, ColumnarObjects]]:
+    if isinstance(objects, ColumnarObjects):
+        return objects.map, objects
     return objects.map, objects.objects
 
 
+def get_games_objects(games_ids: List[int]) \
+        -> Dict[int, Union[Objects, ColumnarObjects, Exception]]:
+    """Fetches game objects of many games concurrently. The objects are
+    columnar if it is enabled in settings. Errors of fetching of objects of
+    a game are returned in place of the objects, see lib.aioapi.FETCH_ERRORS.
+    Every request in flight holds a slot of the API concurrency limiter, so
+    no more requests than free slots are sent concurrently.
+
+    Parameters:
+      games_ids: game identifiers.
+
+    Raises:
+      RateLimitExceeded: when there is no free API concurrency slot in time.
+    """
+    async def fetch(concurrency: int) -> dict:
+        async with AsyncAPIClient(
+            settings.SNAKE_API_ADDRESS,
+            settings.CLIENT_NAME,
+            trusted=settings.API_TRUSTED,
+            validation_sample_rate=settings.API_VALIDATION_SAMPLE_RATE,
+            timeout=(settings.API_CONNECT_TIMEOUT, settings.API_READ_TIMEOUT),
+            keep_alive=settings.API_KEEP_ALIVE,
+            gzip=settings.API_GZIP,
+            pool_size=concurrency,
+        ) as client:
+            return {
+                game_id: result
+                async for game_id, result in client.fetch_objects_many(
+                    games_ids,
+                    concurrency=concurrency,
+                    columnar=settings.SCREENSHOT_COLUMNAR_OBJECTS,
+                )
+            }
+
+    concurrency = max(1, min(settings.API_FETCH_CONCURRENCY, len(games_ids)))
+    with api_concurrency_slots(concurrency) as concurrency:
+        return asyncio.run(fetch(concurrency))
+
+
+def get_server_capacity() -> float:
+    """Returns the current capacity of the server.
+
+    Raises:
+      APIError: when Rest API has returned an error.
+      ValidationError: when server's response was invalid
+    """
+    client = get_api_client()
+    return client.capacity(use_cache=False).capacity
+
+
+def get_game_frame(game_id: int) -> DotFrame:
+    """Returns a frame of game objects. The objects are streamed from the
+    server and drawn as they are received without keeping the whole
+    response in memory. The streamed request holds a slot of the API
+    concurrency limiter.
+
+    Parameters:
+      game_id: a game identifier.
+
+    Raises:
+      APIError: when Rest API has returned an error.
+      ValidationError: when server's response was invalid
+      RateLimitExceeded: when there is no free API concurrency slot in time.
+    """
+    client = get_api_client()
+    builder = DotFrameBuilder()
+    with api_concurrency_slot():
+        for item in client.iter_game_objects(game_id):
+            if isinstance(item, Map):
+                builder.set_map_size((item.width, item.height))
+            else:
+                builder.add_object(item)
+    return builder.build()
+
+
 def generate_screenshot_image(map_size: Tuple[int, int],
                               max_size: Tuple[int, int],
                               objects: AnyObjectList,
-                              strict_sized: bool) -> Image:
+                              strict_sized: bool,
+                              exact_fit: bool = False) -> Image:
     """Generates screenshot image.
 
     Parameters:
@@ -73,18 +383,42 @@ def generate_screenshot_image(map_size: Tuple[int, int],
       objects: list of game objects
       strict_sized: a flag whether to generate an image with strict limited
         size or not
+      exact_fit: a flag whether to lay out a strict sized image to fit the
+        strict size instead of resizing it
 
     Returns:
       An image instance.
     """
-    screenshot = Screenshot(map_size, max_size, objects, strict_sized)
+    screenshot = Screenshot(map_size, max_size, objects, strict_sized,
+                            exact_fit)
     return screenshot.img
 
 
+def get_screenshot_encoder(size_slug: str) -> Encoder:
+    """Returns an encoder for screenshots of a size which is configured in
+    settings. The default format is used for unknown sizes.
+
+    Parameters:
+      size_slug: a slug of the screenshot size
+    """
+    options = settings.SCREENSHOT_ENCODERS.get(size_slug, {
+        'format': settings.SCREENSHOT_FORMAT,
+        'quality': settings.SCREENSHOT_QUALITY,
+        'optimize': settings.SCREENSHOT_OPTIMIZE,
+        'effort': settings.SCREENSHOT_COMPRESS_EFFORT,
+    })
+    return get_encoder(options['format'],
+                       quality=options['quality'],
+                       optimize=options['optimize'],
+                       effort=options['effort'],
+                       label=size_slug)
+
+
 def get_image_path(game_id: int,
                    map_size: Tuple[int, int],
                    size_slug: str) -> str:
-    """Returns an image destination path
+    """Returns an image destination path. The file extension depends on the
+    format of the size.
 
     Parameters:
       game_id: a game identifier
@@ -95,19 +429,22 @@ def get_image_path(game_id: int,
       A path string
     """
     width, height = map_size
+    extension = get_screenshot_encoder(size_slug).EXTENSION
     return os.path.join(settings.SCREENSHOT_DEST_PATH,
-                        'g{}s{}x{}-{}.jpeg'.format(game_id,
-                                                   width,
-                                                   height,
-                                                   size_slug))
+                        'g{}s{}x{}-{}{}'.format(game_id,
+                                                width,
+                                                height,
+                                                size_slug,
+                                                extension))
 
 
 def save_objects_as_screenshot(path: str,
                                map_size: Tuple[int, int],
                                max_size: Tuple[int, int],
                                objects: AnyObjectList,
-                               quality: int,
-                               strict_sized: bool):
+                               encoder: Encoder,
+                               strict_sized: bool,
+                               exact_fit: bool = False):
     """Saves given objects as a screenshot file.
 
     Parameters:
@@ -115,39 +452,715 @@ def save_objects_as_screenshot(path: str,
       map_size: size of map in dots
       max_size: limits for result image in px
       objects: list of game objects
-      quality: quality
+      encoder: an image encoder
+      strict_sized: a flag whether to generate an image with strict limited
+        size or not
+      exact_fit: a flag whether to lay out a strict sized image to fit the
+        strict size instead of resizing it
+    """
+    screenshot = Screenshot(map_size, max_size, objects, strict_sized,
+                            exact_fit, encoder.STREAMS_BANDS)
+    save_screenshot(path, screenshot, encoder)
+
+
+def save_frame_as_screenshot(path: str,
+                             frame: DotFrame,
+                             max_size: Tuple[int, int],
+                             encoder: Encoder,
+                             strict_sized: bool,
+                             exact_fit: bool = False):
+    """Saves given frame as a screenshot file.
+
+    Parameters:
+      path: path destination
+      frame: a frame of a game map
+      max_size: limits for result image in px
+      encoder: an image encoder
       strict_sized: a flag whether to generate an image with strict limited
         size or not
+      exact_fit: a flag whether to lay out a strict sized image to fit the
+        strict size instead of resizing it
+    """
+    screenshot = Screenshot.from_frame(frame, max_size, strict_sized,
+                                       exact_fit, encoder.STREAMS_BANDS)
+    save_screenshot(path, screenshot, encoder)
+
+
+def save_screenshot(path: str, screenshot: Screenshot, encoder: Encoder):
+    """Saves a screenshot file.
+
+    Parameters:
+      path: path destination
+      screenshot: a screenshot
+      encoder: an image encoder
+    """
+    encoder.encode(screenshot, path)
+
+
+def save_incremental_screenshot(path: str,
+                                game_id: int,
+                                size_slug: str,
+                                frame: DotFrame,
+                                max_size: Tuple[int, int],
+                                encoder: Encoder,
+                                strict_sized: bool,
+                                exact_fit: bool = False):
+    """Saves given frame as a screenshot file updating the screenshot which
+    is retained by the worker process, see take_incremental_screenshot.
+
+    Parameters:
+      path: path destination
+      game_id: a game identifier
+      size_slug: a slug of the screenshot size
+      frame: a frame of a game map
+      max_size: limits for result image in px
+      encoder: an image encoder
+      strict_sized: a flag whether to generate an image with strict limited
+        size or not
+      exact_fit: a flag whether to lay out a strict sized image to fit the
+        strict size instead of resizing it
+    """
+    screenshot = take_incremental_screenshot(game_id,
+                                             size_slug,
+                                             frame,
+                                             max_size,
+                                             strict_sized,
+                                             exact_fit,
+                                             encoder.STREAMS_BANDS)
+    save_screenshot(path, screenshot, encoder)
+    retain_screenshot(game_id,
+                      size_slug,
+                      screenshot,
+                      max_size,
+                      strict_sized,
+                      exact_fit)
+
+
+def take_incremental_screenshot(game_id: int,
+                                size_slug: str,
+                                frame: DotFrame,
+                                max_size: Tuple[int, int],
+                                strict_sized: bool,
+                                exact_fit: bool = False,
+                                allow_banded: bool = False) -> Screenshot:
+    """Returns a screenshot of a game frame. If the worker process has
+    retained the latest screenshot of the game of the same size, only changed
+    dots are repainted on it. Otherwise a new screenshot is taken. The
+    returned screenshot is owned by the caller until it is retained again
+    with retain_screenshot.
+
+    Parameters:
+      game_id: a game identifier
+      size_slug: a slug of the screenshot size
+      frame: a frame of a game map
+      max_size: limits for result image in px
+      strict_sized: a flag whether to generate an image with strict limited
+        size or not
+      exact_fit: a flag whether to lay out a strict sized image to fit the
+        strict size instead of resizing it
+      allow_banded: a flag whether a big image can be rendered in bands
+    """
+    key = (game_id, size_slug, max_size, strict_sized, exact_fit)
+    screenshot = _retained_screenshots.pop(key)
+    if screenshot is None or screenshot.map_size != frame.size:
+        return Screenshot.from_frame(frame, max_size, strict_sized,
+                                     exact_fit, allow_banded)
+
+    screenshot.update(frame)
+    return screenshot
+
+
+def retain_screenshot(game_id: int,
+                      size_slug: str,
+                      screenshot: Screenshot,
+                      max_size: Tuple[int, int],
+                      strict_sized: bool,
+                      exact_fit: bool = False):
+    """Retains a screenshot to be updated by take_incremental_screenshot.
+
+    Parameters:
+      game_id: a game identifier
+      size_slug: a slug of the screenshot size
+      screenshot: a screenshot of the game
+      max_size: limits for result image in px
+      strict_sized: a flag whether the screenshot is strict sized
+      exact_fit: a flag whether the screenshot is laid out to fit the strict
+        size
+    """
+    key = (game_id, size_slug, max_size, strict_sized, exact_fit)
+    _retained_screenshots.put(key, screenshot)
+
+
+def get_screenshots_fingerprint(frame: DotFrame) -> str:
+    """Returns a fingerprint of screenshots which are taken from a frame. The
+    fingerprint depends on the frame and on screenshot settings.
+
+    Parameters:
+      frame: a frame of a game map
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(frame.fingerprint().encode())
+    digest.update(json.dumps([
+        settings.SCREENSHOT_LENGTHS,
+        settings.SCREENSHOT_ENCODERS,
+        settings.SCREENSHOT_STRICT_SIZED,
+        settings.SCREENSHOT_LAYOUT,
+        settings.SCREENSHOT_BANDED_PX_THRESHOLD,
+    ]).encode())
+    return digest.hexdigest()
+
+
+def _get_fingerprint_key(game_id: int) -> str:
+    return 'screenshots:fingerprint:{}'.format(game_id)
+
+
+def get_unchanged_screenshots(game_id: int, fingerprint: str) -> List[str]:
+    """Returns file names of the latest screenshots of a game if they have
+    been taken with the same fingerprint and all the files exist. Otherwise
+    returns an empty list.
+
+    Parameters:
+      game_id: a game identifier
+      fingerprint: a fingerprint of screenshots to be taken
+    """
+    raw = get_state_store().get(_get_fingerprint_key(game_id))
+    if raw is None:
+        return []
+
+    latest = json.loads(raw)
+    if latest['fingerprint'] != fingerprint:
+        return []
+
+    files = latest['files']
+    for filename in files:
+        if not os.path.exists(os.path.join(settings.SCREENSHOT_DEST_PATH,
+                                           filename)):
+            return []
+    return files
+
+
+def save_screenshots_fingerprint(game_id: int,
+                                 fingerprint: str,
+                                 files: List[str]):
+    """Saves a fingerprint and file names of the latest screenshots of a
+    game.
+
+    Parameters:
+      game_id: a game identifier
+      fingerprint: a fingerprint of the screenshots
+      files: file names of the screenshots
     """
-    img = generate_screenshot_image(map_size, max_size, objects, strict_sized)
-    img.save(path, quality=quality, optimize=True)
+    get_state_store().set(_get_fingerprint_key(game_id), json.dumps({
+        'fingerprint': fingerprint,
+        'files': files,
+    }).encode(), ttl=settings.SCREENSHOT_FINGERPRINT_TTL * 1000)
 
 
 def take_sized_screenshots_by_game_id(game_id: int) -> List[str]:
     """Takes a screenshot for a game with given game identifier and returns
     list of file names.
 
+    In the pyramid render mode the game objects are drawn on a frame once and
+    the frame is expanded to every size. The incremental render mode updates
+    screenshots retained by the worker process with the frame where it is
+    possible. Otherwise every size is rendered from the game objects. If
+    skipping of unchanged games is enabled and the game looks the same as on
+    the latest screenshots, the screenshots are not taken again and file
+    names of the latest screenshots are returned.
+
+    Sizes are rendered and saved in the encode thread pool of the worker
+    process if it is enabled in settings.
+
     Parameters:
       game_id: a game identifier.
 
     Returns:
       A list of file names.
     """
-    map_, objects = get_game_objects(game_id)
-    map_size = (map_.width, map_.height)
-    files = []
+    return _start_taking_sized_screenshots(game_id)()
+
+
+def take_sized_screenshots_by_games_ids(games_ids: List[int]) \
+        -> Dict[int, Union[List[str], Exception]]:
+    """Takes screenshots for a number of games, see
+    take_sized_screenshots_by_game_id. Game objects of all the games are
+    fetched concurrently with the asyncio client in about one round-trip,
+    unless they are streamed. Screenshots of all the games are saved
+    concurrently if the encode thread pool is enabled in settings, so
+    streamed objects of a game are fetched while screenshots of previous
+    games are being saved. Render times of the games are saved to size
+    batches of next cycles, see plan_screenshot_batches.
+
+    An error of a game is returned in place of its file names and doesn't
+    stop taking screenshots of other games.
+
+    Parameters:
+      games_ids: game identifiers.
+
+    Returns:
+      A dictionary in which keys are game identifiers in the given order and
+      values are lists of file names or errors.
+    """
+    prefetched = {}
+    if not settings.API_STREAM_OBJECTS:
+        prefetched = get_games_objects(games_ids)
+
+    results = {}
+    pending = []
+    for game_id in games_ids:
+        objects = prefetched.get(game_id)
+        if isinstance(objects, Exception):
+            results[game_id] = objects
+            continue
+
+        start = time.monotonic()
+        try:
+            finish = _start_taking_sized_screenshots(game_id, objects)
+        except Exception as e:
+            results[game_id] = e
+            continue
+        pending.append((game_id, finish, time.monotonic() - start))
+
+    durations = {}
+    for game_id, finish, duration in pending:
+        start = time.monotonic()
+        try:
+            results[game_id] = finish()
+        except Exception as e:
+            results[game_id] = e
+            continue
+        durations[game_id] = duration + time.monotonic() - start
+
+    save_render_durations(durations)
+    return {game_id: results[game_id] for game_id in games_ids}
+
+
+def _start_taking_sized_screenshots(
+        game_id: int,
+        prefetched: Union[Objects, ColumnarObjects] = None) \
+        -> Callable[[], List[str]]:
+    """Starts taking screenshots of a game and returns a function which
+    waits until the screenshots are saved and returns file names in the
+    order of sizes in settings. Game objects are fetched unless they have
+    been prefetched.
+    """
+    mode = settings.SCREENSHOT_RENDER_MODE
+    exact_fit = settings.SCREENSHOT_LAYOUT == settings.SCREENSHOT_LAYOUT_FIT
+
+    frame = None
+    objects = None
+    if settings.API_STREAM_OBJECTS:
+        frame = get_game_frame(game_id)
+        map_size = frame.size
+    else:
+        if prefetched is None:
+            map_, objects = get_game_objects(game_id)
+        else:
+            map_, objects = _unpack_objects(prefetched)
+        map_size = (map_.width, map_.height)
+        if mode != settings.SCREENSHOT_RENDER_MODE_EXACT or \
+                settings.SCREENSHOT_SKIP_UNCHANGED:
+            frame = DotFrame.from_objects(map_size, objects)
+
+    fingerprint = None
+    if settings.SCREENSHOT_SKIP_UNCHANGED:
+        fingerprint = get_screenshots_fingerprint(frame)
+        files = get_unchanged_screenshots(game_id, fingerprint)
+        if files:
+            logger.debug('Game %s has not changed', game_id)
+            metrics.SCREENSHOTS_SKIPPED_UNCHANGED.inc()
+            return lambda: files
+
+    futures = []
     for size_slug, length in settings.SCREENSHOT_LENGTHS.items():
         path = get_image_path(game_id, map_size, size_slug)
-        save_objects_as_screenshot(path,
-                                   map_size,
-                                   (length, length),
-                                   objects,
-                                   settings.SCREENSHOT_QUALITY,
-                                   settings.SCREENSHOT_STRICT_SIZED)
-        files.append(os.path.basename(path))
+        encoder = get_screenshot_encoder(size_slug)
+        if mode == settings.SCREENSHOT_RENDER_MODE_INCREMENTAL:
+            future = _submit(save_incremental_screenshot,
+                             path,
+                             game_id,
+                             size_slug,
+                             frame,
+                             (length, length),
+                             encoder,
+                             settings.SCREENSHOT_STRICT_SIZED,
+                             exact_fit)
+        elif mode == settings.SCREENSHOT_RENDER_MODE_PYRAMID or \
+                objects is None:
+            future = _submit(save_frame_as_screenshot,
+                             path,
+                             frame,
+                             (length, length),
+                             encoder,
+                             settings.SCREENSHOT_STRICT_SIZED,
+                             exact_fit)
+        else:
+            future = _submit(save_objects_as_screenshot,
+                             path,
+                             map_size,
+                             (length, length),
+                             objects,
+                             encoder,
+                             settings.SCREENSHOT_STRICT_SIZED,
+                             exact_fit)
+        futures.append((os.path.basename(path), future))
+
+    def finish() -> List[str]:
+        files = []
+        for filename, future in futures:
+            future.result()
+            files.append(filename)
+
+        if fingerprint is not None:
+            save_screenshots_fingerprint(game_id, fingerprint, files)
+
+        return files
+
+    return finish
+
+
+def _get_render_duration_key(game_id: int) -> str:
+    return 'screenshot-render-duration:{}'.format(game_id)
+
+
+def get_render_durations(games_ids: List[int]) -> Dict[int, float]:
+    """Returns recent render times of games in seconds. Games which haven't
+    been rendered recently are omitted.
+
+    Parameters:
+      games_ids: game identifiers
+    """
+    values = get_state_store().get_many(
+        [_get_render_duration_key(game_id) for game_id in games_ids])
+    return {
+        game_id: float(value)
+        for game_id, value in zip(games_ids, values)
+        if value is not None
+    }
+
+
+def save_render_durations(durations: Dict[int, float],
+                          smoothing: float = 0.5):
+    """Saves render times of games. A saved time is an exponential moving
+    average of render times of a game.
+
+    Parameters:
+      durations: render times in seconds by game identifiers
+      smoothing: a weight of the latest render time
+    """
+    store = get_state_store()
+    recent = get_render_durations(list(durations))
+    for game_id, duration in durations.items():
+        if game_id in recent:
+            duration = smoothing * duration + \
+                (1 - smoothing) * recent[game_id]
+        store.set(_get_render_duration_key(game_id),
+                  repr(duration).encode(),
+                  ttl=settings.SCREENSHOT_FINGERPRINT_TTL * 1000)
+
+
+def plan_screenshot_batches(games_ids: List[int],
+                            durations: Dict[int, float],
+                            target_duration: float,
+                            max_size: int,
+                            default_duration: float) -> List[List[int]]:
+    """Splits games into batches which are expected to be rendered for the
+    target duration. A game which takes longer is put in its own batch.
+
+    Parameters:
+      games_ids: game identifiers
+      durations: expected render times of games in seconds
+      target_duration: a target render time of a batch in seconds
+      max_size: a maximum number of games in a batch
+      default_duration: an expected render time of games without durations
+
+    Returns:
+      A list of batches of game identifiers in the given order.
+    """
+    batches = []
+    batch = []
+    batch_duration = 0.0
+    for game_id in games_ids:
+        duration = durations.get(game_id, default_duration)
+        if batch and (batch_duration + duration > target_duration or
+                      len(batch) >= max_size):
+            batches.append(batch)
+            batch = []
+            batch_duration = 0.0
+        batch.append(game_id)
+        batch_duration += duration
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _get_screenshot_cycle_key(cycle_id: str, *parts) -> str:
+    return ':'.join(('screenshot-cycle', cycle_id) + parts)
+
+
+def new_screenshot_cycle_id() -> str:
+    """Returns a new identifier of a screenshot cycle.
+    """
+    return uuid.uuid4().hex
+
+
+def start_screenshot_cycle(games_ids: List[int],
+                           cycle_id: str = None) -> str:
+    """Starts a cycle of taking screenshots of games and returns its
+    identifier. Tasks of the cycle save their results with
+    save_screenshot_cycle_result and the last one collects them with
+    pop_screenshot_cycle_results.
+
+    Parameters:
+      games_ids: identifiers of games of the cycle
+      cycle_id: an identifier of the cycle, a new one by default
+    """
+    if cycle_id is None:
+        cycle_id = new_screenshot_cycle_id()
+    get_state_store().set(_get_screenshot_cycle_key(cycle_id, 'games'),
+                          json.dumps(games_ids).encode(),
+                          ttl=settings.SCREENSHOT_CYCLE_TTL * 1000)
+    return cycle_id
+
+
+def save_screenshot_cycle_result(cycle_id: str,
+                                 game_id: int,
+                                 files: List[str]) -> bool:
+    """Saves screenshot file names of a game taken in a cycle. A result of a
+    game is saved once, so a duplicate signal of a task doesn't replace it.
+
+    Parameters:
+      cycle_id: a cycle identifier
+      game_id: a game identifier
+      files: file names of the screenshots
+
+    Returns:
+      Whether the result has been saved.
+    """
+    return get_state_store().add(
+        _get_screenshot_cycle_key(cycle_id, 'game', str(game_id)),
+        json.dumps(files).encode(),
+        ttl=settings.SCREENSHOT_CYCLE_TTL * 1000,
+    )
+
+
+def claim_screenshot_cycle_report(cycle_id: str) -> bool:
+    """Claims the report of a screenshot cycle. The report of a cycle can be
+    claimed once, so duplicate signals of the last task don't report the
+    cycle again.
+
+    Parameters:
+      cycle_id: a cycle identifier
+
+    Returns:
+      Whether the caller has claimed the report.
+    """
+    return get_state_store().add(
+        _get_screenshot_cycle_key(cycle_id, 'reported'),
+        b'1',
+        ttl=settings.SCREENSHOT_CYCLE_TTL * 1000,
+    )
+
+
+def pop_screenshot_cycle_results(cycle_id: str) -> Dict[int, List[str]]:
+    """Returns screenshot file names of games taken in a cycle and deletes
+    the results of the cycle. Games without screenshots are omitted.
+
+    Parameters:
+      cycle_id: a cycle identifier
+    """
+    store = get_state_store()
+    games_key = _get_screenshot_cycle_key(cycle_id, 'games')
+    raw = store.get(games_key)
+    if raw is None:
+        return {}
+
+    keys = [_get_screenshot_cycle_key(cycle_id, 'game', str(game_id))
+            for game_id in json.loads(raw)]
+    games_screenshots = {}
+    for key, value in zip(keys, store.get_many(keys)):
+        if value is not None:
+            files = json.loads(value)
+            if files:
+                game_id = int(key.rsplit(':', 1)[1])
+                games_screenshots[game_id] = files
+
+    for key in keys + [games_key]:
+        store.delete(key)
+
+    return games_screenshots
+
+
+_SCREENSHOT_CYCLE_PENDING_KEY = 'screenshot-cycle:pending'
+_SCREENSHOT_CYCLE_STARTED_KEY = 'screenshot-cycle:started'
+
+
+def mark_screenshot_cycle_pending() -> bool:
+    """Marks that a screenshot cycle is to be dispatched when the cycle in
+    flight finishes.
+
+    Returns:
+      Whether there has been no pending cycle.
+    """
+    ttl = settings.SCREENSHOT_CYCLE_LEASE_TTL * 1000
+    return get_state_store().add(_SCREENSHOT_CYCLE_PENDING_KEY, b'1', ttl=ttl)
+
+
+def pop_screenshot_cycle_pending() -> bool:
+    """Returns whether a screenshot cycle is pending and unmarks it.
+    """
+    store = get_state_store()
+    if store.get(_SCREENSHOT_CYCLE_PENDING_KEY) is None:
+        return False
+    store.delete(_SCREENSHOT_CYCLE_PENDING_KEY)
+    return True
+
+
+def record_screenshot_cycle_start() -> Optional[float]:
+    """Records a start time of a screenshot cycle.
+
+    Returns:
+      Seconds since the start of the previous cycle or None if it is
+      unknown.
+    """
+    store = get_state_store()
+    now = time.time()
+    previous = store.get(_SCREENSHOT_CYCLE_STARTED_KEY)
+    store.set(_SCREENSHOT_CYCLE_STARTED_KEY, repr(now).encode(),
+              ttl=settings.SCREENSHOT_CYCLE_TTL * 1000)
+    if previous is None:
+        return None
+    return now - float(previous)
+
+
+def get_screenshot_schedule_policy() -> ScreenshotSchedulePolicy:
+    """Returns a policy of intervals of taking screenshots of games which is
+    configured in settings.
+    """
+    return ScreenshotSchedulePolicy(
+        settings.SCREENSHOT_SCHEDULE_MIN_INTERVAL,
+        settings.SCREENSHOT_SCHEDULE_MAX_INTERVAL,
+        backoff=settings.SCREENSHOT_SCHEDULE_BACKOFF,
+        busy_occupancy=settings.SCREENSHOT_SCHEDULE_BUSY_OCCUPANCY,
+        busy_rate=settings.SCREENSHOT_SCHEDULE_BUSY_RATE,
+    )
+
+
+def _get_screenshot_schedule_key(game_id: int) -> str:
+    return 'screenshot-schedule:{}'.format(game_id)
+
+
+def _get_latest_screenshots(game: Game) -> List[str]:
+    """Returns file names of the latest screenshots of a game if all the
+    files exist. Otherwise returns an empty list.
+    """
+    files = [
+        os.path.basename(get_image_path(game.id,
+                                        (game.width, game.height),
+                                        size_slug))
+        for size_slug in settings.SCREENSHOT_LENGTHS
+    ]
+    for filename in files:
+        if not os.path.exists(os.path.join(settings.SCREENSHOT_DEST_PATH,
+                                           filename)):
+            return []
     return files
 
 
+def schedule_screenshots(games: List[Game],
+                         policy: ScreenshotSchedulePolicy,
+                         tick: float) \
+        -> Tuple[List[int], Dict[int, List[str]], Dict[int, dict]]:
+    """Chooses games whose screenshots are to be taken now and schedules
+    their next screenshots by the policy. A game is changed if the
+    fingerprint of its latest screenshots differs from the one when it was
+    scheduled previously. A game which is due before the next tick is due
+    now. A game whose latest screenshots are missing is always due.
+
+    Parameters:
+      games: ongoing games
+      policy: a policy of intervals of games
+      tick: an interval of scheduling in seconds
+
+    Returns:
+      A tuple with identifiers of games which are due, file names of the
+      latest screenshots of deferred games by game identifiers and the
+      report of the schedule by game identifiers.
+    """
+    store = get_state_store()
+    now = time.time()
+    games_ids = [game.id for game in games]
+    schedules = store.get_many(
+        [_get_screenshot_schedule_key(game_id) for game_id in games_ids])
+    fingerprints = store.get_many(
+        [_get_fingerprint_key(game_id) for game_id in games_ids])
+    ttl = int(policy.max_interval * 2 * 1000)
+
+    due_games_ids = []
+    deferred = {}
+    report = {}
+    for game, raw_schedule, raw_fingerprint in zip(games,
+                                                   schedules,
+                                                   fingerprints):
+        schedule = None
+        if raw_schedule is not None:
+            schedule = GameSchedule(**json.loads(raw_schedule))
+
+        if schedule is not None and schedule.due - now > tick / 2:
+            files = _get_latest_screenshots(game)
+            if files:
+                deferred[game.id] = files
+                report[game.id] = {
+                    'interval': schedule.interval,
+                    'due_in': round(schedule.due - now, 3),
+                    'changed': None,
+                }
+                metrics.SCREENSHOT_SCHEDULED_GAMES.labels('deferred').inc()
+                continue
+
+        fingerprint = None
+        if raw_fingerprint is not None:
+            fingerprint = json.loads(raw_fingerprint)['fingerprint']
+        changed = None
+        if schedule is not None and schedule.fingerprint is not None and \
+                fingerprint is not None:
+            changed = fingerprint != schedule.fingerprint
+
+        interval = policy.next_interval(
+            game, schedule.interval if schedule else None, changed)
+        store.set(_get_screenshot_schedule_key(game.id),
+                  json.dumps(GameSchedule(interval,
+                                          now + interval,
+                                          fingerprint)._asdict()).encode(),
+                  ttl=ttl)
+        due_games_ids.append(game.id)
+        report[game.id] = {
+            'interval': interval,
+            'due_in': 0,
+            'changed': changed,
+        }
+        metrics.SCREENSHOT_SCHEDULED_GAMES.labels('due').inc()
+
+    for game in games:
+        report[game.id].update(count=game.count,
+                               limit=game.limit,
+                               rate=game.rate)
+
+    return due_games_ids, deferred, report
+
+
+def write_screenshot_schedule_json_report(schedule: Dict[int, dict]):
+    """Writes a JSON report of intervals of taking screenshots of games.
+
+    Parameters:
+      schedule: a report of the schedule by game identifiers
+    """
+    path = os.path.join(settings.SCREENSHOT_DEST_PATH,
+                        settings.SCREENSHOTS_SCHEDULE_JSON_FILE)
+    with open(path, 'w') as fp:
+        json.dump(schedule, fp)
+
+
 def get_json_report_path() -> str:
     """Returns a path to a screenshot report location.
     """
@@ -192,7 +1205,8 @@ def delete_screenshots(exclude_screenshots: Tuple[str]):
       exclude_screenshots: screenshots which are not to be deleted.
     """
     for filename in os.listdir(settings.SCREENSHOT_DEST_PATH):
-        if filename.endswith('.jpeg') and filename not in exclude_screenshots:
+        if filename.endswith(EXTENSIONS) and \
+                filename not in exclude_screenshots:
             file_path = os.path.join(settings.SCREENSHOT_DEST_PATH, filename)
             os.remove(file_path)
 
@@ -232,15 +1246,19 @@ def sort_games(games: List[Game]) -> List[Game]:
     return result
 
 
-def get_game(game_id: int) -> Game:
+def get_game(game_id: int, use_cache: bool = True) -> Game:
     """Returns a game by a numeric id.
 
+    Parameters:
+      game_id: a game identifier.
+      use_cache: a flag whether a cached response can be returned.
+
     Raises:
       APIError: when Rest API has returned an error.
       ValidationError: when server's response was invalid
     """
     client = get_api_client()
-    game = client.get_game(game_id)
+    game = client.get_game(game_id, use_cache=use_cache)
     return game
 
 
@@ -254,3 +1272,48 @@ def delete_game(game_id: int) -> DeletedGame:
     client = get_api_client()
     deleted_game = client.delete_game(game_id)
     return deleted_game
+
+
+def _get_empty_since_key(game_id: int) -> str:
+    return 'game-empty-since:{}'.format(game_id)
+
+
+def track_empty_games(games: List[Game]) -> Dict[int, float]:
+    """Records since when games have been empty and returns the records of
+    empty games. Records of games which are not empty are deleted. Records
+    expire if they aren't tracked for two cleanup intervals, e.g. when the
+    games have been deleted.
+
+    Parameters:
+      games: ongoing games
+
+    Returns:
+      UNIX times since when games have been empty by game identifiers.
+    """
+    store = get_state_store()
+    now = time.time()
+    ttl = settings.TASK_INTERVAL_CLEANUP_GAMES * 2 * 1000
+    keys = [_get_empty_since_key(game.id) for game in games]
+
+    empty_since = {}
+    for game, key, value in zip(games, keys, store.get_many(keys)):
+        if not game.is_empty():
+            if value is not None:
+                store.delete(key)
+            continue
+        since = now if value is None else float(value)
+        store.set(key, repr(since).encode(), ttl=ttl)
+        empty_since[game.id] = since
+    return empty_since
+
+
+def forget_empty_games(games_ids: List[int]):
+    """Deletes records since when games have been empty, e.g. when the games
+    have been deleted.
+
+    Parameters:
+      games_ids: game identifiers
+    """
+    store = get_state_store()
+    for game_id in games_ids:
+        store.delete(_get_empty_since_key(game_id))
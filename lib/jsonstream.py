@@ -0,0 +1,148 @@
+"""The module contains an incremental decoder of JSON objects which yields
+items of an object while its document is still being received. Elements of
+big arrays are yielded one by one, so the whole document is never kept in
+memory.
+"""
+
+import codecs
+import json
+from typing import Any, Collection, Iterable, Iterator, Tuple
+
+
+_WHITESPACE = ' \t\n\r'
+# Characters which can continue a number, e.g. '1' and '.5' or '1e' and '-3'
+_NUMBER_CHARS = '0123456789+-.eE'
+
+
+class _Reader:
+    """Reads JSON values from chunks of a document
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Reads the next chunk into the buffer. Returns False at the end of
+        the document.
+        """
+        if self._eof:
+            return False
+
+        text = ''
+        while not text:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._eof = True
+                text = self._decoder.decode(b'', final=True)
+                break
+            text = self._decoder.decode(chunk)
+
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return bool(text) or not self._eof
+
+    def peek(self) -> str:
+        """Returns the next character which isn't whitespace or an empty
+        string at the end of the document.
+        """
+        while True:
+            while self._pos < len(self._buffer) and \
+                    self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def take(self, expected: str) -> str:
+        """Consumes the next character which isn't whitespace. It must be
+        one of the expected characters.
+
+        Raises:
+          ValueError: when there is another character.
+        """
+        char = self.peek()
+        if not char or char not in expected:
+            raise ValueError('expected one of {!r} at {!r}'.format(
+                expected, self._buffer[self._pos:self._pos + 20]))
+        self._pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decodes the next value.
+
+        Raises:
+          ValueError: when the value is invalid.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer,
+                                                           self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+
+            # A number at the end of the buffer may continue in the next
+            # chunk, even if its beginning is a number itself, e.g. '1.'
+            if isinstance(value, (int, float)) and \
+                    (end == len(self._buffer) or
+                     self._buffer[end] in _NUMBER_CHARS) and \
+                    self._fill():
+                continue
+
+            self._pos = end
+            return value
+
+
+def iter_items(chunks: Iterable[bytes],
+               streamed_keys: Collection[str] = ()) \
+        -> Iterator[Tuple[str, Any]]:
+    """Decodes a JSON object from chunks of its document and yields its
+    items as soon as they are decoded. Arrays which are values of the
+    streamed keys are not decoded whole, instead their elements are yielded
+    one by one as items with the key of the array.
+
+    Parameters:
+      chunks: chunks of a document in UTF-8.
+      streamed_keys: keys of arrays whose elements are yielded one by one.
+
+    Raises:
+      ValueError: when the document isn't a valid JSON object.
+    """
+    reader = _Reader(chunks)
+
+    reader.take('{')
+    if reader.peek() == '}':
+        reader.take('}')
+    else:
+        while True:
+            key = reader.value()
+            if not isinstance(key, str):
+                raise ValueError('object key must be a string')
+            reader.take(':')
+
+            if key in streamed_keys and reader.peek() == '[':
+                reader.take('[')
+                if reader.peek() == ']':
+                    reader.take(']')
+                else:
+                    while True:
+                        yield key, reader.value()
+                        if reader.take(',]') == ']':
+                            break
+            else:
+                yield key, reader.value()
+
+            if reader.take(',}') == '}':
+                break
+
+    if reader.peek():
+        raise ValueError('extra data after the object')
@@ -0,0 +1,305 @@
+"""The module contains limiters which are shared by worker processes: an
+adaptive limiter of concurrent API calls, whose limit is shrunk when the
+Snake-Server is busy or slow and grown back when it isn't, so background
+tasks give way to players, and a lease which is held by one owner at a time
+across tasks.
+"""
+
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from dramatiq.errors import RateLimitExceeded
+from dramatiq.rate_limits import ConcurrentRateLimiter, RateLimiterBackend
+
+from lib import metrics
+from lib import settings
+from lib.state import StateStore
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(settings.LOG_LEVEL)
+
+
+class AdaptiveConcurrencyLimiter(ConcurrentRateLimiter):
+    """A concurrent rate limiter whose limit is adjusted by the load of the
+    server. Slots are counted by the rate limiter backend and the current
+    limit is kept in a state store, so both are shared by worker processes.
+
+    Once per interval one of the processes polls the server's capacity and
+    adjusts the limit with its observations of latencies and failures of
+    requests since the previous adjustment. The limit is halved when the
+    capacity is above the high watermark, requests fail too often or are
+    too slow, or the capacity can't be polled. It is increased by one when
+    the capacity is below the low watermark.
+    """
+
+    # A maximum number of kept observations of requests of a process
+    MAX_OBSERVATIONS = 1000
+
+    def __init__(self,
+                 backend: RateLimiterBackend,
+                 key: str,
+                 store: StateStore,
+                 poll_capacity: Callable[[], float],
+                 *,
+                 min_limit: int = 1,
+                 max_limit: int = 32,
+                 initial_limit: int = 8,
+                 interval: float = 10,
+                 high_capacity: float = 0.8,
+                 low_capacity: float = 0.5,
+                 max_error_rate: float = 0.1,
+                 max_latency: float = 1.0,
+                 ttl: int = 900000):
+        """Initializes a limiter.
+
+        Parameters:
+          backend: a rate limiter backend to count slots.
+          key: a key of the limiter.
+          store: a state store to keep the current limit.
+          poll_capacity: a function which returns the server's capacity.
+          min_limit: a minimum limit.
+          max_limit: a maximum limit.
+          initial_limit: a limit until the first adjustment.
+          interval: an interval of adjustments in seconds.
+          high_capacity: a capacity above which the limit is shrunk.
+          low_capacity: a capacity below which the limit is grown.
+          max_error_rate: a share of failed requests above which the limit
+            is shrunk.
+          max_latency: a median latency of requests in seconds above which
+            the limit is shrunk.
+          ttl: a time to live of slots in milliseconds.
+        """
+        assert 1 <= min_limit <= initial_limit <= max_limit, \
+            'Limits must be positive and ordered'
+        assert low_capacity <= high_capacity, 'Watermarks must be ordered'
+
+        super().__init__(backend, key, limit=initial_limit, ttl=ttl)
+
+        self.store = store
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.initial_limit = initial_limit
+        self.interval = interval
+        self.high_capacity = high_capacity
+        self.low_capacity = low_capacity
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+
+        self._poll_capacity = poll_capacity
+        self._observations = deque(maxlen=self.MAX_OBSERVATIONS)
+        self._observations_lock = threading.Lock()
+
+    def current_limit(self) -> int:
+        """Returns the current limit shared by worker processes.
+        """
+        value = self.store.get(self._limit_key)
+        if value is None:
+            return self.initial_limit
+        return min(max(int(value), self.min_limit), self.max_limit)
+
+    def observe(self, latency: float, failed: bool):
+        """Records a request to the server.
+
+        Parameters:
+          latency: a time of the request in seconds.
+          failed: a flag whether the request has failed.
+        """
+        with self._observations_lock:
+            self._observations.append((latency, failed))
+
+    def maybe_adjust(self) -> Optional[int]:
+        """Adjusts the limit if it is time to and no other process does it.
+
+        Returns:
+          A new limit or None if the limit hasn't been adjusted.
+        """
+        if not self.store.add(self._adjust_key, b'1',
+                              int(self.interval * 1000)):
+            return None
+        return self.adjust()
+
+    def adjust(self) -> int:
+        """Polls the server's capacity and adjusts the limit.
+
+        Returns:
+          A new limit.
+        """
+        try:
+            capacity = self._poll_capacity()
+        except Exception as e:
+            logger.warning('Polling capacity failed: %s', e)
+            capacity = None
+
+        with self._observations_lock:
+            observations = list(self._observations)
+            self._observations.clear()
+
+        limit = self.current_limit()
+        new_limit = limit
+        if self._overloaded(capacity, observations):
+            new_limit = max(self.min_limit, limit // 2)
+        elif capacity <= self.low_capacity:
+            new_limit = min(self.max_limit, limit + 1)
+
+        if new_limit != limit:
+            logger.info('Concurrency limit of %s: %d => %d (capacity %s)',
+                        self.key, limit, new_limit, capacity)
+        self.store.set(self._limit_key, str(new_limit).encode())
+        metrics.API_CONCURRENCY_LIMIT.labels(self.key).set(new_limit)
+        return new_limit
+
+    def _overloaded(self, capacity: Optional[float], observations) -> bool:
+        if capacity is None or capacity >= self.high_capacity:
+            return True
+        if not observations:
+            return False
+
+        failures = sum(1 for _, failed in observations if failed)
+        if failures / len(observations) > self.max_error_rate:
+            return True
+        latency = statistics.median(latency for latency, _ in observations)
+        return latency > self.max_latency
+
+    @contextmanager
+    def wait(self, timeout: float) -> Iterator[None]:
+        """Waits for a slot under the current limit.
+
+        Parameters:
+          timeout: a maximum time of waiting in seconds.
+
+        Raises:
+          RateLimitExceeded: when there is no free slot in time.
+        """
+        self.maybe_adjust()
+
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while True:
+            with self.acquire(raise_on_failure=False) as acquired:
+                if acquired:
+                    yield
+                    return
+            if time.monotonic() >= deadline:
+                raise RateLimitExceeded(
+                    'no free slot in time for key {!r}'.format(self.key))
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    @contextmanager
+    def wait_many(self, count: int, timeout: float) -> Iterator[int]:
+        """Waits for a slot under the current limit and takes up to count
+        slots which are free, e.g. for requests which are sent concurrently.
+
+        Parameters:
+          count: a maximum number of slots.
+          timeout: a maximum time of waiting for the first slot in seconds.
+
+        Returns:
+          A number of taken slots, at least one.
+
+        Raises:
+          RateLimitExceeded: when there is no free slot in time.
+        """
+        assert count >= 1, 'Count must be positive'
+
+        with self.wait(timeout):
+            taken = 1
+            try:
+                while taken < count and self._acquire():
+                    taken += 1
+                yield taken
+            finally:
+                for _ in range(taken - 1):
+                    self._release()
+
+    def _acquire(self) -> bool:
+        limit = self.current_limit()
+        if self.backend.add(self.key, 1, ttl=self.ttl):
+            return True
+        return self.backend.incr(self.key, 1, maximum=limit, ttl=self.ttl)
+
+    @property
+    def _limit_key(self) -> str:
+        return '{}:limit'.format(self.key)
+
+    @property
+    def _adjust_key(self) -> str:
+        return '{}:adjust'.format(self.key)
+
+    def __repr__(self):
+        return '{}.{}(key={!r}, min_limit={}, max_limit={})'.format(
+            __name__,
+            self.__class__.__name__,
+            self.key,
+            self.min_limit,
+            self.max_limit)
+
+
+class Lease(ConcurrentRateLimiter):
+    """A mutex which is taken by an owner in one task and released in
+    another one, e.g. by the last task of a group. The lease expires if it
+    isn't released in time, so an owner which has been lost doesn't hold it
+    forever. An expired owner can't release the lease of a new owner.
+    """
+
+    def __init__(self,
+                 backend: RateLimiterBackend,
+                 key: str,
+                 store: StateStore,
+                 ttl: int):
+        """Initializes a lease.
+
+        Parameters:
+          backend: a rate limiter backend to count holders.
+          key: a key of the lease.
+          store: a state store to keep the owner.
+          ttl: a time to live of the lease in milliseconds.
+        """
+        super().__init__(backend, key, limit=1, ttl=ttl)
+        self.store = store
+
+    def take(self, owner: str) -> bool:
+        """Takes the lease if it is free.
+
+        Parameters:
+          owner: an identifier of the owner.
+
+        Returns:
+          Whether the lease has been taken.
+        """
+        if not self._acquire():
+            return False
+        self.store.set(self._owner_key, owner.encode(), self.ttl)
+        return True
+
+    def release(self, owner: str) -> bool:
+        """Releases the lease if it is held by the owner.
+
+        Parameters:
+          owner: an identifier of the owner.
+
+        Returns:
+          Whether the lease has been released.
+        """
+        if self.store.get(self._owner_key) != owner.encode():
+            return False
+        self.store.delete(self._owner_key)
+        self._release()
+        return True
+
+    @property
+    def _owner_key(self) -> str:
+        return '{}:owner'.format(self.key)
+
+    def __repr__(self):
+        return '{}.{}(key={!r}, ttl={})'.format(
+            __name__,
+            self.__class__.__name__,
+            self.key,
+            self.ttl)
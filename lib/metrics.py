@@ -0,0 +1,223 @@
+"""The module contains application metrics. The metrics are exported via
+Prometheus when the metrics server is enabled in settings, otherwise they do
+nothing.
+"""
+
+import threading
+from typing import Tuple
+
+from lib import settings
+
+
+_lock = threading.Lock()
+
+
+class _NullMetric:
+    """A metric which ignores all observations
+    """
+
+    def labels(self, *_values, **_kwvalues) -> '_NullMetric':
+        return self
+
+    def inc(self, _amount: float = 1):
+        pass
+
+    def dec(self, _amount: float = 1):
+        pass
+
+    def set(self, _value: float):
+        pass
+
+    def observe(self, _amount: float):
+        pass
+
+
+_NULL_METRIC = _NullMetric()
+
+
+class _LazyMetric:
+    """A Prometheus metric which is created on the first use.
+
+    The prometheus_client package must not be imported before dramatiq's
+    Prometheus middleware has set up the multiprocess mode in a worker
+    process, that is why the actual metric is created lazily.
+    """
+
+    def __init__(self,
+                 kind: str,
+                 name: str,
+                 documentation: str,
+                 labelnames: Tuple[str, ...] = (),
+                 **kwargs):
+        """Initializes a lazy metric.
+
+        Parameters:
+          kind: a name of a metric class in prometheus_client.
+          name: a metric name.
+          documentation: a metric description.
+          labelnames: names of labels of the metric.
+          kwargs: additional arguments for the metric class.
+        """
+        self._kind = kind
+        self._name = name
+        self._documentation = documentation
+        self._labelnames = labelnames
+        self._kwargs = kwargs
+        self._metric = None
+
+    def _get(self):
+        if not settings.PROMETHEUS_METRICS_SERVER_ENABLE:
+            return _NULL_METRIC
+
+        if self._metric is None:
+            with _lock:
+                if self._metric is None:
+                    import prometheus_client
+                    metric_class = getattr(prometheus_client, self._kind)
+                    self._metric = metric_class(self._name,
+                                                self._documentation,
+                                                self._labelnames,
+                                                **self._kwargs)
+        return self._metric
+
+    def labels(self, *values, **kwvalues):
+        return self._get().labels(*values, **kwvalues)
+
+    def inc(self, amount: float = 1):
+        self._get().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._get().dec(amount)
+
+    def set(self, value: float):
+        self._get().set(value)
+
+    def observe(self, amount: float):
+        self._get().observe(amount)
+
+
+def counter(name: str,
+            documentation: str,
+            labelnames: Tuple[str, ...] = ()) -> _LazyMetric:
+    """Returns a counter.
+    """
+    return _LazyMetric('Counter', name, documentation, labelnames)
+
+
+def gauge(name: str,
+          documentation: str,
+          labelnames: Tuple[str, ...] = (),
+          multiprocess_mode: str = 'all') -> _LazyMetric:
+    """Returns a gauge. See prometheus_client for multiprocess modes.
+    """
+    return _LazyMetric('Gauge', name, documentation, labelnames,
+                       multiprocess_mode=multiprocess_mode)
+
+
+def histogram(name: str,
+              documentation: str,
+              labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = None) -> _LazyMetric:
+    """Returns a histogram.
+    """
+    if buckets is None:
+        return _LazyMetric('Histogram', name, documentation, labelnames)
+    return _LazyMetric('Histogram', name, documentation, labelnames,
+                       buckets=buckets)
+
+
+CACHE_HITS = counter('snake_backend_cache_hits_total',
+                     'The total number of cache hits.',
+                     ('cache',))
+CACHE_MISSES = counter('snake_backend_cache_misses_total',
+                       'The total number of cache misses.',
+                       ('cache',))
+CACHE_EVICTIONS = counter('snake_backend_cache_evictions_total',
+                          'The total number of cache evictions.',
+                          ('cache',))
+CACHE_SIZE = gauge('snake_backend_cache_size',
+                   'The number of items in a cache per worker process.',
+                   ('cache',))
+
+SCREENSHOTS_SKIPPED_UNCHANGED = counter(
+    'snake_backend_screenshots_skipped_unchanged_total',
+    'The total number of games whose screenshots were not taken again '
+    'because the games have not changed.',
+)
+
+SCREENSHOT_SCHEDULED_GAMES = counter(
+    'snake_backend_screenshot_scheduled_games_total',
+    'The total number of games checked by the adaptive screenshot schedule '
+    'by decisions: due or deferred.',
+    ('decision',),
+)
+SCREENSHOT_CYCLES = counter(
+    'snake_backend_screenshot_cycles_total',
+    'The total number of dispatches of screenshot cycles by outcomes: '
+    'started, skipped or coalesced while another cycle was in flight.',
+    ('outcome',),
+)
+SCREENSHOT_CYCLE_LAG = histogram(
+    'snake_backend_screenshot_cycle_lag_seconds',
+    'The time by which a screenshot cycle has started later than the '
+    'screenshot task interval after the previous cycle.',
+    buckets=(0, 1, 5, 10, 30, 60, 120, 300, 600, float('inf')),
+)
+
+API_RESPONSES_VALIDATED = counter(
+    'snake_backend_api_responses_validated_total',
+    'The total number of sampled responses of the trusted server which '
+    'were validated.',
+    ('model',),
+)
+API_VALIDATION_FAILURES = counter(
+    'snake_backend_api_validation_failures_total',
+    'The total number of sampled responses of the trusted server which '
+    'failed validation.',
+    ('model',),
+)
+
+API_REQUESTS_SENT = counter(
+    'snake_backend_api_requests_sent_total',
+    'The total number of requests sent to the server. The rate of '
+    'connection reuse is 1 - connections opened / requests sent.',
+)
+API_CONNECTIONS_OPENED = counter(
+    'snake_backend_api_connections_opened_total',
+    'The total number of connections opened to the server.',
+)
+API_CACHE_LOOKUPS = counter(
+    'snake_backend_api_cache_lookups_total',
+    'The total number of requests to read-only endpoints of the server by '
+    'results of lookups in the response cache: hit, revalidated, miss or '
+    'bypass.',
+    ('endpoint', 'result'),
+)
+API_COALESCED_CALLS = counter(
+    'snake_backend_api_coalesced_calls_total',
+    'The total number of API calls which got the result of an identical '
+    'call in flight instead of sending a request, by scopes of coalescing: '
+    'process or cluster.',
+    ('scope',),
+)
+API_CONCURRENCY_LIMIT = gauge(
+    'snake_backend_api_concurrency_limit',
+    'The current limit of concurrent API calls of worker processes.',
+    ('limiter',),
+    multiprocess_mode='max',
+)
+
+ENCODE_DURATION = histogram(
+    'snake_backend_screenshot_encode_duration_seconds',
+    'The time spent encoding and writing a screenshot.',
+    ('format', 'size'),
+    buckets=(.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0,
+             float('inf')),
+)
+ENCODED_BYTES = histogram(
+    'snake_backend_screenshot_encoded_bytes',
+    'The size of a screenshot file.',
+    ('format', 'size'),
+    buckets=(1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072, 262144,
+             524288, float('inf')),
+)
@@ -0,0 +1,103 @@
+"""The module contains a policy of intervals of taking screenshots of games.
+Busy games are taken often, while screenshots of empty games and of games
+which don't change are taken less and less often, so idle games don't take
+rendering time of workers.
+"""
+
+from typing import NamedTuple, Optional
+
+from lib.schemas import Game
+
+
+class GameSchedule(NamedTuple):
+    """A schedule of screenshots of a game
+    """
+
+    # An interval between screenshots in seconds
+    interval: float
+    # A UNIX time when screenshots are to be taken next time
+    due: float
+    # A fingerprint of the latest screenshots when the game was scheduled
+    fingerprint: Optional[str]
+
+
+class ScreenshotSchedulePolicy:
+    """Chooses intervals of taking screenshots of games by their activity.
+
+    A busy game, a game whose share of taken player slots or whose rate
+    reaches a threshold, is taken every minimum interval. Another game with
+    players which has changed since the previous screenshots is taken every
+    minimum interval multiplied by the backoff factor. The interval of an
+    empty game or a game which hasn't changed grows by the backoff factor
+    every time its screenshots are taken, up to the maximum interval.
+    """
+
+    def __init__(self,
+                 min_interval: float,
+                 max_interval: float,
+                 backoff: float = 2.0,
+                 busy_occupancy: float = 0.5,
+                 busy_rate: int = 0):
+        """Initializes a policy.
+
+        Parameters:
+          min_interval: a minimum interval in seconds.
+          max_interval: a maximum interval in seconds.
+          backoff: a factor by which intervals of idle games grow.
+          busy_occupancy: a share of taken player slots from which a game is
+            busy.
+          busy_rate: a rate of a game from which it is busy, 0 disables the
+            threshold.
+        """
+        assert 0 < min_interval <= max_interval, \
+            'Intervals must be positive and ordered'
+        assert backoff >= 1, 'Backoff factor must not be less than 1'
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.busy_occupancy = busy_occupancy
+        self.busy_rate = busy_rate
+
+    def is_busy(self, game: Game) -> bool:
+        """Returns whether a game is busy.
+        """
+        if game.is_empty():
+            return False
+        if game.limit > 0 and game.count / game.limit >= self.busy_occupancy:
+            return True
+        return 0 < self.busy_rate <= game.rate
+
+    def next_interval(self,
+                      game: Game,
+                      interval: Optional[float],
+                      changed: Optional[bool]) -> float:
+        """Returns an interval until the next screenshots of a game.
+
+        Parameters:
+          game: a game whose screenshots are being taken.
+          interval: the previous interval or None for a new game.
+          changed: whether the game has changed since the previous
+            screenshots or None if it is unknown.
+        """
+        if game.is_empty() or changed is False:
+            previous = self.min_interval if interval is None else interval
+            return min(self.max_interval,
+                       max(self.min_interval, previous) * self.backoff)
+        if self.is_busy(game):
+            return self.min_interval
+        return min(self.max_interval, self.min_interval * self.backoff)
+
+    def __repr__(self):
+        return '{}.{}(min_interval={}, max_interval={}, backoff={})'.format(
+            __name__,
+            self.__class__.__name__,
+            self.min_interval,
+            self.max_interval,
+            self.backoff)
+
+
+__all__ = [
+    'GameSchedule',
+    'ScreenshotSchedulePolicy',
+]
@@ -1,13 +1,16 @@
 
 from enum import Enum
-from typing import List, Tuple, Union
+from typing import Any, Dict, List, Tuple, Type, TypeVar, Union
 from abc import ABC, abstractmethod
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError, parse_obj_as
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON
 
 
 Dot = Tuple[int, int]
 
+Model = TypeVar('Model', bound=BaseModel)
+
 ColorRGB = Tuple[int, int, int]
 
 
@@ -199,6 +202,30 @@ AnyObject = Union[Apple, Corpse, Mouse, Snake, Wall, Watermelon]
 
 AnyObjectList = List[AnyObject]
 
+OBJECT_MODELS: Dict[str, Type[BaseModel]] = {
+    OBJECT_LABEL_APPLE: Apple,
+    OBJECT_LABEL_CORPSE: Corpse,
+    OBJECT_LABEL_MOUSE: Mouse,
+    OBJECT_LABEL_SNAKE: Snake,
+    OBJECT_LABEL_WALL: Wall,
+    OBJECT_LABEL_WATERMELON: Watermelon,
+}
+
+
+def parse_object(obj: Any) -> AnyObject:
+    """Parses a game object with the model of its type. An object without a
+    type is parsed as any object, i.e. models are tried one by one.
+
+    Raises:
+      ValidationError: when the object is invalid.
+      KeyError: when the type of the object is unknown.
+      TypeError: when the object isn't a dictionary.
+    """
+    object_type = obj.get('type')
+    if object_type is None:
+        return parse_obj_as(AnyObject, obj)
+    return OBJECT_MODELS[object_type].parse_obj(obj)
+
 
 class Objects(BaseModel):
     """A schema of response of the server for game's object list
@@ -206,3 +233,60 @@ class Objects(BaseModel):
 
     objects: AnyObjectList
     map: Map
+
+    @classmethod
+    def parse_obj(cls, obj: Any) -> 'Objects':
+        """Parses a response. Pydantic tries every model of a union until
+        one of them validates, which is slow for maps with thousands of
+        objects, so game objects are parsed with models of their types.
+        If anything is wrong with the response, it is validated as usual to
+        raise the same error.
+
+        Raises:
+          ValidationError: when the response is invalid or there are
+            objects of unknown types.
+        """
+        try:
+            objects = [parse_object(raw_object)
+                       for raw_object in obj['objects']]
+            map_ = Map.parse_obj(obj['map'])
+        except (ValidationError, KeyError, TypeError, AttributeError):
+            return super().parse_obj(obj)
+
+        return cls.construct(objects=objects, map=map_)
+
+
+def construct(model: Type[Model], obj: dict) -> Model:
+    """Builds a model of trusted data without validation. Nested models,
+    lists of models and game objects are built too, other values are used as
+    they are. Constant fields take their defaults.
+
+    Parameters:
+      model: a model class.
+      obj: decoded data of the model.
+    """
+    values = {}
+    for name, field in model.__fields__.items():
+        if field.field_info.const or field.alias not in obj:
+            continue
+        values[name] = _construct_value(field.type_,
+                                        field.shape,
+                                        obj[field.alias])
+    return model.construct(**values)
+
+
+def _construct_value(type_: Any, shape: int, value: Any) -> Any:
+    if shape == SHAPE_LIST:
+        return [_construct_value(type_, SHAPE_SINGLETON, item)
+                for item in value]
+
+    if type_ is AnyObject:
+        object_model = OBJECT_MODELS.get(value.get('type'))
+        if object_model is None:
+            return parse_obj_as(AnyObject, value)
+        return construct(object_model, value)
+
+    if isinstance(type_, type) and issubclass(type_, BaseModel):
+        return construct(type_, value)
+
+    return value
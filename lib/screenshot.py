@@ -2,22 +2,89 @@
 screenshots.
 """
 
+import hashlib
 import math
-from typing import Tuple
+import threading
+from array import array
+from typing import Iterable, Iterator, Tuple, Type
 
 import numpy as np
 from PIL import Image
 
-from lib.schemas import ColorRGB, AnyObjectList
+from lib import settings
+from lib.cache import LRUCache
+from lib.columnar import ColumnarObjects, TYPE_COLORS
+from lib.schemas import ColorRGB, AnyObject, AnyObjectList
 
 
 BLACK_COLOR: ColorRGB = (0x0, 0x0, 0x0)
 
 
+class Palette:
+    """A palette of an indexed image. Images are drawn as arrays of color
+    indices and are expanded to RGB only when they are encoded. The color
+    with index 0 is the background color.
+    """
+
+    MAX_COLORS = 256
+
+    def __init__(self, colors: Iterable[ColorRGB] = (BLACK_COLOR,)):
+        """Initializes a palette.
+
+        Parameters:
+          colors: initial colors, the first one is the background color.
+        """
+        self._indices = {}
+        self._lock = threading.Lock()
+        self.lut = np.zeros((self.MAX_COLORS, 3), dtype=np.uint8)
+
+        for color in colors:
+            self.index(color)
+
+    def index(self, color: ColorRGB) -> int:
+        """Returns an index of a color. Unknown colors are added to the
+        palette.
+
+        Raises:
+          ValueError: when the palette is full.
+        """
+        try:
+            return self._indices[color]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if color not in self._indices:
+                index = len(self._indices)
+                if index == self.MAX_COLORS:
+                    raise ValueError('palette is full')
+                self.lut[index] = color
+                self._indices[color] = index
+            return self._indices[color]
+
+    def to_rgb(self, indices: np.ndarray) -> np.ndarray:
+        """Expands an array of color indices to RGB colors.
+        """
+        return self.lut[indices]
+
+    def to_pillow(self) -> bytes:
+        """Returns the palette in the format of Image.putpalette.
+        """
+        return self.lut.tobytes()
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+
+PALETTE = Palette()
+
+
 class Canvas:
     """A bare canvas
     """
 
+    palette: Palette = PALETTE
+
     @staticmethod
     def _init_img(width: int, height: int) -> np.ndarray:
         """Returns an image with given size and initial background color.
@@ -27,9 +94,9 @@ class Canvas:
           height: image's height.
 
         Returns:
-          An empty black image.
+          An empty image of color indices filled with the background.
         """
-        return np.zeros((height, width, 3), dtype=np.uint8)
+        return np.zeros((height, width), dtype=np.uint8)
 
 
 class GridCanvas(Canvas):
@@ -40,6 +107,20 @@ class GridCanvas(Canvas):
     LINE_SIZE_MIN = 1
     DOT_SIZE_MIN = 5
 
+    # A number of changed dots up to which the dots are repainted one by one
+    # instead of the whole cell area
+    CHANGED_DOTS_MAX = 256
+
+    # Kinds of pixels along an axis which aren't pixels of dots
+    _PX_BORDER = -2
+    _PX_LINE = -1
+
+    # Ready-made images with borders and grid. The images depend only on
+    # the canvas geometry and colors, so they are shared by all canvases
+    # of a worker process.
+    templates = LRUCache('grid_templates',
+                         settings.SCREENSHOT_TEMPLATES_CACHE_SIZE)
+
     def __init__(self,
                  map_dot_width: int,
                  map_dot_height: int,
@@ -59,6 +140,56 @@ class GridCanvas(Canvas):
           border_color: border color.
           grid_color: grid color.
         """
+        self._init_geometry(map_dot_width,
+                            map_dot_height,
+                            max_img_px_width,
+                            max_img_px_height,
+                            border_size)
+
+        key = (self.__class__, map_dot_width, map_dot_height,
+               max_img_px_width, max_img_px_height,
+               border_size, border_color, grid_color)
+        template = self.templates.get(key)
+
+        if template is None:
+            self.img = self._init_img(self._img_px_width,
+                                      self._img_px_height)
+            self._draw_borders(border_color)
+            self._draw_grid(grid_color)
+
+            template = self.img.copy()
+            template.flags.writeable = False
+            self.templates.put(key, template)
+        else:
+            self.img = template.copy()
+
+    @classmethod
+    def calculate_size(cls,
+                       map_dot_width: int,
+                       map_dot_height: int,
+                       max_img_px_width: int,
+                       max_img_px_height: int,
+                       border_size: int) -> Tuple[int, int]:
+        """Returns the size of an image of a canvas with given parameters
+        without drawing the canvas.
+
+        Returns:
+          A tuple with width and height in px
+        """
+        canvas = cls.__new__(cls)
+        canvas._init_geometry(map_dot_width,
+                              map_dot_height,
+                              max_img_px_width,
+                              max_img_px_height,
+                              border_size)
+        return canvas.size()
+
+    def _init_geometry(self,
+                       map_dot_width: int,
+                       map_dot_height: int,
+                       max_img_px_width: int,
+                       max_img_px_height: int,
+                       border_size: int):
         self._map_dot_width = map_dot_width
         self._map_dot_height = map_dot_height
         self._max_img_px_width = max_img_px_width
@@ -69,12 +200,6 @@ class GridCanvas(Canvas):
         self._dot, self._line = self._calculate_grid_properties()
         self._img_px_width, self._img_px_height = self._calculate_img_size()
 
-        self.img = self._init_img(self._img_px_width,
-                                  self._img_px_height)
-
-        self._draw_borders(border_color)
-        self._draw_grid(grid_color)
-
     def _calculate_grid_properties(self) -> Tuple[int, int]:
         """Calculates grid properties: sizes of cell and line.
 
@@ -92,14 +217,21 @@ class GridCanvas(Canvas):
             )
         )
 
+        line = self._calculate_line_size(cell)
+
+        dot = cell - line
+
+        return dot, line
+
+    def _calculate_line_size(self, cell: int) -> int:
+        """Returns grid line width in px for given cell size in px.
+        """
         line = math.floor(cell * self.LINE_SIZE_FACTOR)
 
         if line < self.LINE_SIZE_MIN and cell - line > self.DOT_SIZE_MIN:
             line = self.LINE_SIZE_MIN
 
-        dot = cell - line
-
-        return dot, line
+        return line
 
     def _calculate_img_size(self) -> Tuple[int, int]:
         img_px_width = \
@@ -130,6 +262,29 @@ class GridCanvas(Canvas):
         px_y_2 = px_y_1 + self._dot
         return (px_x_1, px_y_1), (px_x_2, px_y_2)
 
+    def px_kinds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns kinds of pixels along X and Y axes. A kind of a pixel is
+        an index of a dot or _PX_LINE or _PX_BORDER.
+        """
+        return (self._calculate_px_kinds(self._img_px_width,
+                                         self._map_dot_width),
+                self._calculate_px_kinds(self._img_px_height,
+                                         self._map_dot_height))
+
+    def _calculate_px_kinds(self, length: int, dots: int) -> np.ndarray:
+        kinds = np.full(length, self._PX_LINE, dtype=np.intp)
+        kinds[:self._border_size] = self._PX_BORDER
+        kinds[length - self._border_size:] = self._PX_BORDER
+
+        cell = self._dot + self._line
+        offsets = np.arange(length - self._border_size * 2)
+        indices = offsets // cell
+        in_dot = (offsets % cell >= self._line) & (indices < dots)
+        kinds[self._border_size:length - self._border_size][in_dot] = \
+            indices[in_dot]
+
+        return kinds
+
     def _draw_grid(self, grid_color: ColorRGB):
         """Draws a grid of given color.
 
@@ -194,17 +349,104 @@ class GridCanvas(Canvas):
     def draw_dot(self, dot_x: int, dot_y: int, color: ColorRGB):
         """Draws a single dot.
         """
+        self._fill_dot(dot_x, dot_y, self.palette.index(color))
+
+    def _fill_dot(self, dot_x: int, dot_y: int, index: int):
         (px_x_1, px_y_1), (px_x_2, px_y_2) = self._calculate_rect_px_x_y(
             dot_x,
             dot_y,
         )
-        self._draw_px_rect(px_x_1, px_y_1, px_x_2, px_y_2, color)
+        self._fill_px_rect(px_x_1, px_y_1, px_x_2, px_y_2, index)
+
+    def draw_dots(self, dots: np.ndarray, colors: np.ndarray):
+        """Draws a number of dots at once. See DotFrame.from_dots.
+
+        Parameters:
+          dots: an integer array of shape (N, 2) with X and Y of dots.
+          colors: an array of shape (N,) with palette indices of colors.
+        """
+        self.draw_frame(DotFrame.from_dots(
+            (self._map_dot_width, self._map_dot_height),
+            dots,
+            colors,
+        ))
+
+    def draw_frame(self, frame: 'DotFrame'):
+        """Draws a frame of the map's resolution. The frame is expanded to
+        pixels of the dot cells. Pixels of borders and grid lines are left
+        untouched.
+
+        Parameters:
+          frame: a frame of the same map size as the canvas has.
+        """
+        assert frame.size == (self._map_dot_width, self._map_dot_height), \
+            'Frame size does not match the canvas'
+
+        assert frame.palette is self.palette, \
+            'Frame palette does not match the canvas'
+
+        self._draw_masked(frame.indices, frame.mask())
+
+    def draw_frame_changes(self, previous: 'DotFrame', frame: 'DotFrame'):
+        """Repaints the dots which differ between a frame drawn on the
+        canvas previously and a new frame. The cost depends on the number
+        of changed dots rather than on the number of game objects.
+
+        Parameters:
+          previous: the frame which has been drawn on the canvas.
+          frame: a new frame of the same map size.
+        """
+        assert previous.size == frame.size == \
+            (self._map_dot_width, self._map_dot_height), \
+            'Frame size does not match the canvas'
+
+        changed = previous.indices != frame.indices
+        dots_y, dots_x = np.nonzero(changed)
+
+        if dots_x.size > self.CHANGED_DOTS_MAX:
+            self._draw_masked(frame.indices, changed)
+            return
+
+        for dot_x, dot_y in zip(dots_x.tolist(), dots_y.tolist()):
+            self._fill_dot(dot_x, dot_y, frame.indices[dot_y, dot_x])
+
+    def _draw_masked(self, indices: np.ndarray, mask: np.ndarray):
+        """Expands color indices of dots to pixels of the dot cells where
+        the mask is set.
+
+        Parameters:
+          indices: color indices of shape (map height, map width).
+          mask: a boolean array of the same shape.
+        """
+        np.copyto(self._cells_view(),
+                  indices[:, np.newaxis, :, np.newaxis],
+                  where=mask[:, np.newaxis, :, np.newaxis])
+
+    def _cells_view(self) -> np.ndarray:
+        """Returns a view of the image which contains only pixels of dot
+        cells. The view has shape (map height, dot, map width, dot), so
+        a frame of the map's resolution can be broadcast to it.
+        """
+        cell = self._dot + self._line
+        start = self._border_size + self._line
+        area = self.img[start:start + cell * self._map_dot_height,
+                        start:start + cell * self._map_dot_width]
+        # Splitting of axes never copies data, so the result is a view.
+        cells = area.reshape(self._map_dot_height, cell,
+                             self._map_dot_width, cell)
+        return cells[:, :self._dot, :, :self._dot]
 
     def _draw_px_rect(self,
                       x1: int, y1: int,
                       x2: int, y2: int,
                       color: ColorRGB):
-        self.img[y1:y2, x1:x2] = color
+        self._fill_px_rect(x1, y1, x2, y2, self.palette.index(color))
+
+    def _fill_px_rect(self,
+                      x1: int, y1: int,
+                      x2: int, y2: int,
+                      index: int):
+        self.img[y1:y2, x1:x2] = index
 
     def size(self) -> Tuple[int, int]:
         """Returns the size of an image.
@@ -224,8 +466,463 @@ class GridCanvas(Canvas):
             self._line)
 
 
+class FittedGridCanvas(GridCanvas):
+    """A grid canvas which has exactly the given size, so no resampling is
+    needed to get an image of a strict size. Pixels which are left over by
+    cells of equal size are spread evenly over the cells, hence some dots are
+    one pixel larger than the others.
+    """
+
+    @classmethod
+    def fits(cls,
+             map_dot_width: int,
+             map_dot_height: int,
+             img_px_width: int,
+             img_px_height: int,
+             border_size: int) -> bool:
+        """Returns whether a map can be drawn on a canvas of the given size
+        with dots of at least one pixel.
+        """
+        canvas = cls.__new__(cls)
+        canvas._map_dot_width = map_dot_width
+        canvas._map_dot_height = map_dot_height
+        canvas._max_img_px_width = img_px_width
+        canvas._max_img_px_height = img_px_height
+        canvas._border_size = border_size
+        dot, _ = canvas._calculate_grid_properties()
+        return dot > 0
+
+    def _init_geometry(self,
+                       map_dot_width: int,
+                       map_dot_height: int,
+                       max_img_px_width: int,
+                       max_img_px_height: int,
+                       border_size: int):
+        super()._init_geometry(map_dot_width,
+                               map_dot_height,
+                               max_img_px_width,
+                               max_img_px_height,
+                               border_size)
+
+        assert self._dot > 0, 'Map does not fit the canvas'
+
+        self._dots_px_x, self._dots_size_x, self._px_kinds_x = \
+            self._calculate_axis(self._img_px_width, self._map_dot_width)
+        self._dots_px_y, self._dots_size_y, self._px_kinds_y = \
+            self._calculate_axis(self._img_px_height, self._map_dot_height)
+
+    def _calculate_grid_properties(self) -> Tuple[int, int]:
+        """Calculates grid properties: the smallest size of dot and the size
+        of line.
+
+        Returns:
+          Returns a tuple with dot length and grid line width both in px.
+        """
+        cell = min(
+            (self._max_img_px_width - self._border_size * 2) //
+            self._map_dot_width,
+            (self._max_img_px_height - self._border_size * 2) //
+            self._map_dot_height,
+        )
+
+        line = self._calculate_line_size(cell)
+
+        dot = min(
+            (self._max_img_px_width - self._border_size * 2 - line) //
+            self._map_dot_width,
+            (self._max_img_px_height - self._border_size * 2 - line) //
+            self._map_dot_height,
+        ) - line
+
+        return dot, line
+
+    def _calculate_img_size(self) -> Tuple[int, int]:
+        return self._max_img_px_width, self._max_img_px_height
+
+    def _calculate_axis(self, length: int, dots: int) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Calculates positions of dots along an axis.
+
+        Parameters:
+          length: the axis length in px.
+          dots: a number of dots along the axis.
+
+        Returns:
+          A tuple with positions of dots in px, sizes of dots in px and kinds
+          of pixels along the axis: a dot index, _PX_LINE or _PX_BORDER.
+        """
+        cells_length = length - self._border_size * 2 - self._line
+        edges = np.arange(dots + 1) * cells_length // dots
+        dots_px = self._border_size + edges[:-1] + self._line
+        dots_size = np.diff(edges) - self._line
+
+        kinds = np.full(length, self._PX_LINE, dtype=np.intp)
+        kinds[:self._border_size] = self._PX_BORDER
+        kinds[length - self._border_size:] = self._PX_BORDER
+        for index, (start, size) in enumerate(zip(dots_px.tolist(),
+                                                  dots_size.tolist())):
+            kinds[start:start + size] = index
+
+        return dots_px, dots_size, kinds
+
+    def px_kinds(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self._px_kinds_x, self._px_kinds_y
+
+    def _calculate_rect_px_x_y(self, dot_x: int, dot_y: int) \
+            -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        px_x_1 = int(self._dots_px_x[dot_x])
+        px_y_1 = int(self._dots_px_y[dot_y])
+        px_x_2 = px_x_1 + int(self._dots_size_x[dot_x])
+        px_y_2 = px_y_1 + int(self._dots_size_y[dot_y])
+        return (px_x_1, px_y_1), (px_x_2, px_y_2)
+
+    def _draw_grid(self, grid_color: ColorRGB):
+        rows = self._px_kinds_y[:, np.newaxis]
+        cols = self._px_kinds_x[np.newaxis, :]
+        grid = (rows == self._PX_LINE) & (cols != self._PX_BORDER) | \
+               (cols == self._PX_LINE) & (rows != self._PX_BORDER)
+        self.img[grid] = self.palette.index(grid_color)
+
+    def _draw_borders(self, border_color: ColorRGB):
+        rows = self._px_kinds_y[:, np.newaxis]
+        cols = self._px_kinds_x[np.newaxis, :]
+        borders = (rows == self._PX_BORDER) | (cols == self._PX_BORDER)
+        self.img[borders] = self.palette.index(border_color)
+
+    def _draw_masked(self, indices: np.ndarray, mask: np.ndarray):
+        rows = np.flatnonzero(self._px_kinds_y >= 0)
+        cols = np.flatnonzero(self._px_kinds_x >= 0)
+        dots = np.ix_(self._px_kinds_y[rows], self._px_kinds_x[cols])
+        area = np.ix_(rows, cols)
+        self.img[area] = np.where(mask[dots], indices[dots], self.img[area])
+
+
+class BandedGridCanvas(Canvas):
+    """A grid canvas which doesn't keep an image. It keeps the latest drawn
+    frame and renders the image in horizontal bands on demand, so memory
+    taken by rendering is bounded by the band height rather than by the
+    image area. The geometry is the same as the geometry of a grid canvas of
+    the layout class.
+    """
+
+    def __init__(self,
+                 map_dot_width: int,
+                 map_dot_height: int,
+                 max_img_px_width: int,
+                 max_img_px_height: int,
+                 border_size: int,
+                 border_color: ColorRGB,
+                 grid_color: ColorRGB,
+                 layout: Type[GridCanvas] = GridCanvas):
+        """Initializes a BandedGridCanvas instance.
+
+        Parameters:
+          map_dot_width: map width in dots.
+          map_dot_height: map height in dots.
+          max_img_px_width: limit result image width in px.
+          max_img_px_height: limit result image height in px.
+          border_size: border size in px.
+          border_color: border color.
+          grid_color: grid color.
+          layout: a grid canvas class which defines the geometry.
+        """
+        geometry = layout.__new__(layout)
+        geometry._init_geometry(map_dot_width,
+                                map_dot_height,
+                                max_img_px_width,
+                                max_img_px_height,
+                                border_size)
+
+        self._map_dot_width = map_dot_width
+        self._map_dot_height = map_dot_height
+        self._geometry = geometry
+
+        # Pixel kinds are turned into positions in a lookup table which is
+        # a frame extended with a column and a row of grid lines and a column
+        # and a row of borders.
+        kinds_x, kinds_y = geometry.px_kinds()
+        self._lookup_x = self._to_lookup(kinds_x, map_dot_width)
+        self._lookup_y = self._to_lookup(kinds_y, map_dot_height)
+
+        self._border_index = self.palette.index(border_color)
+        self._grid_index = self.palette.index(grid_color)
+
+        self._frame = DotFrame((map_dot_width, map_dot_height))
+
+    @staticmethod
+    def _to_lookup(kinds: np.ndarray, dots: int) -> np.ndarray:
+        return np.where(kinds >= 0, kinds, dots - 1 - kinds)
+
+    def draw_frame(self, frame: 'DotFrame'):
+        """Replaces the drawn frame with a frame of the map's resolution.
+
+        Parameters:
+          frame: a frame of the same map size as the canvas has.
+        """
+        assert frame.size == (self._map_dot_width, self._map_dot_height), \
+            'Frame size does not match the canvas'
+
+        assert frame.palette is self.palette, \
+            'Frame palette does not match the canvas'
+
+        self._frame = frame
+
+    def draw_frame_changes(self, previous: 'DotFrame', frame: 'DotFrame'):
+        """Replaces the drawn frame with a new frame. Nothing is repainted
+        because bands are rendered from the frame on demand.
+
+        Parameters:
+          previous: the frame which has been drawn on the canvas.
+          frame: a new frame of the same map size.
+        """
+        self.draw_frame(frame)
+
+    def bands(self, band_height: int) -> Iterator[np.ndarray]:
+        """Renders the image in horizontal bands from top to bottom.
+
+        Parameters:
+          band_height: a height of a band in px, the last band may be lower.
+
+        Returns:
+          An iterator of arrays of color indices of shape (band height,
+          image width).
+        """
+        assert band_height > 0, 'Band height must be positive'
+
+        width, height = self._map_dot_width, self._map_dot_height
+        lookup = np.full((height + 2, width + 2),
+                         self._grid_index,
+                         dtype=np.uint8)
+        lookup[:height, :width] = self._frame.indices
+        lookup[height + 1, :] = self._border_index
+        lookup[:, width + 1] = self._border_index
+
+        lookup = lookup[:, self._lookup_x]
+        for start in range(0, self._lookup_y.size, band_height):
+            yield lookup[self._lookup_y[start:start + band_height]]
+
+    def size(self) -> Tuple[int, int]:
+        """Returns the size of an image.
+
+        Returns:
+          A tuple with width and height in px
+        """
+        return self._geometry.size()
+
+    def __repr__(self):
+        return '{}.{}(width={}, height={}, layout={})'.format(
+            __name__,
+            self.__class__.__name__,
+            *self.size(),
+            self._geometry.__class__.__name__)
+
+
+class DotFrame:
+    """A compact frame of a game map which keeps a palette color index per
+    dot. Dots with the background index are empty. A frame is built once and
+    can be drawn on canvases of any size.
+    """
+
+    palette: Palette = PALETTE
+
+    def __init__(self, map_size: Tuple[int, int]):
+        """Initializes an empty frame.
+
+        Parameters:
+          map_size: size of map in dots
+        """
+        width, height = map_size
+        self.size = map_size
+        self.indices = np.zeros((height, width), dtype=np.uint8)
+
+    def mask(self) -> np.ndarray:
+        """Returns a boolean array of dots which are not empty.
+        """
+        return self.indices != 0
+
+    def fingerprint(self) -> str:
+        """Returns a digest of the frame. Frames with the same map size and
+        colors of dots have equal fingerprints regardless of palette indices.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.array(self.size, dtype=np.int64).tobytes())
+        digest.update(self.palette.to_rgb(self.indices).tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def from_dots(cls,
+                  map_size: Tuple[int, int],
+                  dots: np.ndarray,
+                  colors: np.ndarray) -> 'DotFrame':
+        """Returns a frame with given dots painted in one pass. Dots which
+        are out of the map are ignored. If a dot is given more than once,
+        the last given color is used.
+
+        Parameters:
+          map_size: size of map in dots
+          dots: an integer array of shape (N, 2) with X and Y of dots.
+          colors: an array of shape (N,) with palette indices of colors.
+        """
+        frame = cls(map_size)
+        frame.paint_dots(dots, colors)
+        return frame
+
+    def paint_dots(self, dots: np.ndarray, colors: np.ndarray):
+        """Paints given dots over the frame in one pass, see from_dots.
+
+        Parameters:
+          dots: an integer array of shape (N, 2) with X and Y of dots.
+          colors: an array of shape (N,) with palette indices of colors.
+        """
+        width, height = self.size
+
+        dots_x, dots_y = dots[:, 0], dots[:, 1]
+        inside = (0 <= dots_x) & (dots_x < width) & \
+                 (0 <= dots_y) & (dots_y < height)
+        dots_x, dots_y, colors = dots_x[inside], dots_y[inside], colors[inside]
+
+        # The order of assignment is undefined for repeated indices, so
+        # only the last occurrence of every dot is kept.
+        positions = dots_y * width + dots_x
+        _, last = np.unique(positions[::-1], return_index=True)
+        last = positions.size - 1 - last
+
+        self.indices[dots_y[last], dots_x[last]] = colors[last]
+
+    @classmethod
+    def from_objects(cls,
+                     map_size: Tuple[int, int],
+                     game_objects: AnyObjectList) -> 'DotFrame':
+        """Returns a frame with given game objects.
+
+        Parameters:
+          map_size: size of map in dots
+          game_objects: list of game objects or columnar objects
+        """
+        if isinstance(game_objects, ColumnarObjects):
+            return cls.from_columnar(game_objects, map_size)
+
+        dots = []
+        colors = []
+        counts = []
+        for game_object in game_objects:
+            object_dots = game_object.dots
+            dots.extend(object_dots)
+            colors.append(cls.palette.index(game_object.color()))
+            counts.append(len(object_dots))
+
+        if not dots:
+            return cls(map_size)
+
+        return cls.from_dots(
+            map_size,
+            np.array(dots, dtype=np.intp).reshape(-1, 2),
+            np.repeat(np.array(colors, dtype=np.uint8), counts, axis=0),
+        )
+
+    @classmethod
+    def from_columnar(cls,
+                      game_objects: ColumnarObjects,
+                      map_size: Tuple[int, int] = None) -> 'DotFrame':
+        """Returns a frame with columnar game objects without iterating over
+        the objects.
+
+        Parameters:
+          game_objects: columnar game objects
+          map_size: size of map in dots, the size of the objects' map is
+            used by default
+        """
+        colors = np.array([cls.palette.index(color) for color in TYPE_COLORS],
+                          dtype=np.uint8)
+        return cls.from_dots(
+            map_size or game_objects.map_size,
+            game_objects.dots,
+            np.repeat(colors[game_objects.types], game_objects.counts()),
+        )
+
+    def __repr__(self):
+        return '{}.{}(width={}, height={})'.format(
+            __name__,
+            self.__class__.__name__,
+            *self.size)
+
+
+class DotFrameBuilder:
+    """Builds a frame of game objects which arrive one by one, e.g. while a
+    response of the server is being received. Dots of objects are painted
+    in batches as soon as the map size is known, so a frame is ready right
+    after the last object. Objects which arrive before the map size are
+    kept in compact arrays until then.
+    """
+
+    palette: Palette = PALETTE
+
+    # A number of dots which are painted at once
+    BATCH_DOTS = 4096
+
+    def __init__(self):
+        self._frame = None
+        self._dots = array('q')
+        self._colors = bytearray()
+
+    def set_map_size(self, map_size: Tuple[int, int]):
+        """Sets the map size and paints the objects which have arrived.
+
+        Parameters:
+          map_size: size of map in dots
+        """
+        assert self._frame is None, 'Map size has been set'
+
+        self._frame = DotFrame(map_size)
+        self._paint()
+
+    def add_object(self, game_object: AnyObject):
+        """Adds a game object to the frame.
+
+        Parameters:
+          game_object: a game object
+        """
+        index = self.palette.index(game_object.color())
+        for dot_x, dot_y in game_object.dots:
+            self._dots.append(dot_x)
+            self._dots.append(dot_y)
+        self._colors.extend(bytes((index,)) * len(game_object.dots))
+
+        if self._frame is not None and len(self._colors) >= self.BATCH_DOTS:
+            self._paint()
+
+    def build(self) -> DotFrame:
+        """Returns the frame with all added objects.
+
+        Raises:
+          ValueError: when the map size has not been set.
+        """
+        if self._frame is None:
+            raise ValueError('map size is unknown')
+
+        self._paint()
+        return self._frame
+
+    def _paint(self):
+        if not self._colors:
+            return
+
+        self._frame.paint_dots(
+            np.frombuffer(self._dots, dtype=np.int64).reshape(-1, 2),
+            np.frombuffer(self._colors, dtype=np.uint8),
+        )
+        self._dots = array('q')
+        self._colors = bytearray()
+
+
 class Screenshot:
     """A game screenshot.
+
+    Screenshots which allow banding and would take more pixels than the
+    banded threshold in settings are rendered in horizontal bands, see
+    BandedGridCanvas. Banding never changes the layout: strict sized
+    screenshots which are resized are not banded, because resizing needs the
+    whole image.
     """
 
     COLOR_BACKGROUND: ColorRGB = BLACK_COLOR
@@ -237,54 +934,234 @@ class Screenshot:
                  map_size: Tuple[int, int],
                  max_size: Tuple[int, int],
                  game_objects: AnyObjectList,
-                 strict_sized: bool = False):
+                 strict_sized: bool = False,
+                 exact_fit: bool = False,
+                 allow_banded: bool = False):
         """Initializes a screenshot.
 
         Parameters:
           map_size: size of map in dots
           max_size: limits for result image in px
-          game_objects: list of game objects
+          game_objects: list of game objects or columnar objects
+          strict_sized: a flag whether to generate an image with strict
+            limited size or not
+          exact_fit: a flag whether to lay out a strict sized image to fit
+            the strict size instead of resizing it, if the map fits
+          allow_banded: a flag whether a big image can be rendered in bands,
+            it should be set only if the encoder streams bands
+        """
+        self._init_canvas(map_size, max_size, strict_sized, exact_fit,
+                          allow_banded)
+
+        self._draw_objects(game_objects)
+
+        self._image = None
+
+    @classmethod
+    def from_frame(cls,
+                   frame: DotFrame,
+                   max_size: Tuple[int, int],
+                   strict_sized: bool = False,
+                   exact_fit: bool = False,
+                   allow_banded: bool = False) -> 'Screenshot':
+        """Returns a screenshot of a prepared frame. A frame can be shared by
+        screenshots of different sizes.
+
+        Parameters:
+          frame: a frame of a game map
+          max_size: limits for result image in px
+          strict_sized: a flag whether to generate an image with strict
+            limited size or not
+          exact_fit: a flag whether to lay out a strict sized image to fit
+            the strict size instead of resizing it, if the map fits
+          allow_banded: a flag whether a big image can be rendered in bands,
+            it should be set only if the encoder streams bands
+        """
+        screenshot = cls.__new__(cls)
+        screenshot._init_canvas(frame.size, max_size, strict_sized, exact_fit,
+                                allow_banded)
+        screenshot._canvas.draw_frame(frame)
+        screenshot._frame = frame
+        screenshot._image = None
+        return screenshot
+
+    @classmethod
+    def from_columnar(cls,
+                      game_objects: ColumnarObjects,
+                      max_size: Tuple[int, int],
+                      strict_sized: bool = False,
+                      exact_fit: bool = False) -> 'Screenshot':
+        """Returns a screenshot of columnar game objects.
+
+        Parameters:
+          game_objects: columnar game objects
+          max_size: limits for result image in px
           strict_sized: a flag whether to generate an image with strict
             limited size or not
+          exact_fit: a flag whether to lay out a strict sized image to fit
+            the strict size instead of resizing it, if the map fits
         """
+        return cls.from_frame(DotFrame.from_columnar(game_objects),
+                              max_size,
+                              strict_sized,
+                              exact_fit)
+
+    def update(self, frame: DotFrame):
+        """Updates the screenshot with a new frame of the same map. Only the
+        dots which have changed since the previous frame are repainted.
+
+        Parameters:
+          frame: a new frame of a game map
+        """
+        self._canvas.draw_frame_changes(self._frame, frame)
+        self._frame = frame
+        self._image = None
+
+    @property
+    def map_size(self) -> Tuple[int, int]:
+        """Size of map in dots
+        """
+        return self._map_dot_width, self._map_dot_height
+
+    def _init_canvas(self,
+                     map_size: Tuple[int, int],
+                     max_size: Tuple[int, int],
+                     strict_sized: bool,
+                     exact_fit: bool,
+                     allow_banded: bool):
         self._map_dot_width, self._map_dot_height = map_size
         self._max_img_px_width, self._max_img_px_height = max_size
+        self._strict_sized = strict_sized
 
-        self._canvas = GridCanvas(self._map_dot_width,
-                                  self._map_dot_height,
-                                  self._max_img_px_width,
-                                  self._max_img_px_height,
-                                  self.BORDER_SIZE,
-                                  self.COLOR_BORDER,
-                                  self.COLOR_GRID)
+        canvas_class = GridCanvas
+        canvas_max_size = max_size
 
-        self._draw_objects(game_objects)
+        width, height = GridCanvas.calculate_size(self._map_dot_width,
+                                                  self._map_dot_height,
+                                                  self._max_img_px_width,
+                                                  self._max_img_px_height,
+                                                  self.BORDER_SIZE)
+        threshold = settings.SCREENSHOT_BANDED_PX_THRESHOLD
+        banded = allow_banded and 0 < threshold < width * height
+
+        if strict_sized:
+            self._strict_size = self._calculate_strict_size(width, height)
+            if exact_fit and \
+                    FittedGridCanvas.fits(self._map_dot_width,
+                                          self._map_dot_height,
+                                          *self._strict_size,
+                                          self.BORDER_SIZE):
+                canvas_class = FittedGridCanvas
+                canvas_max_size = self._strict_size
+            else:
+                # A resized image can't be rendered in bands
+                banded = False
 
-        self._image = self._rgb_image(strict_sized)
+        if banded:
+            self._canvas = BandedGridCanvas(self._map_dot_width,
+                                            self._map_dot_height,
+                                            *canvas_max_size,
+                                            self.BORDER_SIZE,
+                                            self.COLOR_BORDER,
+                                            self.COLOR_GRID,
+                                            layout=canvas_class)
+            return
+
+        self._canvas = canvas_class(self._map_dot_width,
+                                    self._map_dot_height,
+                                    *canvas_max_size,
+                                    self.BORDER_SIZE,
+                                    self.COLOR_BORDER,
+                                    self.COLOR_GRID)
 
     def _draw_objects(self, game_objects: AnyObjectList):
-        for game_object in game_objects:
-            color = game_object.color()
-            for (x, y) in game_object.dots:
-                self._canvas.draw_dot(x, y, color)
+        self._frame = DotFrame.from_objects(
+            (self._map_dot_width, self._map_dot_height),
+            game_objects,
+        )
+        self._canvas.draw_frame(self._frame)
+
+    @property
+    def banded(self) -> bool:
+        """Whether the screenshot is rendered in bands
+        """
+        return isinstance(self._canvas, BandedGridCanvas)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Size of the result image in px
+        """
+        if self._strict_sized:
+            return self._strict_size
+        return self._canvas.size()
+
+    @property
+    def palette(self) -> Palette:
+        """A palette of color indices of the screenshot
+        """
+        return self._canvas.palette
+
+    def bands(self) -> Iterator[np.ndarray]:
+        """Renders the result image of a banded screenshot in horizontal
+        bands from top to bottom, see BandedGridCanvas.bands.
+        """
+        assert self.banded, 'Screenshot is not banded'
+        return self._canvas.bands(settings.SCREENSHOT_BAND_HEIGHT)
+
+    def _assemble_bands(self, rgb: bool) -> Image:
+        img = Image.new('RGB' if rgb else 'L', self._canvas.size())
+        top = 0
+        for band in self.bands():
+            if rgb:
+                band = self.palette.to_rgb(band)
+            img.paste(Image.fromarray(band), (0, top))
+            top += band.shape[0]
+        return img
+
+    def _indexed_image(self) -> Image:
+        if self.banded:
+            img = self._assemble_bands(rgb=False)
+        else:
+            img = Image.fromarray(self._canvas.img)
+        img.putpalette(self._canvas.palette.to_pillow())
+        return img
+
+    def _needs_resize(self, strict_sized: bool) -> bool:
+        return strict_sized and self._canvas.size() != self._strict_size
 
     def _rgb_image(self, strict_sized: bool) -> Image:
-        if not strict_sized:
-            return Image.fromarray(self._canvas.img, 'RGB')
+        if self.banded:
+            # Banded canvases are never resized
+            return self._assemble_bands(rgb=True)
 
-        strict_width, strict_height = self._calculate_strict_size()
-        return Image.fromarray(self._canvas.img, 'RGB').resize(
+        if not self._needs_resize(strict_sized):
+            return self._indexed_image().convert('RGB')
+
+        strict_width, strict_height = self._strict_size
+        return self._indexed_image().convert('RGB').resize(
             (strict_width, strict_height))
 
     @property
     def img(self) -> Image:
-        """A result image
+        """A result image in RGB. The image is expanded from the palette on
+        the first access.
         """
+        if self._image is None:
+            self._image = self._rgb_image(self._strict_sized)
         return self._image
 
-    def _calculate_strict_size(self) -> Tuple[int, int]:
-        height, width, _ = self._canvas.img.shape
+    @property
+    def palette_img(self) -> Image:
+        """A result image in the palette mode. A strict sized image is
+        resized with the nearest neighbour filter to keep the palette.
+        """
+        if not self._needs_resize(self._strict_sized):
+            return self._indexed_image()
+
+        return self._indexed_image().resize(self._strict_size, Image.NEAREST)
 
+    def _calculate_strict_size(self, width: int, height: int) \
+            -> Tuple[int, int]:
         max_length = min(self._max_img_px_width, self._max_img_px_height)
 
         if width == height:
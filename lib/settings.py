@@ -2,6 +2,7 @@
 """
 
 from environs import Env
+from marshmallow.validate import OneOf
 
 
 env = Env()
@@ -19,14 +20,95 @@ RATE_LIMITS_REDIS_URL = env(
     'RATE_LIMITS_REDIS_URL',
     'redis://127.0.0.1:6379/2',
 )
+STATE_REDIS_URL = env('STATE_REDIS_URL', 'redis://127.0.0.1:6379/3')
 
 SNAKE_API_ADDRESS = env('SNAKE_API_ADDRESS', 'http://localhost:8080/api')
 CLIENT_NAME = env('CLIENT_NAME', 'SnakeCLIClient')
 
+# Every thread of a worker process has a long-lived client and the clients of
+# a process share a pool of connections to the server. The pool size is the
+# maximum number of kept connections, it should not be less than the number
+# of threads of a worker process. Timeouts are in seconds.
+API_POOL_SIZE = env.int('API_POOL_SIZE', 10)
+API_KEEP_ALIVE = env.bool('API_KEEP_ALIVE', True)
+API_CONNECT_TIMEOUT = env.float('API_CONNECT_TIMEOUT', 3.05)
+API_READ_TIMEOUT = env.float('API_READ_TIMEOUT', 30)
+API_GZIP = env.bool('API_GZIP', True)
+
+# A maximum number of responses of read-only endpoints in the response cache
+# of a worker process, 0 disables the cache. The responses are cached for
+# TTLs of endpoints in seconds, 0 disables caching of an endpoint.
+API_CACHE_SIZE = env.int('API_CACHE_SIZE', 256)
+API_CACHE_TTL_GAMES = env.float('API_CACHE_TTL_GAMES', 5)
+API_CACHE_TTL_GAME = env.float('API_CACHE_TTL_GAME', 5)
+API_CACHE_TTL_INFO = env.float('API_CACHE_TTL_INFO', 300)
+API_CACHE_TTL_CAPACITY = env.float('API_CACHE_TTL_CAPACITY', 10)
+
+# Identical concurrent GET requests of threads of a worker process share one
+# request in flight in the process scope. In the cluster scope uncached
+# requests are shared by worker processes too through the state store, a
+# result of a request is kept there for the result TTL in milliseconds.
+API_SINGLE_FLIGHT_OFF = 'off'
+API_SINGLE_FLIGHT_PROCESS = 'process'
+API_SINGLE_FLIGHT_CLUSTER = 'cluster'
+
+API_SINGLE_FLIGHT = env(
+    'API_SINGLE_FLIGHT',
+    API_SINGLE_FLIGHT_PROCESS,
+    validate=OneOf([
+        API_SINGLE_FLIGHT_OFF,
+        API_SINGLE_FLIGHT_PROCESS,
+        API_SINGLE_FLIGHT_CLUSTER,
+    ]),
+)
+API_SINGLE_FLIGHT_RESULT_TTL = env.int('API_SINGLE_FLIGHT_RESULT_TTL', 1000)
+
+# Whether to limit concurrent tasks of workers which call the server, such
+# as taking screenshots and deleting games. The limit is shared by worker
+# processes and adjusted every interval in seconds by the server's capacity
+# and by latencies and failures of requests, see lib.limiter. A task waits
+# for a slot for the wait timeout in seconds.
+API_CONCURRENCY_ADAPTIVE = env.bool('API_CONCURRENCY_ADAPTIVE', False)
+API_CONCURRENCY_MIN = env.int('API_CONCURRENCY_MIN', 1)
+API_CONCURRENCY_MAX = env.int('API_CONCURRENCY_MAX', 32)
+API_CONCURRENCY_INITIAL = env.int('API_CONCURRENCY_INITIAL', 8)
+API_CONCURRENCY_INTERVAL = env.float('API_CONCURRENCY_INTERVAL', 10)
+API_CONCURRENCY_HIGH_CAPACITY = env.float('API_CONCURRENCY_HIGH_CAPACITY',
+                                          0.8)
+API_CONCURRENCY_LOW_CAPACITY = env.float('API_CONCURRENCY_LOW_CAPACITY', 0.5)
+API_CONCURRENCY_MAX_ERROR_RATE = env.float('API_CONCURRENCY_MAX_ERROR_RATE',
+                                           0.1)
+API_CONCURRENCY_MAX_LATENCY = env.float('API_CONCURRENCY_MAX_LATENCY', 1.0)
+API_CONCURRENCY_WAIT_TIMEOUT = env.float('API_CONCURRENCY_WAIT_TIMEOUT', 30)
+
+# A maximum number of concurrent requests of a worker which fetches game
+# objects of many games at once with the asyncio client
+API_FETCH_CONCURRENCY = env.int('API_FETCH_CONCURRENCY', 10)
+
+# In the trusted mode responses of the server are decoded with orjson if it
+# is installed and models are built without validation. 1 in N responses
+# are validated anyway to catch changes of the server's schema, 0 disables
+# validation.
+API_TRUSTED = env.bool('API_TRUSTED', False)
+API_VALIDATION_SAMPLE_RATE = env.int('API_VALIDATION_SAMPLE_RATE', 100)
+
+# Whether to stream game objects of maps and draw them as they are received
+# instead of parsing the whole response first. Screenshots are rendered from
+# the frame of objects then, as in the pyramid render mode.
+API_STREAM_OBJECTS = env.bool('API_STREAM_OBJECTS', False)
+
 TASK_INTERVAL_SCREENSHOT = env.int('TASK_INTERVAL_SCREENSHOT', 60)
 TASK_INTERVAL_DELETE_CACHE = env.int('TASK_INTERVAL_DELETE_CACHE', 3600)
 TASK_INTERVAL_CLEANUP_GAMES = env.int('TASK_INTERVAL_CLEANUP_GAMES', 3600)
 
+# Empty games are deleted when they have been empty for the grace period in
+# seconds, the times since when games are empty are kept in the state store.
+# Games are deleted in chunks of the chunk size by tasks of which no more
+# than the concurrency limit run at once.
+GAMES_CLEANUP_GRACE_PERIOD = env.int('GAMES_CLEANUP_GRACE_PERIOD', 600)
+GAMES_CLEANUP_CHUNK_SIZE = env.int('GAMES_CLEANUP_CHUNK_SIZE', 20)
+GAMES_CLEANUP_CONCURRENCY = env.int('GAMES_CLEANUP_CONCURRENCY', 2)
+
 # Prometheus
 
 PROMETHEUS_METRICS_LISTEN_HOST = env(
@@ -60,6 +142,171 @@ SCREENSHOT_LENGTHS = {
 
 SCREENSHOT_STRICT_SIZED = env.bool('SCREENSHOT_STRICT_SIZED', True)
 
+# The resize layout renders a strict sized screenshot at its natural size
+# and resizes it. The fit layout picks sizes of dots and lines so that the
+# image comes out at the strict size, it falls back to resizing if a map is
+# too big for the size.
+SCREENSHOT_LAYOUT_RESIZE = 'resize'
+SCREENSHOT_LAYOUT_FIT = 'fit'
+
+SCREENSHOT_LAYOUT = env(
+    'SCREENSHOT_LAYOUT',
+    SCREENSHOT_LAYOUT_RESIZE,
+    validate=OneOf([
+        SCREENSHOT_LAYOUT_RESIZE,
+        SCREENSHOT_LAYOUT_FIT,
+    ]),
+)
+
+# Image formats and encoder options. The defaults can be overridden for every
+# size with variables like SCREENSHOT_BIG_FORMAT or SCREENSHOT_TINY_QUALITY.
+# The effort is a compression level: the zlib level for PNG or the method
+# for WebP. It isn't used for JPEG.
+SCREENSHOT_FORMAT_JPEG = 'jpeg'
+SCREENSHOT_FORMAT_PNG = 'png'
+SCREENSHOT_FORMAT_WEBP = 'webp'
+SCREENSHOT_FORMAT_WEBP_LOSSLESS = 'webp-lossless'
+
+SCREENSHOT_FORMATS = (
+    SCREENSHOT_FORMAT_JPEG,
+    SCREENSHOT_FORMAT_PNG,
+    SCREENSHOT_FORMAT_WEBP,
+    SCREENSHOT_FORMAT_WEBP_LOSSLESS,
+)
+
+SCREENSHOT_FORMAT = env('SCREENSHOT_FORMAT',
+                        SCREENSHOT_FORMAT_JPEG,
+                        validate=OneOf(SCREENSHOT_FORMATS))
+SCREENSHOT_OPTIMIZE = env.bool('SCREENSHOT_OPTIMIZE', True)
+SCREENSHOT_COMPRESS_EFFORT = env.int('SCREENSHOT_COMPRESS_EFFORT', None)
+
+SCREENSHOT_ENCODERS = {
+    size_slug: {
+        'format': env('SCREENSHOT_{}_FORMAT'.format(size_slug.upper()),
+                      SCREENSHOT_FORMAT,
+                      validate=OneOf(SCREENSHOT_FORMATS)),
+        'quality': env.int('SCREENSHOT_{}_QUALITY'.format(size_slug.upper()),
+                           SCREENSHOT_QUALITY),
+        'optimize': env.bool(
+            'SCREENSHOT_{}_OPTIMIZE'.format(size_slug.upper()),
+            SCREENSHOT_OPTIMIZE,
+        ),
+        'effort': env.int(
+            'SCREENSHOT_{}_COMPRESS_EFFORT'.format(size_slug.upper()),
+            SCREENSHOT_COMPRESS_EFFORT,
+        ),
+    }
+    for size_slug in SCREENSHOT_LENGTHS
+}
+
+# The exact mode renders every size from game objects. The pyramid mode
+# builds a frame of a map once per game and expands it to every size. The
+# incremental mode works like the pyramid mode but retains the latest
+# screenshots of games in a worker process and repaints only changed dots.
+SCREENSHOT_RENDER_MODE_EXACT = 'exact'
+SCREENSHOT_RENDER_MODE_PYRAMID = 'pyramid'
+SCREENSHOT_RENDER_MODE_INCREMENTAL = 'incremental'
+
+SCREENSHOT_RENDER_MODE = env(
+    'SCREENSHOT_RENDER_MODE',
+    SCREENSHOT_RENDER_MODE_EXACT,
+    validate=OneOf([
+        SCREENSHOT_RENDER_MODE_EXACT,
+        SCREENSHOT_RENDER_MODE_PYRAMID,
+        SCREENSHOT_RENDER_MODE_INCREMENTAL,
+    ]),
+)
+
+# A number of screenshots retained per worker process in the incremental
+# render mode, every game takes one per size
+SCREENSHOT_RETAINED_CACHE_SIZE = env.int('SCREENSHOT_RETAINED_CACHE_SIZE',
+                                         64)
+
+# A number of cached images with borders and grid per worker process
+SCREENSHOT_TEMPLATES_CACHE_SIZE = env.int('SCREENSHOT_TEMPLATES_CACHE_SIZE',
+                                          64)
+
+# Whether to skip taking screenshots of games which have not changed since
+# the latest screenshots. Fingerprints of the latest screenshots are kept in
+# the state store, so it requires Redis at STATE_REDIS_URL.
+SCREENSHOT_SKIP_UNCHANGED = env.bool('SCREENSHOT_SKIP_UNCHANGED', False)
+# How long fingerprints of the latest screenshots are kept, in seconds
+SCREENSHOT_FINGERPRINT_TTL = env.int('SCREENSHOT_FINGERPRINT_TTL', 3600)
+
+# Games of a screenshot cycle are dispatched in batches which are expected to
+# be rendered for the target duration in seconds by recent render times of
+# games. Render times are smoothed per game and kept for the fingerprint TTL,
+# the default duration is expected for games which haven't been rendered
+# yet. 0 target duration disables batching, every game is dispatched in its
+# own task then, which is the default.
+SCREENSHOT_BATCH_TARGET_DURATION = env.float(
+    'SCREENSHOT_BATCH_TARGET_DURATION', 0)
+SCREENSHOT_BATCH_MAX_SIZE = env.int('SCREENSHOT_BATCH_MAX_SIZE', 50)
+SCREENSHOT_BATCH_DEFAULT_DURATION = env.float(
+    'SCREENSHOT_BATCH_DEFAULT_DURATION', 0.5)
+
+# A time in seconds during which results of tasks of a screenshot cycle are
+# kept in the state store until the last task of the cycle writes a report.
+# A cycle whose tasks don't finish in time doesn't write a report.
+SCREENSHOT_CYCLE_TTL = env.int('SCREENSHOT_CYCLE_TTL', 3600)
+
+# A screenshot cycle holds a lease from its dispatch until its last task
+# finishes, so cycles don't overlap. A cycle which is dispatched while
+# another one is in flight is either skipped or coalesced: coalesced cycles
+# are dispatched once right after the cycle in flight finishes. A lease of a
+# cycle which doesn't finish expires after the lease TTL in seconds.
+SCREENSHOT_CYCLE_OVERLAP_SKIP = 'skip'
+SCREENSHOT_CYCLE_OVERLAP_COALESCE = 'coalesce'
+
+SCREENSHOT_CYCLE_OVERLAP = env(
+    'SCREENSHOT_CYCLE_OVERLAP',
+    SCREENSHOT_CYCLE_OVERLAP_COALESCE,
+    validate=OneOf([
+        SCREENSHOT_CYCLE_OVERLAP_SKIP,
+        SCREENSHOT_CYCLE_OVERLAP_COALESCE,
+    ]),
+)
+SCREENSHOT_CYCLE_LEASE_TTL = env.int('SCREENSHOT_CYCLE_LEASE_TTL', 600)
+
+# Whether every game has its own interval of taking screenshots by its
+# activity, see lib.schedule. Busy games are taken every minimum interval,
+# intervals of empty and unchanged games grow by the backoff factor up to
+# the maximum interval. A game is busy when its share of taken player slots
+# or its rate reaches a threshold, 0 busy rate disables the rate threshold.
+# Changes of games are known only if unchanged games are skipped. Intervals
+# are counted in seconds and rounded to ticks of the screenshot task. The
+# chosen intervals are written to a report next to the screenshots report.
+SCREENSHOT_SCHEDULE_ADAPTIVE = env.bool('SCREENSHOT_SCHEDULE_ADAPTIVE', False)
+SCREENSHOT_SCHEDULE_MIN_INTERVAL = env.float(
+    'SCREENSHOT_SCHEDULE_MIN_INTERVAL', TASK_INTERVAL_SCREENSHOT)
+SCREENSHOT_SCHEDULE_MAX_INTERVAL = env.float(
+    'SCREENSHOT_SCHEDULE_MAX_INTERVAL', 900)
+SCREENSHOT_SCHEDULE_BACKOFF = env.float('SCREENSHOT_SCHEDULE_BACKOFF', 2.0)
+SCREENSHOT_SCHEDULE_BUSY_OCCUPANCY = env.float(
+    'SCREENSHOT_SCHEDULE_BUSY_OCCUPANCY', 0.5)
+SCREENSHOT_SCHEDULE_BUSY_RATE = env.int('SCREENSHOT_SCHEDULE_BUSY_RATE', 0)
+
+# PNG screenshots which would take more pixels than the threshold are
+# rendered in horizontal bands of the band height which are compressed one by
+# one, so a whole image of a big map isn't kept in memory several times.
+# Other formats need the whole image and are never banded. Banding doesn't
+# change the layout: strict sized screenshots which are resized are not
+# banded. 0 disables banded rendering.
+SCREENSHOT_BANDED_PX_THRESHOLD = env.int('SCREENSHOT_BANDED_PX_THRESHOLD',
+                                         500000)
+SCREENSHOT_BAND_HEIGHT = env.int('SCREENSHOT_BAND_HEIGHT', 64)
+
+# Whether to parse game objects into arrays instead of models to take
+# screenshots, see lib.columnar
+SCREENSHOT_COLUMNAR_OBJECTS = env.bool('SCREENSHOT_COLUMNAR_OBJECTS', False)
+
+# A number of threads of a worker process which render, encode and write
+# screenshots of different sizes and games concurrently. 0 disables the pool,
+# then screenshots are saved one by one in a task.
+SCREENSHOT_ENCODE_THREADS = env.int('SCREENSHOT_ENCODE_THREADS', 0)
+
 SCREENSHOT_DEST_PATH = env('SCREENSHOT_DEST_PATH', 'output/screenshots')
 
 SCREENSHOTS_JSON_FILE = 'report.json'
+
+SCREENSHOTS_SCHEDULE_JSON_FILE = 'schedule.json'
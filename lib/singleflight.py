@@ -0,0 +1,145 @@
+"""The module contains request coalescing: concurrent identical calls share
+one call in flight and get the same result, so bursts of identical requests
+don't multiply the load on the server.
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, TypeVar
+
+from lib import metrics
+from lib.state import StateStore
+
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """Coalesces identical calls of threads of a process. The first call of
+    a key is made and other calls of the key wait for its result or its
+    error while it is in flight.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Returns the result of the call in flight of the key or calls the
+        function.
+
+        Parameters:
+          key: a key of identical calls.
+          fn: a function to call.
+
+        Raises:
+          Exception: whatever the function raises.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            metrics.API_COALESCED_CALLS.labels('process').inc()
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class SharedSingleFlight:
+    """Coalesces identical calls of worker processes through a state store.
+    The call which takes a lock of a key is made and its result is published
+    in the store for a short time, other calls of the key poll the store for
+    the result. If the lock is released without a result, e.g. the call has
+    failed, or the result doesn't come in time, a call is made anyway.
+
+    Results must be bytes, so the shared calls are requests of raw responses
+    rather than of parsed models.
+    """
+
+    _PREFIX = 'single-flight'
+
+    def __init__(self,
+                 store: StateStore,
+                 lock_ttl: int = 30000,
+                 result_ttl: int = 1000,
+                 poll_interval: float = 0.01):
+        """Initializes a shared single flight.
+
+        Parameters:
+          store: a state store shared by worker processes.
+          lock_ttl: a maximum time of a call in milliseconds, calls which
+            wait for a result longer are made anyway.
+          result_ttl: a time to live of a result in the store in
+            milliseconds.
+          poll_interval: an interval of polling for a result in seconds.
+        """
+        assert lock_ttl > 0, 'Lock TTL must be positive'
+        assert result_ttl > 0, 'Result TTL must be positive'
+
+        self._store = store
+        self._lock_ttl = lock_ttl
+        self._result_ttl = result_ttl
+        self._poll_interval = poll_interval
+
+    def do(self, key: str, fn: Callable[[], bytes]) -> bytes:
+        """Returns the result of the call in flight of the key in any worker
+        process or calls the function.
+
+        Parameters:
+          key: a key of identical calls.
+          fn: a function to call.
+
+        Raises:
+          Exception: whatever the function raises.
+        """
+        lock_key = '{}:lock:{}'.format(self._PREFIX, key)
+        token = uuid.uuid4().hex.encode()
+
+        if self._store.add(lock_key, token, self._lock_ttl):
+            try:
+                result = fn()
+                self._store.set(self._result_key(token), result,
+                                self._result_ttl)
+                return result
+            finally:
+                self._store.delete(lock_key)
+
+        deadline = time.monotonic() + self._lock_ttl / 1000
+        leader_token = self._store.get(lock_key)
+        while leader_token is not None and time.monotonic() < deadline:
+            # The result is published before the lock is released
+            released = self._store.get(lock_key) != leader_token
+            result = self._store.get(self._result_key(leader_token))
+            if result is not None:
+                metrics.API_COALESCED_CALLS.labels('cluster').inc()
+                return result
+            if released:
+                break
+            time.sleep(self._poll_interval)
+
+        return fn()
+
+    def _result_key(self, token: bytes) -> str:
+        return '{}:result:{}'.format(self._PREFIX, token.decode())
+
+
+__all__ = [
+    'SingleFlight',
+    'SharedSingleFlight',
+]
@@ -0,0 +1,132 @@
+"""The module contains a key-value store for a state which is shared by
+worker processes, for example fingerprints of the latest screenshots.
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+
+class StateStore(ABC):
+    """A key-value store. Keys are strings and values are bytes. TTLs are
+    given in milliseconds.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns a value or None if there is no such key.
+        """
+
+    @abstractmethod
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """Returns values of keys, None for keys which don't exist.
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: int = None):
+        """Sets a value of a key.
+
+        Parameters:
+          key: a key.
+          value: a value.
+          ttl: a time to live of the key in milliseconds, if it isn't set
+            the key doesn't expire.
+        """
+
+    @abstractmethod
+    def add(self, key: str, value: bytes, ttl: int = None) -> bool:
+        """Sets a value of a key if there is no such key.
+
+        Parameters:
+          key: a key.
+          value: a value.
+          ttl: a time to live of the key in milliseconds, if it isn't set
+            the key doesn't expire.
+
+        Returns:
+          True if the value has been set.
+        """
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Deletes a key.
+        """
+
+
+class RedisStateStore(StateStore):
+    """A state store backed by Redis.
+    """
+
+    def __init__(self, *, client: redis.Redis = None, url: str = None):
+        """Initializes a store.
+
+        Parameters:
+          client: a Redis client, if it isn't set a client is created.
+          url: a Redis URL to connect to if a client isn't given.
+        """
+        self.client = client or redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        return self.client.mget(keys)
+
+    def set(self, key: str, value: bytes, ttl: int = None):
+        self.client.set(key, value, px=ttl)
+
+    def add(self, key: str, value: bytes, ttl: int = None) -> bool:
+        return bool(self.client.set(key, value, px=ttl, nx=True))
+
+    def delete(self, key: str):
+        self.client.delete(key)
+
+
+class StubStateStore(StateStore):
+    """An in-memory state store for unit tests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._db: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._get(key)
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        with self._lock:
+            return [self._get(key) for key in keys]
+
+    def set(self, key: str, value: bytes, ttl: int = None):
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def add(self, key: str, value: bytes, ttl: int = None) -> bool:
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._db.pop(key, None)
+
+    def _get(self, key: str):
+        value, expiration = self._db.get(key, (None, None))
+        if expiration is not None and expiration <= time.monotonic():
+            del self._db[key]
+            return None
+        return value
+
+    def _put(self, key: str, value, ttl: Optional[int]):
+        expiration = None
+        if ttl is not None:
+            expiration = time.monotonic() + ttl / 1000
+        self._db[key] = (value, expiration)
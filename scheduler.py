@@ -4,14 +4,12 @@
 import logging
 import pathlib
 
-from dramatiq import pipeline
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
 from lib import settings
 from lib.actors import (
     dispatch_taking_screenshots,
-    write_games_screenshots_json_report,
     delete_expired_screenshots_cache,
     dispatch_deleting_empty_games,
 )
@@ -31,10 +29,7 @@ def init():
 def run_scheduler():
     scheduler = BlockingScheduler()
     scheduler.add_job(
-        pipeline([
-            dispatch_taking_screenshots.message(),
-            write_games_screenshots_json_report.message(),
-        ]).run,
+        dispatch_taking_screenshots.send,
         IntervalTrigger(seconds=settings.TASK_INTERVAL_SCREENSHOT),
         name="dispatch_taking_screenshots",
     )
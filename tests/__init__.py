@@ -0,0 +1,7 @@
+"""Tests of the application. They use stub brokers, backends and stores
+instead of Redis.
+"""
+
+import os
+
+os.environ.setdefault('UNIT_TESTS', 'true')
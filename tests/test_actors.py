@@ -0,0 +1,205 @@
+"""Tests of actors with the stub broker and stub backends.
+"""
+
+import time
+import unittest
+from unittest import mock
+
+import dramatiq
+
+from lib import actors
+from lib import funcs
+from lib import settings
+from lib.api import APIError
+from lib.schemas import Game
+from lib.state import StubStateStore
+
+
+GAMES_IDS = [1, 2, 3, 4, 5]
+
+
+def take_screenshots(game_id: int):
+    """Takes screenshots of a game, game 2 fails with an error of the server
+    and game 3 fails with an unexpected error.
+    """
+    if game_id == 2:
+        raise APIError(500, 'internal error')
+    if game_id == 3:
+        raise RuntimeError('unexpected error')
+    return ['g{}.jpeg'.format(game_id)]
+
+
+class ActorsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        actors.broker.flush_all()
+        actors.rate_limits_backend.db.clear()
+
+        store = StubStateStore()
+        self.games = [Game(id=game_id, limit=10, count=1, width=10,
+                           height=10, rate=0)
+                      for game_id in GAMES_IDS]
+        self.reports = []
+        self.get_games_calls = 0
+        patchers = [
+            mock.patch.object(funcs, '_state_store', store),
+            mock.patch.object(actors.SCREENSHOT_CYCLE_LEASE, 'store', store),
+            mock.patch.object(funcs, 'get_games', self.get_games),
+            mock.patch.object(funcs, 'take_sized_screenshots_by_game_id',
+                              take_screenshots),
+            mock.patch.object(funcs, 'write_games_screenshots_json_report',
+                              self.reports.append),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.worker = dramatiq.Worker(actors.broker, worker_timeout=100)
+        self.worker.start()
+        self.addCleanup(self.worker.stop)
+
+    def get_games(self):
+        self.get_games_calls += 1
+        return self.games
+
+    def join(self):
+        actors.broker.join(actors.dispatch_taking_screenshots.queue_name)
+        self.worker.join()
+
+
+class ScreenshotCycleTestCase(ActorsTestCase):
+
+    def assert_reported_once(self, games_ids):
+        self.assertEqual(self.reports, [{
+            str(game_id): ['g{}.jpeg'.format(game_id)]
+            for game_id in games_ids
+        }])
+
+    def test_cycle_is_reported_once(self):
+        actors.dispatch_taking_screenshots.send()
+        self.join()
+
+        self.assert_reported_once([1, 4, 5])
+        # The lease of the cycle has been released
+        self.assertTrue(actors.SCREENSHOT_CYCLE_LEASE.take('next'))
+
+    @mock.patch.object(settings, 'SCREENSHOT_BATCH_TARGET_DURATION', 1.0)
+    @mock.patch.object(settings, 'SCREENSHOT_BATCH_MAX_SIZE', 2)
+    def test_batched_cycle_is_reported_once(self):
+        def take_batch(games_ids):
+            results = {}
+            for game_id in games_ids:
+                try:
+                    results[game_id] = take_screenshots(game_id)
+                except Exception as e:
+                    results[game_id] = e
+            return results
+
+        with mock.patch.object(funcs, 'take_sized_screenshots_by_games_ids',
+                               take_batch):
+            actors.dispatch_taking_screenshots.send()
+            self.join()
+
+        self.assert_reported_once([1, 4, 5])
+
+    def test_duplicate_signals_are_ignored(self):
+        cycle_id = funcs.new_screenshot_cycle_id()
+        self.assertTrue(actors.SCREENSHOT_CYCLE_LEASE.take(cycle_id))
+        funcs.start_screenshot_cycle([1, 2, 3], cycle_id)
+        actors._get_screenshot_cycle_barrier(cycle_id).create(3)
+
+        # Redelivered tasks of a game don't count as other games
+        for game_id in (1, 1, 1, 2, 2):
+            actors.take_sized_screenshots_by_game_id.send(game_id, cycle_id)
+        self.join()
+        self.assertEqual(self.reports, [])
+
+        actors.take_sized_screenshots_by_game_id.send(3, cycle_id)
+        self.join()
+        self.assertEqual(self.reports, [{'1': ['g1.jpeg']}])
+
+        # Tasks which are redelivered after the report don't report again
+        for game_id in (1, 2, 3):
+            actors.take_sized_screenshots_by_game_id.send(game_id, cycle_id)
+        self.join()
+        self.assertEqual(self.reports, [{'1': ['g1.jpeg']}])
+
+    def test_signals_of_finished_cycle_are_ignored(self):
+        cycle_id = funcs.new_screenshot_cycle_id()
+        self.assertTrue(actors.SCREENSHOT_CYCLE_LEASE.take(cycle_id))
+        funcs.start_screenshot_cycle([1, 4], cycle_id)
+        actors._get_screenshot_cycle_barrier(cycle_id).create(2)
+
+        actors._finish_screenshot_cycle_task(cycle_id, 1, ['g1.jpeg'])
+        actors._finish_screenshot_cycle_task(cycle_id, 4, ['g4.jpeg'])
+        # The barrier stays released after the last party has arrived
+        actors._finish_screenshot_cycle_task(cycle_id, 5, ['g5.jpeg'])
+        actors._finish_screenshot_cycle_task(cycle_id, 4, ['g4.jpeg'])
+        self.join()
+
+        self.assert_reported_once([1, 4])
+
+
+class ScreenshotCycleLeaseTestCase(ActorsTestCase):
+
+    REPORT = {'1': ['g1.jpeg'], '4': ['g4.jpeg'], '5': ['g5.jpeg']}
+
+    @mock.patch.object(settings, 'SCREENSHOT_CYCLE_OVERLAP',
+                       settings.SCREENSHOT_CYCLE_OVERLAP_SKIP)
+    def test_overlapping_cycle_is_skipped(self):
+        self.assertTrue(actors.SCREENSHOT_CYCLE_LEASE.take('in-flight'))
+
+        actors.dispatch_taking_screenshots.send()
+        self.join()
+        self.assertEqual(self.get_games_calls, 0)
+
+        actors._finish_screenshot_cycle('in-flight')
+        self.join()
+        self.assertEqual(self.get_games_calls, 0)
+        self.assertEqual(self.reports, [])
+
+    @mock.patch.object(settings, 'SCREENSHOT_CYCLE_OVERLAP',
+                       settings.SCREENSHOT_CYCLE_OVERLAP_COALESCE)
+    def test_overlapping_cycles_are_coalesced(self):
+        self.assertTrue(actors.SCREENSHOT_CYCLE_LEASE.take('in-flight'))
+
+        for _ in range(3):
+            actors.dispatch_taking_screenshots.send()
+        self.join()
+        self.assertEqual(self.get_games_calls, 0)
+
+        # Coalesced cycles are dispatched once when the lease is released
+        actors._finish_screenshot_cycle('in-flight')
+        self.join()
+        self.assertEqual(self.get_games_calls, 1)
+        self.assertEqual(self.reports, [self.REPORT])
+
+        # Nothing is pending after the coalesced cycle
+        self.assertTrue(actors.SCREENSHOT_CYCLE_LEASE.take('next'))
+        self.assertFalse(funcs.pop_screenshot_cycle_pending())
+
+    @mock.patch.object(settings, 'SCREENSHOT_CYCLE_OVERLAP',
+                       settings.SCREENSHOT_CYCLE_OVERLAP_SKIP)
+    @mock.patch.object(actors.SCREENSHOT_CYCLE_LEASE, 'ttl', 50)
+    def test_expired_lease_is_taken_again(self):
+        self.assertTrue(actors.SCREENSHOT_CYCLE_LEASE.take('lost'))
+        actors.dispatch_taking_screenshots.send()
+        self.join()
+        self.assertEqual(self.get_games_calls, 0)
+
+        time.sleep(0.1)
+        actors.dispatch_taking_screenshots.send()
+        self.join()
+        self.assertEqual(self.get_games_calls, 1)
+        self.assertEqual(self.reports, [self.REPORT])
+
+        # A lost owner can't release the lease of a new owner
+        self.assertTrue(actors.SCREENSHOT_CYCLE_LEASE.take('new'))
+        self.assertFalse(actors.SCREENSHOT_CYCLE_LEASE.release('lost'))
+        self.assertFalse(actors.SCREENSHOT_CYCLE_LEASE.take('other'))
+        self.assertTrue(actors.SCREENSHOT_CYCLE_LEASE.release('new'))
+        self.assertTrue(actors.SCREENSHOT_CYCLE_LEASE.take('other'))
+
+
+if __name__ == '__main__':
+    unittest.main()
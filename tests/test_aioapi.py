@@ -0,0 +1,248 @@
+"""Tests of the asyncio API client against a local stand-in of the
+Snake-Server.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from dramatiq.rate_limits.backends import StubBackend
+from pydantic import ValidationError
+
+from lib import funcs
+from lib import settings
+from lib.aioapi import AsyncAPIClient
+from lib.api import APIError
+from lib.columnar import ColumnarObjects
+from lib.limiter import AdaptiveConcurrencyLimiter
+from lib.schemas import Apple, Objects
+from lib.state import StubStateStore
+
+
+def objects_payload(game_id: int) -> dict:
+    return {
+        'objects': [
+            {'id': game_id, 'type': 'apple', 'dot': [game_id, 0]},
+            {'id': 100 + game_id, 'type': 'snake', 'dots': [[0, 1], [0, 2]]},
+        ],
+        'map': {'width': 10, 'height': 10},
+    }
+
+
+class StandInServer:
+    """A stand-in of the server which serves game objects. Game 404 doesn't
+    exist, game 422 returns an invalid response and game 408 never responds.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.app = web.Application()
+        self.app.router.add_get('/api/games/{game_id}/objects', self.objects)
+        self.app.router.add_get('/api/games', self.games)
+
+    async def objects(self, request: web.Request) -> web.Response:
+        game_id = int(request.match_info['game_id'])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if game_id == 404:
+                return web.json_response({'code': 404, 'text': 'not found'},
+                                         status=404)
+            if game_id == 422:
+                return web.json_response({'objects': 'invalid'})
+            if game_id == 408:
+                await asyncio.Event().wait()
+            return web.json_response(objects_payload(game_id))
+        finally:
+            self.in_flight -= 1
+
+    async def games(self, _request: web.Request) -> web.Response:
+        return web.json_response({
+            'games': [{'id': 1, 'limit': 10, 'count': 2, 'width': 10,
+                       'height': 10, 'rate': 0}],
+            'limit': 100,
+            'count': 1,
+        })
+
+
+class AsyncAPIClientTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.stand_in = StandInServer()
+        self.server = TestServer(self.stand_in.app)
+        await self.server.start_server()
+        self.client = AsyncAPIClient(str(self.server.make_url('/api')))
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+
+    async def fetch(self, games_ids, **kwargs) -> dict:
+        return {
+            game_id: result
+            async for game_id, result in self.client.fetch_objects_many(
+                games_ids, **kwargs)
+        }
+
+    async def test_get_games(self):
+        games = await self.client.get_games()
+        self.assertEqual([game.id for game in games.games], [1])
+
+    async def test_fetch_objects_many(self):
+        results = await self.fetch(range(1, 21), concurrency=4)
+
+        self.assertEqual(set(results), set(range(1, 21)))
+        for game_id, objects in results.items():
+            self.assertIsInstance(objects, Objects)
+            self.assertEqual((objects.map.width, objects.map.height),
+                             (10, 10))
+            self.assertIsInstance(objects.objects[0], Apple)
+            self.assertEqual(objects.objects[0].dot, (game_id, 0))
+        self.assertLessEqual(self.stand_in.max_in_flight, 4)
+
+    async def test_fetch_objects_many_columnar(self):
+        results = await self.fetch([1, 2], columnar=True)
+
+        self.assertIsInstance(results[1], ColumnarObjects)
+        self.assertIsInstance(results[2], ColumnarObjects)
+
+    async def test_fetch_objects_many_errors(self):
+        results = await self.fetch([1, 404, 422, 2])
+
+        self.assertIsInstance(results[1], Objects)
+        self.assertIsInstance(results[2], Objects)
+        self.assertIsInstance(results[404], APIError)
+        self.assertIsInstance(results[422], ValidationError)
+
+    async def test_fetch_objects_many_cancels_pending(self):
+        fetching = self.client.fetch_objects_many([1, 408, 2])
+        received = [await fetching.__anext__(), await fetching.__anext__()]
+        self.assertEqual(sorted(game_id for game_id, _ in received), [1, 2])
+
+        tasks = [task for task in asyncio.all_tasks()
+                 if task.get_coro().__name__ == 'fetch']
+        pending = [task for task in tasks if not task.done()]
+        self.assertEqual(len(pending), 1)
+
+        await fetching.aclose()
+        self.assertTrue(all(task.done() for task in tasks))
+        self.assertTrue(pending[0].cancelled())
+        # The connection of the aborted request isn't in use any more
+        connector = self.client._get_session().connector
+        self.assertEqual(len(connector._acquired), 0)
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    """Serves game objects of the stand-in server in a thread
+    """
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight,
+                                            self.server.in_flight)
+        try:
+            time.sleep(0.01)
+            self.respond()
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def respond(self):
+        parts = self.path.strip('/').split('/')
+        game_id = int(parts[2])
+        status, payload = 200, objects_payload(game_id)
+        if game_id == 404:
+            status, payload = 404, {'code': 404, 'text': 'not found'}
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_args):
+        pass
+
+
+class GetGamesObjectsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          StandInRequestHandler)
+        self.server.lock = threading.Lock()
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True) \
+            .start()
+        self.address = settings.SNAKE_API_ADDRESS
+        settings.SNAKE_API_ADDRESS = 'http://127.0.0.1:{}/api'.format(
+            self.server.server_address[1])
+
+    def tearDown(self):
+        settings.SNAKE_API_ADDRESS = self.address
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_games_objects(self):
+        results = funcs.get_games_objects([1, 404, 2])
+
+        self.assertIsInstance(results[1], Objects)
+        self.assertIsInstance(results[2], Objects)
+        self.assertIsInstance(results[404], APIError)
+
+    def test_get_games_objects_holds_slot_per_request(self):
+        funcs.limit_api_concurrency(AdaptiveConcurrencyLimiter(
+            StubBackend(),
+            'api-concurrency',
+            StubStateStore(),
+            lambda: 0.6,
+            initial_limit=2,
+        ))
+        try:
+            results = funcs.get_games_objects(list(range(1, 21)))
+        finally:
+            funcs.limit_api_concurrency(None)
+
+        self.assertEqual(set(results), set(range(1, 21)))
+        self.assertEqual(self.server.max_in_flight, 2)
+
+    def test_take_sized_screenshots_by_games_ids(self):
+        overrides = {
+            'UNIT_TESTS': True,
+            'API_STREAM_OBJECTS': False,
+            'SCREENSHOT_DEST_PATH': tempfile.mkdtemp(),
+        }
+        previous = {name: getattr(settings, name) for name in overrides}
+        state_store = funcs._state_store
+        for name, value in overrides.items():
+            setattr(settings, name, value)
+        funcs._state_store = None
+        try:
+            results = funcs.take_sized_screenshots_by_games_ids([1, 404, 2])
+        finally:
+            for name, value in previous.items():
+                setattr(settings, name, value)
+            funcs._state_store = state_store
+
+        self.assertEqual(list(results), [1, 404, 2])
+        self.assertIsInstance(results[404], APIError)
+        for game_id in (1, 2):
+            self.assertEqual(len(results[game_id]),
+                             len(settings.SCREENSHOT_LENGTHS))
+            for filename in results[game_id]:
+                self.assertTrue(os.path.exists(os.path.join(
+                    overrides['SCREENSHOT_DEST_PATH'], filename)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Tests of screenshot encoders.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.payloads import generate_objects_payload
+from lib import settings
+from lib.encoders import PNGEncoder
+from lib.schemas import Objects
+from lib.screenshot import FittedGridCanvas, Screenshot
+
+
+# Map sizes in dots and screenshot lengths in px
+MAP_SIZES = [(25, 25), (75, 25), (25, 75), (150, 75)]
+LENGTHS = [150, 500]
+
+
+class PNGEncoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # Every screenshot is banded and the last band is lower than others
+        patchers = [
+            mock.patch.object(settings, 'SCREENSHOT_BANDED_PX_THRESHOLD', 1),
+            mock.patch.object(settings, 'SCREENSHOT_BAND_HEIGHT', 7),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def encode(self, screenshot: Screenshot) -> Image:
+        path = os.path.join(self.dir.name, 'screenshot.png')
+        PNGEncoder().encode(screenshot, path)
+        img = Image.open(path)
+        img.load()
+        return img
+
+    def assert_same_image(self, img: Image, screenshot: Screenshot):
+        expected = screenshot.palette_img
+        colors = 3 * len(screenshot.palette)
+
+        self.assertEqual(img.format, 'PNG')
+        self.assertEqual(img.mode, 'P')
+        self.assertEqual(img.size, screenshot.size)
+        self.assertEqual(img.getpalette()[:colors],
+                         expected.getpalette()[:colors])
+        np.testing.assert_array_equal(np.asarray(img), np.asarray(expected))
+
+    def test_banded_screenshots(self):
+        fitted = 0
+        for map_size in MAP_SIZES:
+            objects = Objects.parse_obj(
+                generate_objects_payload(*map_size, 'medium')).objects
+            for length in LENGTHS:
+                for strict_sized, exact_fit in ((False, False),
+                                                (True, False),
+                                                (True, True)):
+                    with self.subTest(map_size=map_size,
+                                      length=length,
+                                      strict_sized=strict_sized,
+                                      exact_fit=exact_fit):
+                        args = (map_size, (length, length), objects,
+                                strict_sized, exact_fit)
+                        screenshot = Screenshot(*args, allow_banded=True)
+                        expected = Screenshot(*args)
+
+                        # Resized screenshots are never banded
+                        fits = exact_fit and FittedGridCanvas.fits(
+                            *map_size, *expected.size, Screenshot.BORDER_SIZE)
+                        self.assertEqual(screenshot.banded,
+                                         not strict_sized or fits)
+                        self.assertFalse(expected.banded)
+                        fitted += fits
+
+                        self.assertEqual(screenshot.size, expected.size)
+                        self.assert_same_image(self.encode(screenshot),
+                                               expected)
+        self.assertGreater(fitted, 0)
+
+    def test_not_banded_screenshot(self):
+        objects = Objects.parse_obj(
+            generate_objects_payload(30, 30, 'medium')).objects
+        screenshot = Screenshot((30, 30), (300, 300), objects)
+
+        self.assertFalse(screenshot.banded)
+        self.assert_same_image(self.encode(screenshot), screenshot)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Tests of the incremental decoder of JSON objects. Decoded items are
+compared with json.loads of the same documents split into chunks at every
+position.
+"""
+
+import json
+import unittest
+from typing import Any, Collection, Iterator, List, Tuple
+
+from benchmarks.payloads import generate_objects_payload
+from lib.jsonstream import iter_items
+
+
+DOCUMENTS = [
+    '{}',
+    ' { } ',
+    '{"a": 1}',
+    '{"int": -12, "float": -0.5e-3, "exp": 1E+10, "big": '
+    '123456789012345678901234567890, "zero": 0, "frac": 10.25}',
+    '{"true": true, "false": false, "null": null}',
+    '{"escapes": "\\"\\\\\\/\\b\\f\\n\\r\\t", "unicode": '
+    '"\\u00e9\\ud83d\\ude00", "raw": "é中\U0001f600", '
+    '"ключ": "value"}',
+    '{"nested": {"a": [1, [2, [3, {}]], {"b": [], "c": {"d": null}}]}, '
+    '"empty": [], "objects": []}',
+    '{"objects": [{"id": 1, "dots": [[0, 1], [2, 3]]}, 2, "three", [4], '
+    '{"text": "a, b]}"}], "map": {"width": 10, "height": 20}}',
+    '{"objects": {"a": 1}, "after": [1, 2]}',
+    '\n{\n\t"objects" :\r\n [ 1 ,\n 2 ] ,\n "map" : 1.5 }\n',
+]
+
+MALFORMED_DOCUMENTS = [
+    '',
+    '   ',
+    '[1, 2]',
+    '"text"',
+    '{',
+    '{"a"',
+    '{"a":',
+    '{"a": 1',
+    '{"a": 1,',
+    '{"a": 1,}',
+    '{"a" 1}',
+    '{1: 2}',
+    '{"a": tru}',
+    '{"a": "text}',
+    '{"a": 1} {}',
+    '{"a": 1} x',
+    '{"objects": [1, 2',
+    '{"objects": [1, 2,',
+    '{"objects": [1, 2,]}',
+    '{"objects": [1 2]}',
+    '{"objects": [1, 2]',
+]
+
+STREAMED_KEYS = ('objects',)
+
+
+def expected_items(text: str,
+                   streamed_keys: Collection[str] = STREAMED_KEYS) \
+        -> List[Tuple[str, Any]]:
+    """Returns items of a document decoded with json.loads which iter_items
+    is expected to yield.
+    """
+    items = []
+    for key, value in json.loads(text).items():
+        if key in streamed_keys and isinstance(value, list):
+            items.extend((key, element) for element in value)
+        else:
+            items.append((key, value))
+    return items
+
+
+def split(data: bytes) -> Iterator[List[bytes]]:
+    """Yields a document split into two chunks at every position, into
+    three chunks around every position and into chunks of one byte.
+    """
+    for i in range(len(data) + 1):
+        yield [data[:i], data[i:]]
+        yield [data[:i], b'', data[i:i + 2], data[i + 2:]]
+    yield [data[i:i + 1] for i in range(len(data))]
+
+
+class IterItemsTestCase(unittest.TestCase):
+
+    def assert_decoded(self, text: str):
+        data = text.encode()
+        for streamed_keys in (STREAMED_KEYS, ()):
+            expected = expected_items(text, streamed_keys)
+            for chunks in split(data):
+                with self.subTest(text=text,
+                                  chunks=chunks,
+                                  streamed_keys=streamed_keys):
+                    self.assertEqual(
+                        list(iter_items(chunks, streamed_keys)), expected)
+
+    def test_documents(self):
+        for text in DOCUMENTS:
+            self.assert_decoded(text)
+
+    def test_objects_payload(self):
+        payload = generate_objects_payload(10, 10, 'dense')
+        self.assert_decoded(json.dumps(payload))
+        self.assert_decoded(json.dumps(payload, indent=2))
+
+    def test_streamed_items_order(self):
+        data = b'{"map": 1, "objects": [{"id": 1}, [2], 3], "count": 3}'
+        self.assertEqual(list(iter_items([data], STREAMED_KEYS)), [
+            ('map', 1),
+            ('objects', {'id': 1}),
+            ('objects', [2]),
+            ('objects', 3),
+            ('count', 3),
+        ])
+
+    def test_items_are_yielded_before_the_end(self):
+        def chunks():
+            yield b'{"objects": [1, 2, '
+            raise AssertionError('the document is read too far')
+
+        items = iter_items(chunks(), STREAMED_KEYS)
+        self.assertEqual(next(items), ('objects', 1))
+
+    def test_malformed_documents(self):
+        for text in MALFORMED_DOCUMENTS:
+            for chunks in split(text.encode()):
+                with self.subTest(text=text, chunks=chunks):
+                    with self.assertRaises(ValueError):
+                        list(iter_items(chunks, STREAMED_KEYS))
+
+    def test_invalid_utf8(self):
+        with self.assertRaises(ValueError):
+            list(iter_items([b'{"a": "\xff"}']))
+        with self.assertRaises(ValueError):
+            list(iter_items([b'{"a": "\xc3']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""Tests of limiters shared by worker processes with stub backends.
+"""
+
+import unittest
+
+from dramatiq.errors import RateLimitExceeded
+from dramatiq.rate_limits.backends import StubBackend
+
+from lib.limiter import AdaptiveConcurrencyLimiter
+from lib.state import StubStateStore
+
+
+class AdaptiveConcurrencyLimiterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = AdaptiveConcurrencyLimiter(
+            StubBackend(),
+            'api-concurrency',
+            StubStateStore(),
+            lambda: 0.6,
+            min_limit=1,
+            max_limit=4,
+            initial_limit=3,
+        )
+
+    def test_wait_many_takes_free_slots(self):
+        with self.limiter.wait_many(10, timeout=0) as taken:
+            self.assertEqual(taken, 3)
+            with self.assertRaises(RateLimitExceeded):
+                with self.limiter.wait(timeout=0):
+                    pass
+
+        with self.limiter.wait_many(2, timeout=0) as taken:
+            self.assertEqual(taken, 2)
+            with self.limiter.wait_many(2, timeout=0) as taken:
+                self.assertEqual(taken, 1)
+
+        with self.limiter.wait_many(10, timeout=0) as taken:
+            self.assertEqual(taken, 3)
+
+    def test_wait_many_releases_slots_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.limiter.wait_many(10, timeout=0):
+                raise ValueError
+
+        with self.limiter.wait_many(10, timeout=0) as taken:
+            self.assertEqual(taken, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
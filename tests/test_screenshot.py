@@ -0,0 +1,147 @@
+"""Regression tests of rendering of screenshots. Screenshots are compared
+with a reference implementation of the original renderer which draws every
+dot of every object on an RGB grid canvas one by one.
+"""
+
+import math
+import unittest
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.payloads import MAP_SIZES, generate_objects_payload
+from lib import settings
+from lib.schemas import AnyObjectList, Objects
+from lib.screenshot import DotFrame, Screenshot
+
+
+def render_reference(map_size: Tuple[int, int],
+                     max_size: Tuple[int, int],
+                     game_objects: AnyObjectList,
+                     strict_sized: bool) -> Image:
+    """Returns a screenshot rendered the way the original renderer did.
+    """
+    map_width, map_height = map_size
+    max_width, max_height = max_size
+    border = Screenshot.BORDER_SIZE
+
+    cell = min(math.ceil((max_width - border * 2) / map_width),
+               math.ceil((max_height - border * 2) / map_height))
+    line = math.floor(cell * 0.10)
+    if line < 1 and cell - line > 5:
+        line = 1
+    dot = cell - line
+
+    width = dot * map_width + line * (map_width + 1) + border * 2
+    height = dot * map_height + line * (map_height + 1) + border * 2
+
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[:, :] = Screenshot.COLOR_BORDER
+    img[border:height - border, border:width - border] = \
+        Screenshot.COLOR_BACKGROUND
+    if line > 0:
+        for x in range(border, width - border, line + dot):
+            img[border:height - border, x:x + line] = Screenshot.COLOR_GRID
+        for y in range(border, height - border, line + dot):
+            img[y:y + line, border:width - border] = Screenshot.COLOR_GRID
+
+    for game_object in game_objects:
+        color = game_object.color()
+        for x, y in game_object.dots:
+            px_x = border + dot * x + line * (x + 1)
+            px_y = border + dot * y + line * (y + 1)
+            img[px_y:px_y + dot, px_x:px_x + dot] = color
+
+    image = Image.fromarray(img, 'RGB')
+    if not strict_sized:
+        return image
+
+    length = min(max_width, max_height)
+    if width == height:
+        return image.resize((length, length))
+    if width > height:
+        return image.resize((length, height * length // width))
+    return image.resize((width * length // height, length))
+
+
+def parse_objects(map_size: Tuple[int, int], seed: int) -> AnyObjectList:
+    return Objects.parse_obj(
+        generate_objects_payload(*map_size, 'medium', seed)).objects
+
+
+class ScreenshotTestCase(unittest.TestCase):
+
+    def assert_same_image(self, img: Image, expected: Image):
+        self.assertEqual(img.mode, 'RGB')
+        self.assertEqual(img.size, expected.size)
+        np.testing.assert_array_equal(np.asarray(img), np.asarray(expected))
+
+    def cases(self):
+        """Yields arguments of screenshots of payloads of every map size in
+        every length and their expected images.
+        """
+        for map_size in MAP_SIZES:
+            objects = parse_objects(map_size, 0)
+            for length in settings.SCREENSHOT_LENGTHS.values():
+                for strict_sized in (False, True):
+                    expected = render_reference(map_size,
+                                                (length, length),
+                                                objects,
+                                                strict_sized)
+                    yield (map_size, (length, length), objects,
+                           strict_sized, expected)
+
+    def test_exact(self):
+        for map_size, max_size, objects, strict_sized, expected in \
+                self.cases():
+            with self.subTest(map_size=map_size,
+                              max_size=max_size,
+                              strict_sized=strict_sized):
+                screenshot = Screenshot(map_size, max_size, objects,
+                                        strict_sized)
+                self.assert_same_image(screenshot.img, expected)
+                self.assertEqual(screenshot.size, expected.size)
+
+    def test_pyramid(self):
+        for map_size, max_size, objects, strict_sized, expected in \
+                self.cases():
+            with self.subTest(map_size=map_size,
+                              max_size=max_size,
+                              strict_sized=strict_sized):
+                frame = DotFrame.from_objects(map_size, objects)
+                screenshot = Screenshot.from_frame(frame, max_size,
+                                                   strict_sized)
+                self.assert_same_image(screenshot.img, expected)
+
+    def test_incremental(self):
+        for map_size, max_size, objects, strict_sized, expected in \
+                self.cases():
+            with self.subTest(map_size=map_size,
+                              max_size=max_size,
+                              strict_sized=strict_sized):
+                previous = DotFrame.from_objects(map_size,
+                                                 parse_objects(map_size, 1))
+                screenshot = Screenshot.from_frame(previous, max_size,
+                                                   strict_sized)
+                self.assertIsNotNone(screenshot.img)
+
+                screenshot.update(DotFrame.from_objects(map_size, objects))
+                self.assert_same_image(screenshot.img, expected)
+
+    def test_incremental_few_changes(self):
+        map_size, max_size = (30, 30), (300, 300)
+        objects = parse_objects(map_size, 0)
+        screenshot = Screenshot.from_frame(
+            DotFrame.from_objects(map_size, objects[1:]), max_size)
+        self.assertIsNotNone(screenshot.img)
+
+        for frame_objects in (objects, objects):
+            screenshot.update(DotFrame.from_objects(map_size, frame_objects))
+            self.assert_same_image(
+                screenshot.img,
+                render_reference(map_size, max_size, objects, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+"""Threaded tests of coalescing of identical calls.
+"""
+
+import threading
+import time
+import unittest
+from typing import Callable, List
+from unittest import mock
+
+from lib import metrics
+from lib.singleflight import SharedSingleFlight, SingleFlight
+from lib.state import StubStateStore
+
+
+THREADS = 8
+TIMEOUT = 5
+
+
+def wait_until(condition: Callable[[], bool]):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition is not met in time')
+        time.sleep(0.001)
+
+
+def run_threads(target: Callable[[], object]) -> List[object]:
+    """Runs the target in threads at once and returns its results or
+    raised exceptions in the order of the threads.
+    """
+    results = [None] * THREADS
+    barrier = threading.Barrier(THREADS)
+
+    def run(i: int):
+        barrier.wait()
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,))
+               for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+        assert not thread.is_alive(), 'thread has not finished'
+    return results
+
+
+class Calls:
+    """A function which counts its calls. The calls wait until they are
+    released.
+    """
+
+    def __init__(self, result=None, error: Exception = None):
+        self.count = 0
+        self.released = threading.Event()
+        self._result = result
+        self._error = error
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.count += 1
+        self.released.wait(TIMEOUT)
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        patcher = mock.patch.object(metrics, 'API_COALESCED_CALLS')
+        self.coalesced = patcher.start().labels.return_value
+        self.addCleanup(patcher.stop)
+
+    def release_when_coalesced(self, fn: Calls):
+        """Releases the call when all other threads wait for its result.
+        """
+        def release():
+            wait_until(lambda: self.coalesced.inc.call_count ==
+                       THREADS - 1)
+            fn.released.set()
+
+        thread = threading.Thread(target=release)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_identical_calls_are_made_once(self):
+        result = object()
+        fn = Calls(result)
+        self.release_when_coalesced(fn)
+
+        results = run_threads(lambda: self.single_flight.do('key', fn))
+
+        self.assertEqual(fn.count, 1)
+        for value in results:
+            self.assertIs(value, result)
+
+    def test_error_is_shared(self):
+        error = ValueError('failed')
+        fn = Calls(error=error)
+        self.release_when_coalesced(fn)
+
+        results = run_threads(lambda: self.single_flight.do('key', fn))
+
+        self.assertEqual(fn.count, 1)
+        for value in results:
+            self.assertIs(value, error)
+
+    def test_call_after_completion_is_made_again(self):
+        first = Calls('first')
+        first.released.set()
+        self.assertEqual(self.single_flight.do('key', first), 'first')
+
+        second = Calls('second')
+        second.released.set()
+        self.assertEqual(self.single_flight.do('key', second), 'second')
+
+        self.assertEqual((first.count, second.count), (1, 1))
+        self.coalesced.inc.assert_not_called()
+
+    def test_call_after_error_is_made_again(self):
+        failed = Calls(error=ValueError('failed'))
+        failed.released.set()
+        with self.assertRaises(ValueError):
+            self.single_flight.do('key', failed)
+
+        fn = Calls('result')
+        fn.released.set()
+        self.assertEqual(self.single_flight.do('key', fn), 'result')
+
+    def test_different_keys_are_not_coalesced(self):
+        fns = [Calls(i) for i in range(THREADS)]
+        for fn in fns:
+            fn.released.set()
+        keys = iter(range(THREADS))
+        lock = threading.Lock()
+
+        def call():
+            with lock:
+                key = next(keys)
+            return self.single_flight.do(key, fns[key])
+
+        self.assertEqual(sorted(run_threads(call)), list(range(THREADS)))
+        self.assertEqual([fn.count for fn in fns], [1] * THREADS)
+
+
+class CountingStateStore(StubStateStore):
+    """A stub state store which counts attempts to add keys
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.adds = 0
+
+    def add(self, key: str, value: bytes, ttl: int = None) -> bool:
+        added = super().add(key, value, ttl)
+        with self._lock:
+            self.adds += 1
+        return added
+
+
+class SharedSingleFlightTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.store = CountingStateStore()
+        self.single_flight = SharedSingleFlight(self.store,
+                                                lock_ttl=TIMEOUT * 1000,
+                                                poll_interval=0.001)
+
+    def release_when_locked(self, fn: Calls):
+        """Releases the call when all threads have tried to take the lock.
+        """
+        def release():
+            wait_until(lambda: self.store.adds == THREADS)
+            fn.released.set()
+
+        thread = threading.Thread(target=release)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_identical_calls_are_made_once(self):
+        fn = Calls(b'result')
+        self.release_when_locked(fn)
+
+        results = run_threads(lambda: self.single_flight.do('key', fn))
+
+        self.assertEqual(fn.count, 1)
+        self.assertEqual(results, [b'result'] * THREADS)
+
+    def test_failed_call_is_made_by_every_caller(self):
+        fn = Calls(error=ValueError('failed'))
+        self.release_when_locked(fn)
+
+        results = run_threads(lambda: self.single_flight.do('key', fn))
+
+        # The lock is released without a result, so waiting callers don't
+        # get a result and make their own calls
+        self.assertEqual(fn.count, THREADS)
+        for value in results:
+            self.assertIsInstance(value, ValueError)
+
+    def test_call_after_completion_is_made_again(self):
+        first = Calls(b'first')
+        first.released.set()
+        self.assertEqual(self.single_flight.do('key', first), b'first')
+
+        second = Calls(b'second')
+        second.released.set()
+        self.assertEqual(self.single_flight.do('key', second), b'second')
+
+        self.assertEqual((first.count, second.count), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()